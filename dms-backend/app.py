@@ -1,10 +1,28 @@
 # backend/app.py
-from flask import Flask, request, jsonify
+import base64
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from flask_jwt_extended import (
-    JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
+    JWTManager, create_access_token, jwt_required, get_jwt
 )
-from db import db
+from werkzeug.utils import secure_filename
+from db import db, DB_CONFIG, DOCUMENT_FIELDS
+from migrations import migrate, pending_migrations
+from password_hasher import HasherBusyError
+from jobs import JobQueue, JOB_CONFIG, QueueFullError, file_kind, new_job_id
+from extraction_cache import extraction_cache
+from search_index import search_index
+from storage import file_store
+from bulk_import import DocumentImporter, IMPORT_CONFIG, iter_csv, iter_ndjson
+from classifier import classify_texts, get_classifier
+from http_cache import conditional_get, response_cache
+from history_writer import history_writer
+import metrics
 
 app = Flask(__name__)
 CORS(app)
@@ -12,6 +30,150 @@ CORS(app)
 app.config['JWT_SECRET_KEY'] = 'dms-secret-key-2025'  # Change for production
 jwt = JWTManager(app)
 
+# Let a fronting nginx/Apache send file bodies (X-Sendfile) instead of the worker
+app.config['USE_X_SENDFILE'] = os.environ.get('DMS_USE_X_SENDFILE') == '1'
+
+def classify_document(document, text):
+    """Fills in the type of a document uploaded without one. Returns the type, or None."""
+    predictions = classify_texts([text]) if text and text.strip() else []
+    if not predictions:
+        return None
+    document_type, probability = predictions[0]
+    db.update_document_type(document['id'], document_type)
+    db.add_document_history(
+        document['id'], document['owner_id'], f"Document type set to {document_type} by classifier ({probability:.2f})"
+    )
+    return document_type
+
+def store_extraction_result(job, result):
+    """Writes a finished extraction job back to its document row."""
+    if job['status'] == 'done':
+        summary = result.get('summary') or result.get('raw_text')
+        db.update_document_extraction(job['document_id'], 'done', summary)
+
+        document = db.get_document_by_id(job['document_id'])
+        if document:
+            search_index.index_document(
+                document['id'], document['company_id'], document['filename'], result.get('raw_text')
+            )
+            if document['document_type'] is None:
+                document['document_type'] = classify_document(document, result.get('raw_text'))
+            # Results cached before invoice extraction existed carry no fields
+            if document['document_type'] == 'invoice' and result.get('invoice_fields'):
+                db.save_invoice_fields(document['id'], document['company_id'], result['invoice_fields'])
+    else:
+        db.update_document_extraction(job['document_id'], 'failed')
+
+job_queue = JobQueue(**JOB_CONFIG, on_complete=store_extraction_result)
+
+metrics.registry.register_gauges('dms_db_pool', 'Database connection pool state', lambda: db.pool.stats())
+metrics.registry.register_gauges('dms_jobs', 'Extraction job queue state', job_queue.stats)
+metrics.registry.register_gauges('dms_extraction_cache', 'Extraction cache counters', extraction_cache.stats)
+metrics.registry.register_gauges('dms_user_cache', 'User cache counters', lambda: db.user_cache.stats())
+metrics.registry.register_gauges(
+    'dms_user_companies_cache', 'User company membership cache counters', lambda: db.user_companies_cache.stats()
+)
+metrics.registry.register_gauges('dms_response_cache', 'List response cache counters', response_cache.stats)
+metrics.registry.register_gauges('dms_history_writer', 'Write-behind document history buffer', history_writer.stats)
+
+# Load the summarization model in the background at startup instead of on the first upload
+WARMUP_MODEL = os.environ.get('DMS_WARMUP_MODEL') == '1'
+if WARMUP_MODEL:
+    import pdf_parser
+    pdf_parser.warmup()
+
+@app.before_request
+def start_profiling():
+    metrics.start_request()
+
+@app.after_request
+def finish_profiling(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    profile = metrics.finish_request(route, request.method, response.status_code)
+    if profile is None:
+        return response
+
+    repeated = profile.n_plus_one()
+    if repeated:
+        app.logger.warning(
+            "N+1 queries in %s %s: %d runs of one query template", request.method, route, max(repeated.values())
+        )
+
+    # Opt-in per-request breakdown for debugging from the client side
+    if request.headers.get('X-Profile'):
+        response.headers['X-Profile'] = json.dumps(profile.summary())
+    return response
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: the database answers, its schema is current and, with warmup, the model is loaded."""
+    checks = {}
+    try:
+        checks['pending_migrations'] = pending_migrations(db)
+        checks['database'] = True
+    except Exception as e:
+        checks['database'] = False
+        checks['database_error'] = str(e)
+
+    if WARMUP_MODEL:
+        import pdf_parser
+        checks['model_loaded'] = pdf_parser.is_model_loaded()
+
+    is_ready = (
+        checks['database']
+        and not checks.get('pending_migrations')
+        and checks.get('model_loaded', True)
+    )
+    return jsonify({"ready": is_ready, "checks": checks}), 200 if is_ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def check_company_access(company_id):
+    """Returns a 403 response unless the current user belongs to the company; admins always do."""
+    current_user_claims = get_jwt()
+    if current_user_claims.get('role') == 'admin':
+        return None
+    if db.user_has_company(current_user_claims['id'], company_id):
+        return None
+    return jsonify({"msg": "Access to this company is denied"}), 403
+
+def company_scopes(*kinds):
+    """
+    Version scopes of a company list endpoint, for conditional_get. Listings
+    also show user names, so they depend on the users scope too.
+    """
+    def scopes():
+        company_id = request.args.get('company_id', type=int)
+        if not company_id:
+            return None
+        denied = check_company_access(company_id)
+        if denied:
+            return denied
+        return [f"{kind}:{company_id}" for kind in kinds] + ['users']
+    return scopes
+
+def admin_scopes():
+    if get_jwt().get('role') != 'admin':
+        return jsonify({"msg": "Admin access required"}), 403
+    return ['users']
+
+def user_company_scopes():
+    return [f"user_companies:{get_jwt()['id']}"]
+
+def encode_cursor(cursor):
+    created_at, document_id = cursor
+    raw = json.dumps([created_at.isoformat(sep=' '), document_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(token):
+    created_at, document_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    return datetime.fromisoformat(created_at), int(document_id)
+
 @app.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -30,6 +192,8 @@ def register():
             "msg": "User registered successfully",
             "user_id": user_id
         }), 201
+    except HasherBusyError as e:
+        return jsonify({"msg": str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({"msg": str(e)}), 400
 
@@ -39,13 +203,23 @@ def login():
     if not data or 'username' not in data or 'password' not in data:
         return jsonify({"msg": "Missing username or password"}), 400
 
-    user = db.get_user_by_username(data['username'])
-    if not user or not db.verify_password(user['password_hash'], data['password']):
-        return jsonify({"msg": "Invalid credentials"}), 401
+    user = db.get_user_credentials(data['username'])
+    try:
+        if not user or not db.verify_password(user['password_hash'], data['password']):
+            return jsonify({"msg": "Invalid credentials"}), 401
+    except HasherBusyError as e:
+        return jsonify({"msg": str(e)}), 503, {'Retry-After': '1'}
 
     if not user['is_active']:
         return jsonify({"msg": "Account is deactivated"}), 401
 
+    # The bcrypt cost was changed since this hash was made: upgrade it while we have the password
+    if db.password_needs_rehash(user['password_hash']):
+        try:
+            db.update_user(user['id'], password=data['password'])
+        except HasherBusyError:
+            pass
+
     access_token = create_access_token(identity=user['username'], additional_claims={
         "id": user['id'],
         "role": user['role'],
@@ -56,6 +230,7 @@ def login():
 # Admin routes for user management
 @app.route('/admin/users', methods=['GET'])
 @jwt_required()
+@conditional_get(admin_scopes)
 def get_users():
     current_user_claims = get_jwt()
     if current_user_claims.get('role') != 'admin':
@@ -90,6 +265,8 @@ def create_user():
             "msg": "User created successfully",
             "user_id": user_id
         }), 201
+    except HasherBusyError as e:
+        return jsonify({"msg": str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({"msg": str(e)}), 400
 
@@ -117,6 +294,8 @@ def update_user(user_id):
             return jsonify({"msg": "User updated successfully"}), 200
         else:
             return jsonify({"msg": "User not found"}), 404
+    except HasherBusyError as e:
+        return jsonify({"msg": str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({"msg": str(e)}), 400
 
@@ -136,11 +315,39 @@ def delete_user(user_id):
     except Exception as e:
         return jsonify({"msg": str(e)}), 400
 
+@app.route('/admin/db/pool', methods=['GET'])
+@jwt_required()
+def get_pool_stats():
+    current_user_claims = get_jwt()
+    if current_user_claims.get('role') != 'admin':
+        return jsonify({"msg": "Admin access required"}), 403
+
+    return jsonify(db.pool.stats()), 200
+
+@app.route('/admin/extraction-cache', methods=['GET'])
+@jwt_required()
+def get_extraction_cache_stats():
+    current_user_claims = get_jwt()
+    if current_user_claims.get('role') != 'admin':
+        return jsonify({"msg": "Admin access required"}), 403
+
+    return jsonify(extraction_cache.stats()), 200
+
+@app.route('/admin/cache', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    current_user_claims = get_jwt()
+    if current_user_claims.get('role') != 'admin':
+        return jsonify({"msg": "Admin access required"}), 403
+
+    return jsonify(dict(db.cache_stats(), responses=response_cache.stats())), 200
+
 # Company management routes
 @app.route('/companies', methods=['GET'])
 @jwt_required()
+@conditional_get(user_company_scopes, vary_user=True)
 def get_companies():
-    current_user = get_jwt_identity()
+    current_user = get_jwt()
     try:
         companies = db.get_user_companies(current_user['id'])
         return jsonify(companies), 200
@@ -150,7 +357,7 @@ def get_companies():
 @app.route('/companies', methods=['POST'])
 @jwt_required()
 def create_company():
-    current_user = get_jwt_identity()
+    current_user = get_jwt()
     data = request.get_json()
     
     if not data or 'name' not in data:
@@ -170,23 +377,65 @@ def create_company():
 # Document management routes
 @app.route('/documents', methods=['GET'])
 @jwt_required()
+@conditional_get(company_scopes('documents', 'folders'))
 def get_documents():
-    current_user = get_jwt_identity()
+    current_user = get_jwt()
     company_id = request.args.get('company_id')
     
     if not company_id:
         return jsonify({"msg": "Company ID is required"}), 400
 
+    denied = check_company_access(company_id)
+    if denied:
+        return denied
+
+    document_type = request.args.get('document_type')
+    if document_type and document_type not in ['invoice', 'non_invoice']:
+        return jsonify({"msg": "Invalid document type"}), 400
+
+    fields = request.args.get('fields')
+    if fields:
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = [f for f in fields if f not in DOCUMENT_FIELDS]
+        if unknown:
+            return jsonify({"msg": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    # Without limit/cursor the legacy response (a plain array) is kept for existing clients
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    limit = None
+    cursor = None
+    if paginated:
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+            if request.args.get('cursor'):
+                cursor = decode_cursor(request.args['cursor'])
+        except (ValueError, TypeError):
+            return jsonify({"msg": "Invalid limit or cursor"}), 400
+
     try:
-        documents = db.get_documents_by_company(company_id)
-        return jsonify(documents), 200
+        documents, next_cursor = db.get_documents_page(
+            company_id,
+            limit=limit,
+            cursor=cursor,
+            fields=fields,
+            document_type=document_type,
+            folder_id=request.args.get('folder_id', type=int)
+        )
+        if not paginated:
+            return jsonify(documents), 200
+        return jsonify({
+            "documents": documents,
+            "next_cursor": encode_cursor(next_cursor) if next_cursor else None
+        }), 200
     except Exception as e:
         return jsonify({"msg": str(e)}), 500
 
 @app.route('/documents', methods=['POST'])
 @jwt_required()
 def create_document():
-    current_user = get_jwt_identity()
+    current_user = get_jwt()
     data = request.get_json()
     
     required_fields = ['company_id', 'filename', 'document_type']
@@ -196,6 +445,10 @@ def create_document():
     if data['document_type'] not in ['invoice', 'non_invoice']:
         return jsonify({"msg": "Invalid document type"}), 400
 
+    denied = check_company_access(data['company_id'])
+    if denied:
+        return denied
+
     try:
         document_id = db.create_document(
             owner_id=current_user['id'],
@@ -203,7 +456,9 @@ def create_document():
             filename=data['filename'],
             document_type=data['document_type']
         )
-        
+        # No text to extract, but the filename is searchable
+        search_index.index_document(document_id, data['company_id'], data['filename'], None)
+
         # Add to history
         db.add_document_history(document_id, current_user['id'], 'Document created')
         
@@ -214,18 +469,330 @@ def create_document():
     except Exception as e:
         return jsonify({"msg": str(e)}), 400
 
+@app.route('/documents/upload', methods=['POST'])
+@jwt_required()
+def upload_document():
+    """
+    Accepts either a multipart form (file, company_id, document_type, folder_id)
+    or the raw file as the request body with the same fields in the query string.
+    The raw form is streamed straight to storage without a temporary copy.
+    Without document_type the classifier fills it in once the text is extracted.
+    """
+    current_user_claims = get_jwt()
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        fields = request.form
+        original_filename = upload.filename if upload else None
+        stream = upload.stream if upload else None
+    else:
+        fields = request.args
+        original_filename = fields.get('filename')
+        stream = request.stream
+
+    company_id = fields.get('company_id')
+    document_type = fields.get('document_type')
+
+    if not stream or not original_filename or not company_id:
+        return jsonify({"msg": "Missing required fields"}), 400
+
+    if document_type and document_type not in ['invoice', 'non_invoice']:
+        return jsonify({"msg": "Invalid document type"}), 400
+    if not document_type and get_classifier() is None:
+        return jsonify({"msg": "Document type is required until a classifier model is trained"}), 400
+
+    denied = check_company_access(company_id)
+    if denied:
+        return denied
+
+    kind = file_kind(original_filename)
+    if not kind:
+        return jsonify({"msg": "Unsupported file type"}), 400
+
+    # Refuse early instead of storing a file that cannot be processed
+    if job_queue.is_full():
+        return jsonify({"msg": "Extraction queue is full, retry later"}), 503, {'Retry-After': '5'}
+
+    filename = secure_filename(original_filename)
+    document_id = None
+    tmp_path = None
+    try:
+        digest, file_size, file_path, tmp_path = file_store.stage_stream(stream)
+        job_id = new_job_id()
+        document_id = db.create_document(
+            owner_id=current_user_claims['id'],
+            company_id=company_id,
+            filename=filename,
+            document_type=document_type or None,
+            folder_id=fields.get('folder_id', type=int),
+            file_path=file_path,
+            file_size=file_size,
+            extraction_status='queued',
+            extraction_job_id=job_id
+        )
+        # Only once the row is committed, so a concurrent delete of the last other
+        # document with this content cannot unlink the file from under it
+        file_store.publish(tmp_path, file_path)
+        tmp_path = None
+        job_queue.submit(document_id, file_store.path(file_path), kind, digest=digest, job_id=job_id,
+                         company_id=company_id)
+        db.add_document_history(document_id, current_user_claims['id'], 'Document uploaded')
+
+        return jsonify({
+            "msg": "Document uploaded, extraction queued",
+            "document_id": document_id,
+            "job_id": job_id
+        }), 202
+    except QueueFullError as e:
+        delete_document_file(document_id)
+        return jsonify({"msg": str(e)}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        return jsonify({"msg": str(e)}), 400
+    finally:
+        if tmp_path:
+            file_store.discard(tmp_path)
+
+def delete_document_file(document_id):
+    """Deletes the document row, and its stored file once no other document shares it."""
+    return db.delete_document(document_id, on_unreferenced_file=file_store.delete)
+
+@app.route('/documents/<int:document_id>/download', methods=['GET'])
+@jwt_required()
+def download_document(document_id):
+    document = db.get_document_by_id(document_id)
+    if not document or not document['file_path']:
+        return jsonify({"msg": "Document not found"}), 404
+
+    denied = check_company_access(document['company_id'])
+    if denied:
+        return denied
+
+    path = file_store.path(document['file_path'])
+    if not os.path.exists(path):
+        return jsonify({"msg": "File not found"}), 404
+
+    # conditional=True answers Range and If-None-Match requests; the body is sent
+    # through the server's file wrapper (sendfile) rather than read into Python
+    return send_file(
+        path,
+        download_name=document['filename'],
+        as_attachment=True,
+        conditional=True,
+        etag=os.path.basename(document['file_path'])
+    )
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job_status(job_id):
+    # Only the worker that accepted the upload holds the job; the others answer from the document row
+    job = job_queue.status(job_id) or db.get_extraction_job(job_id)
+    if not job:
+        return jsonify({"msg": "Job not found"}), 404
+
+    denied = check_company_access(job['company_id'])
+    if denied:
+        return denied
+
+    return jsonify(job_response(job)), 200
+
+def job_response(job):
+    return {key: job[key] for key in ('job_id', 'document_id', 'status', 'error')}
+
+@app.route('/documents/import', methods=['POST'])
+@jwt_required()
+def import_documents():
+    current_user_claims = get_jwt()
+    company_id = request.args.get('company_id', type=int)
+    if not company_id:
+        return jsonify({"msg": "Company ID is required"}), 400
+
+    denied = check_company_access(company_id)
+    if denied:
+        return denied
+
+    batch_size = request.args.get('batch_size', IMPORT_CONFIG['default_batch_size'], type=int)
+    batch_size = max(1, min(batch_size, IMPORT_CONFIG['max_batch_size']))
+
+    import_format = request.args.get('format') or (
+        'csv' if request.mimetype == 'text/csv' else 'ndjson'
+    )
+    if import_format not in ('csv', 'ndjson'):
+        return jsonify({"msg": "Format must be csv or ndjson"}), 400
+
+    # The body is read as a stream; it is never loaded into memory as a whole
+    records = iter_csv(request.stream) if import_format == 'csv' else iter_ndjson(request.stream)
+    importer = DocumentImporter(db, current_user_claims['id'], company_id, batch_size)
+
+    try:
+        result = importer.run(records)
+        # 207: some rows were imported, the others are listed in errors; or imported
+        # batches are missing from the search index, listed in index_errors
+        return jsonify(result), 207 if result['failed'] or result['index_errors'] else 200
+    except Exception as e:
+        return jsonify({
+            "msg": str(e),
+            "imported": importer.imported,
+            "failed": importer.failed,
+            "errors": importer.errors,
+            "index_errors": importer.index_errors
+        }), 400
+
+@app.route('/documents/search', methods=['GET'])
+@jwt_required()
+def search_documents():
+    company_id = request.args.get('company_id', type=int)
+    query = request.args.get('q', '').strip()
+
+    if not company_id:
+        return jsonify({"msg": "Company ID is required"}), 400
+    if not query:
+        return jsonify({"msg": "Search query is required"}), 400
+
+    denied = check_company_access(company_id)
+    if denied:
+        return denied
+
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    try:
+        results = search_index.search(company_id, query, limit=limit, offset=offset)
+        filenames = db.get_document_filenames(company_id, [result['document_id'] for result in results])
+        return jsonify({"results": search_index.reconcile(results, filenames)}), 200
+    except Exception as e:
+        return jsonify({"msg": str(e)}), 500
+
+@app.route('/documents/<int:document_id>', methods=['DELETE'])
+@jwt_required()
+def delete_document(document_id):
+    document = db.get_document_by_id(document_id)
+    if not document:
+        return jsonify({"msg": "Document not found"}), 404
+
+    denied = check_company_access(document['company_id'])
+    if denied:
+        return denied
+
+    try:
+        success = delete_document_file(document_id)
+        if success:
+            search_index.remove_document(document_id)
+            return jsonify({"msg": "Document deleted successfully"}), 200
+        else:
+            return jsonify({"msg": "Document not found"}), 404
+    except Exception as e:
+        return jsonify({"msg": str(e)}), 400
+
 @app.route('/documents/<int:document_id>/history', methods=['GET'])
 @jwt_required()
 def get_document_history(document_id):
+    # Without limit/cursor the legacy response (a plain array) is kept for existing clients
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    limit = None
+    cursor = None
+    if paginated:
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+            if request.args.get('cursor'):
+                cursor = decode_cursor(request.args['cursor'])
+        except (ValueError, TypeError):
+            return jsonify({"msg": "Invalid limit or cursor"}), 400
+
     try:
-        history = db.get_document_history(document_id)
-        return jsonify(history), 200
+        history, next_cursor = db.get_document_history_page(document_id, limit=limit, cursor=cursor)
+        if not paginated:
+            return jsonify(history), 200
+        return jsonify({
+            "history": history,
+            "next_cursor": encode_cursor(next_cursor) if next_cursor else None,
+            # Months older than the retention window only survive as per-action counts,
+            # which come after the oldest event, on the last page
+            "compacted": db.get_document_history_summary(document_id) if not next_cursor else []
+        }), 200
+    except Exception as e:
+        return jsonify({"msg": str(e)}), 500
+
+# Invoice routes
+def invoice_filters():
+    """Filters shared by the invoice listing and totals; raises ValueError on bad input."""
+    args = request.args
+    return {
+        'date_from': date.fromisoformat(args['date_from']) if args.get('date_from') else None,
+        'date_to': date.fromisoformat(args['date_to']) if args.get('date_to') else None,
+        'min_total': Decimal(args['min_total']) if args.get('min_total') else None,
+        'max_total': Decimal(args['max_total']) if args.get('max_total') else None,
+        'supplier': args.get('supplier') or None,
+        'currency': args['currency'].upper() if args.get('currency') else None,
+    }
+
+def encode_invoice_cursor(cursor):
+    invoice_date, document_id = cursor
+    raw = json.dumps([invoice_date.isoformat() if invoice_date else None, document_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_invoice_cursor(token):
+    invoice_date, document_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    return (date.fromisoformat(invoice_date) if invoice_date else None), int(document_id)
+
+@app.route('/invoices', methods=['GET'])
+@jwt_required()
+def get_invoices():
+    company_id = request.args.get('company_id', type=int)
+    if not company_id:
+        return jsonify({"msg": "Company ID is required"}), 400
+
+    denied = check_company_access(company_id)
+    if denied:
+        return denied
+
+    try:
+        filters = invoice_filters()
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+        cursor = decode_invoice_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except (ValueError, TypeError, ArithmeticError):
+        return jsonify({"msg": "Invalid filter, limit or cursor"}), 400
+
+    try:
+        invoices, next_cursor = db.get_invoices(company_id, limit=limit, cursor=cursor, **filters)
+        return jsonify({
+            "invoices": invoices,
+            "next_cursor": encode_invoice_cursor(next_cursor) if next_cursor else None
+        }), 200
+    except Exception as e:
+        return jsonify({"msg": str(e)}), 500
+
+@app.route('/invoices/totals', methods=['GET'])
+@jwt_required()
+def get_invoice_totals():
+    company_id = request.args.get('company_id', type=int)
+    if not company_id:
+        return jsonify({"msg": "Company ID is required"}), 400
+
+    group_by = request.args.get('group_by', 'month')
+    if group_by not in ('month', 'supplier', 'currency'):
+        return jsonify({"msg": "group_by must be month, supplier or currency"}), 400
+
+    denied = check_company_access(company_id)
+    if denied:
+        return denied
+
+    try:
+        filters = invoice_filters()
+    except (ValueError, ArithmeticError):
+        return jsonify({"msg": "Invalid filter"}), 400
+
+    try:
+        return jsonify({"totals": db.get_invoice_totals(company_id, group_by=group_by, **filters)}), 200
     except Exception as e:
         return jsonify({"msg": str(e)}), 500
 
 # Folder management routes
 @app.route('/folders', methods=['GET'])
 @jwt_required()
+@conditional_get(company_scopes('folders'))
 def get_folders():
     company_id = request.args.get('company_id')
     parent_id = request.args.get('parent_id')
@@ -233,6 +800,10 @@ def get_folders():
     if not company_id:
         return jsonify({"msg": "Company ID is required"}), 400
 
+    denied = check_company_access(company_id)
+    if denied:
+        return denied
+
     try:
         folders = db.get_folders_by_company(
             company_id, 
@@ -242,16 +813,88 @@ def get_folders():
     except Exception as e:
         return jsonify({"msg": str(e)}), 500
 
+def build_folder_tree(folders, root_ids):
+    """
+    Nests flat folder rows under their parents and adds total_document_count,
+    the number of documents in the folder and all of its descendants.
+    """
+    nodes = {folder['id']: dict(folder, children=[]) for folder in folders}
+    for node in nodes.values():
+        parent = nodes.get(node['parent_id'])
+        if parent is not None and node['id'] not in root_ids:
+            parent['children'].append(node)
+
+    def total(node):
+        node['total_document_count'] = node['document_count'] + sum(total(child) for child in node['children'])
+        return node['total_document_count']
+
+    roots = [nodes[folder_id] for folder_id in root_ids if folder_id in nodes]
+    for root in roots:
+        total(root)
+    return roots
+
+@app.route('/folders/tree', methods=['GET'])
+@jwt_required()
+def get_folder_tree():
+    company_id = request.args.get('company_id', type=int)
+    folder_id = request.args.get('folder_id', type=int)
+
+    if not company_id and not folder_id:
+        return jsonify({"msg": "Company ID or folder ID is required"}), 400
+
+    try:
+        if folder_id:
+            folders = db.get_folder_subtree(folder_id)
+            if not folders:
+                return jsonify({"msg": "Folder not found"}), 404
+            if company_id and folders[0]['company_id'] != company_id:
+                return jsonify({"msg": "Folder not found"}), 404
+            denied = check_company_access(folders[0]['company_id'])
+            if denied:
+                return denied
+            root_ids = [folder_id]
+        else:
+            denied = check_company_access(company_id)
+            if denied:
+                return denied
+            folders = db.get_company_folders_with_counts(company_id)
+            known = {folder['id'] for folder in folders}
+            root_ids = [folder['id'] for folder in folders if folder['parent_id'] not in known]
+        return jsonify(build_folder_tree(folders, root_ids)), 200
+    except Exception as e:
+        return jsonify({"msg": str(e)}), 500
+
+@app.route('/folders/<int:folder_id>/path', methods=['GET'])
+@jwt_required()
+def get_folder_path(folder_id):
+    try:
+        ancestors = db.get_folder_ancestors(folder_id)
+        if not ancestors:
+            return jsonify({"msg": "Folder not found"}), 404
+        denied = check_company_access(ancestors[0]['company_id'])
+        if denied:
+            return denied
+        return jsonify({
+            "path": ' / '.join(folder['name'] for folder in ancestors),
+            "ancestors": ancestors
+        }), 200
+    except Exception as e:
+        return jsonify({"msg": str(e)}), 500
+
 @app.route('/folders', methods=['POST'])
 @jwt_required()
 def create_folder():
-    current_user = get_jwt_identity()
+    current_user = get_jwt()
     data = request.get_json()
     
     required_fields = ['name', 'company_id']
     if not data or not all(field in data for field in required_fields):
         return jsonify({"msg": "Missing required fields"}), 400
 
+    denied = check_company_access(data['company_id'])
+    if denied:
+        return denied
+
     try:
         folder_id = db.create_folder(
             name=data['name'],
@@ -299,4 +942,7 @@ def delete_folder(folder_id):
         return jsonify({"msg": str(e)}), 400
 
 if __name__ == '__main__':
+    # Development server: apply migrations here; deployments run `python migrations.py` first
+    migrate(db, DB_CONFIG)
+    db.fail_interrupted_extractions()
     app.run(host='0.0.0.0', debug=True)
\ No newline at end of file
@@ -0,0 +1,289 @@
+# backend/asgi_app.py
+#
+# Async serving mode:
+#
+#     uvicorn asgi_app:app --workers 4
+#     gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi_app:app
+#
+# The read routes the frontend polls run on the event loop with aiomysql.
+# Every other route falls through to the Flask app mounted below them, which
+# a2wsgi runs on its own thread pool. It hands request and response bodies
+# over chunk by chunk, so uploads, imports and downloads stream in both
+# serving modes. Extraction already runs on the job process pool, so no
+# request ever waits on CPU-bound parsing in the loop.
+
+import os
+import time
+from contextlib import asynccontextmanager
+from functools import wraps
+
+import jwt
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from a2wsgi import WSGIMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+import metrics
+from app import (
+    app as flask_app, job_queue, job_response, decode_cursor, encode_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+)
+from async_db import async_db
+from cache import MISSING
+from db import DOCUMENT_FIELDS
+from http_cache import HTTP_CACHE_CONFIG, cache_key, response_cache
+from search_index import search_index
+
+# Threads running Flask requests; as many as Starlette's own thread pool has
+WSGI_THREADS = int(os.environ.get('DMS_WSGI_THREADS', '40'))
+
+JWT_SECRET_KEY = flask_app.config['JWT_SECRET_KEY']
+JWT_ALGORITHM = flask_app.config.get('JWT_ALGORITHM', 'HS256')
+
+class FlaskJSONResponse(Response):
+    """Serialises like Flask's jsonify, so both serving modes return identical bodies."""
+    media_type = 'application/json'
+
+    def render(self, content):
+        return (flask_app.json.dumps(content) + '\n').encode('utf-8')
+
+def json_response(content, status_code=200):
+    return FlaskJSONResponse(content, status_code=status_code)
+
+class TokenError(Exception):
+    def __init__(self, msg, status_code):
+        super().__init__(msg)
+        self.msg = msg
+        self.status_code = status_code
+
+def decode_access_token(request):
+    """The claims of the bearer token, checked like flask_jwt_extended does."""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme != 'Bearer' or not token:
+        raise TokenError("Missing Authorization Header", 401)
+    try:
+        claims = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise TokenError("Token has expired", 401)
+    except jwt.InvalidTokenError as e:
+        raise TokenError(str(e), 422)
+    if claims.get('type') != 'access':
+        raise TokenError("Only non-refresh tokens are allowed", 422)
+    return claims
+
+def jwt_required(endpoint):
+    @wraps(endpoint)
+    async def wrapper(request):
+        try:
+            request.state.claims = decode_access_token(request)
+        except TokenError as e:
+            return json_response({"msg": e.msg}, e.status_code)
+        return await endpoint(request)
+    return wrapper
+
+def instrumented(route, endpoint):
+    """Records request latency under the Flask route name, as the Flask hooks do."""
+    @wraps(endpoint)
+    async def wrapper(request):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await endpoint(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics.request_latency.observe(
+                time.perf_counter() - start, route=route, method=request.method, status=status
+            )
+    return wrapper
+
+async def check_company_access(request, company_id):
+    claims = request.state.claims
+    if claims.get('role') == 'admin':
+        return None
+    if await async_db.user_has_company(claims['id'], company_id):
+        return None
+    return json_response({"msg": "Access to this company is denied"}, 403)
+
+def int_param(request, name):
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return None
+
+def if_none_match(request, etag):
+    tags = [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+    return '*' in tags or f'"{etag}"' in tags
+
+async def conditional_get(request, scopes, render, user_id=None):
+    """Async counterpart of http_cache.conditional_get; both modes produce the same ETags."""
+    key, etag = cache_key(request.url.path, request.query_params.multi_items(),
+                          await async_db.get_versions(scopes), user_id)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+
+    if if_none_match(request, etag):
+        return Response(status_code=304, headers=headers)
+    if HTTP_CACHE_CONFIG['response_cache']:
+        cached = response_cache.get(key)
+        if cached is not MISSING:
+            body, mimetype = cached
+            return Response(body, status_code=200, headers=headers, media_type=mimetype)
+
+    response = await render()
+    if response.status_code == 200:
+        response.headers.update(headers)
+        if HTTP_CACHE_CONFIG['response_cache']:
+            response_cache.set(key, (response.body, response.media_type))
+    return response
+
+@jwt_required
+async def get_documents(request):
+    args = request.query_params
+    company_id = args.get('company_id')
+    if not company_id:
+        return json_response({"msg": "Company ID is required"}, 400)
+
+    denied = await check_company_access(request, company_id)
+    if denied:
+        return denied
+
+    document_type = args.get('document_type')
+    if document_type and document_type not in ['invoice', 'non_invoice']:
+        return json_response({"msg": "Invalid document type"}, 400)
+
+    fields = args.get('fields')
+    if fields:
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = [f for f in fields if f not in DOCUMENT_FIELDS]
+        if unknown:
+            return json_response({"msg": f"Unknown fields: {', '.join(unknown)}"}, 400)
+
+    # Without limit/cursor the legacy response (a plain array) is kept for existing clients
+    paginated = 'limit' in args or 'cursor' in args
+    limit = None
+    cursor = None
+    if paginated:
+        try:
+            limit = min(int(args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+            if args.get('cursor'):
+                cursor = decode_cursor(args['cursor'])
+        except (ValueError, TypeError):
+            return json_response({"msg": "Invalid limit or cursor"}, 400)
+
+    async def render():
+        try:
+            documents, next_cursor = await async_db.get_documents_page(
+                company_id,
+                limit=limit,
+                cursor=cursor,
+                fields=fields,
+                document_type=document_type,
+                folder_id=int_param(request, 'folder_id')
+            )
+        except Exception as e:
+            return json_response({"msg": str(e)}, 500)
+        if not paginated:
+            return json_response(documents)
+        return json_response({
+            "documents": documents,
+            "next_cursor": encode_cursor(next_cursor) if next_cursor else None
+        })
+
+    scopes = [f"documents:{company_id}", f"folders:{company_id}", 'users']
+    return await conditional_get(request, scopes, render)
+
+@jwt_required
+async def get_folders(request):
+    company_id = request.query_params.get('company_id')
+    parent_id = request.query_params.get('parent_id')
+    if not company_id:
+        return json_response({"msg": "Company ID is required"}, 400)
+
+    denied = await check_company_access(request, company_id)
+    if denied:
+        return denied
+
+    async def render():
+        try:
+            folders = await async_db.get_folders_by_company(company_id, parent_id=int(parent_id) if parent_id else None)
+            return json_response(folders)
+        except Exception as e:
+            return json_response({"msg": str(e)}, 500)
+
+    return await conditional_get(request, [f"folders:{company_id}", 'users'], render)
+
+@jwt_required
+async def get_companies(request):
+    user_id = request.state.claims['id']
+
+    async def render():
+        try:
+            return json_response(await async_db.get_user_companies(user_id))
+        except Exception as e:
+            return json_response({"msg": str(e)}, 500)
+
+    return await conditional_get(request, [f"user_companies:{user_id}"], render, user_id=user_id)
+
+@jwt_required
+async def search_documents(request):
+    company_id = int_param(request, 'company_id')
+    query = request.query_params.get('q', '').strip()
+
+    if not company_id:
+        return json_response({"msg": "Company ID is required"}, 400)
+    if not query:
+        return json_response({"msg": "Search query is required"}, 400)
+
+    denied = await check_company_access(request, company_id)
+    if denied:
+        return denied
+
+    limit = min(int_param(request, 'limit') or 20, 100)
+    offset = max(int_param(request, 'offset') or 0, 0)
+
+    try:
+        # SQLite is synchronous; the search runs on the thread pool
+        results = await run_in_threadpool(search_index.search, company_id, query, limit=limit, offset=offset)
+        filenames = await async_db.get_document_filenames(company_id, [result['document_id'] for result in results])
+        results = await run_in_threadpool(search_index.reconcile, results, filenames)
+        return json_response({"results": results})
+    except Exception as e:
+        return json_response({"msg": str(e)}, 500)
+
+@jwt_required
+async def get_job_status(request):
+    job_id = request.path_params['job_id']
+    job = job_queue.status(job_id) or await async_db.get_extraction_job(job_id)
+    if not job:
+        return json_response({"msg": "Job not found"}, 404)
+
+    denied = await check_company_access(request, job['company_id'])
+    if denied:
+        return denied
+
+    return json_response(job_response(job))
+
+@asynccontextmanager
+async def lifespan(app):
+    await async_db.connect()
+    try:
+        yield
+    finally:
+        await async_db.close()
+
+metrics.registry.register_gauges('dms_async_db_pool', 'Async database connection pool state', async_db.stats)
+
+app = Starlette(
+    routes=[
+        Route('/documents', instrumented('/documents', get_documents), methods=['GET']),
+        Route('/documents/search', instrumented('/documents/search', search_documents), methods=['GET']),
+        Route('/folders', instrumented('/folders', get_folders), methods=['GET']),
+        Route('/companies', instrumented('/companies', get_companies), methods=['GET']),
+        Route('/jobs/{job_id}', instrumented('/jobs/<job_id>', get_job_status), methods=['GET']),
+        # Everything else, and other methods on the paths above, is served by Flask
+        Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+    ],
+    lifespan=lifespan
+)
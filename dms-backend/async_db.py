@@ -0,0 +1,108 @@
+# backend/async_db.py
+
+import time
+
+import aiomysql
+
+from cache import MISSING
+from db import DB_CONFIG, EXTRACTION_JOB_QUERY, POOL_CONFIG, USER_COMPANIES_QUERY, DatabaseManager, db
+import metrics
+
+class AsyncDatabase:
+    """
+    aiomysql counterpart of the read side of DatabaseManager, used by the ASGI
+    app. It runs the same SQL on its own connection pool and shares the
+    in-process user caches with the synchronous manager.
+    """
+
+    def __init__(self, db_config, pool_size, sync_db):
+        self.db_config = db_config
+        self.pool_size = pool_size
+        self.sync_db = sync_db
+        self._pool = None
+
+    async def connect(self):
+        self._pool = await aiomysql.create_pool(
+            host=self.db_config['host'],
+            port=self.db_config['port'],
+            user=self.db_config['user'],
+            password=self.db_config['password'],
+            db=self.db_config['database'],
+            minsize=1,
+            maxsize=self.pool_size,
+            # Every query sees the latest commit instead of a snapshot held by the pooled connection
+            autocommit=True,
+            pool_recycle=3600
+        )
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    def stats(self):
+        if self._pool is None:
+            return {}
+        return {'size': self._pool.size, 'free': self._pool.freesize, 'max_size': self._pool.maxsize}
+
+    async def execute_query(self, query, params=None, fetch=False):
+        async with self._pool.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                start = time.perf_counter()
+                rows = 0
+                try:
+                    await cursor.execute(query, params or ())
+                    if fetch:
+                        result = list(await cursor.fetchall())
+                        rows = len(result)
+                        return result
+                    rows = cursor.rowcount
+                    return cursor.lastrowid
+                except aiomysql.Error as e:
+                    print(f"Database error: {e}")
+                    raise
+                finally:
+                    metrics.record_query(query, time.perf_counter() - start, rows)
+
+    async def get_user_companies(self, user_id):
+        companies = self.sync_db.user_companies_cache.get(user_id)
+        if companies is not MISSING:
+            return companies
+        companies = await self.execute_query(USER_COMPANIES_QUERY, (user_id,), fetch=True)
+        self.sync_db.user_companies_cache.set(user_id, companies)
+        return companies
+
+    async def user_has_company(self, user_id, company_id):
+        try:
+            company_id = int(company_id)
+        except (TypeError, ValueError):
+            return False
+        return any(company['id'] == company_id for company in await self.get_user_companies(user_id))
+
+    async def get_versions(self, scopes):
+        rows = await self.execute_query(DatabaseManager.versions_query(scopes), list(scopes), fetch=True)
+        versions = {row['scope']: row['version'] for row in rows}
+        return {scope: versions.get(scope, 0) for scope in scopes}
+
+    async def get_documents_page(self, company_id, limit=None, cursor=None, fields=None,
+                                 document_type=None, folder_id=None):
+        query, params, fields = DatabaseManager.documents_page_query(
+            company_id, limit, cursor, fields, document_type, folder_id
+        )
+        return DatabaseManager.documents_page_result(await self.execute_query(query, params, fetch=True), limit, fields)
+
+    async def get_extraction_job(self, job_id):
+        result = await self.execute_query(EXTRACTION_JOB_QUERY, (job_id,), fetch=True)
+        return dict(result[0], error=None) if result else None
+
+    async def get_document_filenames(self, company_id, document_ids):
+        if not document_ids:
+            return {}
+        rows = await self.execute_query(*DatabaseManager.document_filenames_query(company_id, document_ids), fetch=True)
+        return {row['id']: row['filename'] for row in rows}
+
+    async def get_folders_by_company(self, company_id, parent_id=None):
+        return await self.execute_query(*DatabaseManager.folders_query(company_id, parent_id), fetch=True)
+
+async_db = AsyncDatabase(DB_CONFIG, POOL_CONFIG['pool_size'], db)
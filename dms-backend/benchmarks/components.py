@@ -0,0 +1,554 @@
+# backend/benchmarks/components.py
+#
+# Benchmarks of single components, next to the HTTP load test in
+# benchmarks.run (which also covers other routes during a login storm).
+# pool-scaling, folder-tree and user-cache reset and seed the bench database
+# like benchmarks.run does; worker-memory and startup start their own
+# processes. From dms-backend/:
+#
+#     python -m benchmarks.components summarizer-batch --model real --record
+#     python -m benchmarks.components worker-memory --model real --workers 4
+#     python -m benchmarks.components pool-scaling folder-tree user-cache
+#     python -m benchmarks.components summary-scaling extraction-speedup startup ocr-throughput
+#
+# Each component returns a result dict that is printed, written to --output and
+# checked against the component's entry under "components" in --thresholds:
+# "min_<metric>" and "max_<metric>" bound result[<metric>], any other key is a
+# setting the benchmark chose and --record wrote back.
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.join(BACKEND_DIR, 'benchmarks')
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def timed_calls(function, items, concurrency):
+    """Calls function(item) from `concurrency` threads; returns (elapsed seconds, per-call latencies)."""
+    def call(item):
+        start = time.perf_counter()
+        function(item)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(call, items))
+    return time.perf_counter() - start, latencies
+
+def summarizer_batch(args, limits, log):
+    """
+    Sweeps BatchSummarizer's max_batch_size with `concurrency` jobs summarizing
+    at once, and picks the fastest size whose p95 stays under the limit.
+    """
+    from pdf_parser import SUMMARIZER_CONFIG, BatchSummarizer, build_summarizer
+    from benchmarks.generators import document_text
+
+    rng = random.Random(args.seed)
+    # One to six documents' worth of text, so the batches mix lengths like real uploads
+    texts = ['\n\n'.join(document_text(rng) for _ in range(rng.randint(1, 6))) for _ in range(args.texts)]
+    summarizer = build_summarizer(SUMMARIZER_CONFIG['quantize'])
+
+    sizes = {}
+    for size in args.batch_sizes:
+        batcher = BatchSummarizer(lambda: summarizer, size, SUMMARIZER_CONFIG['batch_window'],
+                                  SUMMARIZER_CONFIG['max_length'], SUMMARIZER_CONFIG['min_length'])
+        batcher.summarize(texts[0])
+        elapsed, latencies = timed_calls(batcher.summarize, texts, args.concurrency)
+        sizes[size] = {
+            'texts_per_second': round(len(texts) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        }
+        log(f"  batch size {size:>3}: {sizes[size]['texts_per_second']:>8.2f} texts/s  "
+            f"p50 {sizes[size]['p50_ms']:>9.1f}  p95 {sizes[size]['p95_ms']:>9.1f} ms")
+
+    within = [size for size in sizes if 'max_p95_ms' not in limits or sizes[size]['p95_ms'] <= limits['max_p95_ms']]
+    chosen = max(within or sizes, key=lambda size: sizes[size]['texts_per_second'])
+    log(f"  chosen batch size {chosen} (DMS_SUMMARY_BATCH_SIZE is {SUMMARIZER_CONFIG['max_batch_size']})")
+    return dict(sizes[chosen], batch_size=chosen, model=SUMMARIZER_CONFIG['model'],
+                concurrency=args.concurrency, sizes=sizes)
+
+def read_memory(pid):
+    """Rss, Pss and their split into shared and private pages of a process, in MB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding='ascii') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0]) / 1024
+    return {
+        'rss_mb': round(fields['Rss'], 1),
+        'pss_mb': round(fields['Pss'], 1),
+        'shared_mb': round(fields['Shared_Clean'] + fields['Shared_Dirty'], 1),
+        'private_mb': round(fields['Private_Clean'] + fields['Private_Dirty'], 1),
+    }
+
+def child_pids(pid):
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children", encoding='ascii') as f:
+            children += [int(child) for child in f.read().split()]
+    return children
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def settled_worker_memory(master, workers, timeout):
+    """
+    Memory of the workers once all of them are up and their total Rss stopped
+    growing, i.e. each one finished loading (or mapping) the model.
+    """
+    deadline = time.monotonic() + timeout
+    previous, stable = None, 0
+    while time.monotonic() < deadline:
+        if master.poll() is not None:
+            raise SystemExit(f"gunicorn exited with status {master.returncode}")
+        pids = child_pids(master.pid)
+        if len(pids) == workers:
+            try:
+                memory = {pid: read_memory(pid) for pid in pids}
+            except (OSError, KeyError):
+                memory = None
+            total = memory and round(sum(m['rss_mb'] for m in memory.values()))
+            stable = stable + 1 if memory and total == previous else 0
+            previous = total
+            if stable >= 4:
+                return memory
+        time.sleep(0.5)
+    raise SystemExit(f"gunicorn workers did not settle within {timeout}s")
+
+def worker_memory(args, limits, log):
+    """
+    Starts gunicorn with and without DMS_PRELOAD_MODEL and reads every
+    worker's Rss and Pss once the model is loaded. Pss charges shared pages
+    to the processes sharing them, so it is what a worker really costs.
+    """
+    result = {'workers': args.workers}
+    for preload in (False, True):
+        env = dict(os.environ, WEB_CONCURRENCY=str(args.workers), DMS_BIND=f"127.0.0.1:{free_port()}",
+                   DMS_PRELOAD_MODEL='1' if preload else '0', DMS_WARMUP_MODEL='1')
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning', 'app:app']
+        master = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+        try:
+            memory = settled_worker_memory(master, args.workers, args.startup_timeout)
+            master_memory = read_memory(master.pid)
+        finally:
+            master.terminate()
+            master.wait(timeout=30)
+
+        label = 'preload' if preload else 'no_preload'
+        result[label] = {
+            'workers': list(memory.values()),
+            'master': master_memory,
+            'rss_mb_per_worker': round(sum(m['rss_mb'] for m in memory.values()) / len(memory), 1),
+            'pss_mb_per_worker': round(sum(m['pss_mb'] for m in memory.values()) / len(memory), 1),
+            'total_pss_mb': round(sum(m['pss_mb'] for m in memory.values()) + master_memory['pss_mb'], 1),
+        }
+        log(f"  {label:<10}: per worker Rss {result[label]['rss_mb_per_worker']:>8.1f} MB  "
+            f"Pss {result[label]['pss_mb_per_worker']:>8.1f} MB  total Pss {result[label]['total_pss_mb']:>8.1f} MB")
+
+    result['pss_mb_per_worker'] = result['preload']['pss_mb_per_worker']
+    result['total_pss_mb'] = result['preload']['total_pss_mb']
+    result['pss_saved_mb_per_worker'] = round(
+        result['no_preload']['pss_mb_per_worker'] - result['preload']['pss_mb_per_worker'], 1
+    )
+    log(f"  preloading saves {result['pss_saved_mb_per_worker']} MB Pss per worker")
+    return result
+
+def pool_scaling(args, limits, log):
+    """
+    Calls of the document listing from more and more threads sharing the
+    connection pool. Throughput should grow with the threads until the pool
+    or the database is saturated, and pool waits only start past pool_size.
+    """
+    from db import POOL_CONFIG, db
+
+    fixtures = database_fixtures(args, log)
+    companies = [company['id'] for company in fixtures['companies']]
+    db.get_documents_page(companies[0], limit=50)
+
+    threads = {}
+    for count in args.threads:
+        before = db.pool.stats()
+        elapsed, latencies = timed_calls(lambda i: db.get_documents_page(companies[i % len(companies)], limit=50),
+                                         range(args.calls), count)
+        after = db.pool.stats()
+        checkouts = after['checkouts'] - before['checkouts']
+        threads[count] = {
+            'queries_per_second': round(args.calls / elapsed, 1),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+            'pool_wait_avg_ms': round((after['wait_time_total'] - before['wait_time_total']) / checkouts * 1000, 2),
+        }
+        log(f"  {count:>3} threads: {threads[count]['queries_per_second']:>8.1f} queries/s  "
+            f"p95 {threads[count]['p95_ms']:>7.1f} ms  pool wait {threads[count]['pool_wait_avg_ms']:>6.2f} ms")
+
+    best = max(threads, key=lambda count: threads[count]['queries_per_second'])
+    speedup = round(threads[best]['queries_per_second'] / threads[min(threads)]['queries_per_second'], 2)
+    log(f"  {speedup}x the single-thread throughput at {best} threads (pool size {POOL_CONFIG['pool_size']})")
+    return {'speedup': speedup, 'best_threads': best, 'pool_size': POOL_CONFIG['pool_size'], 'threads': threads}
+
+def summary_scaling(args, limits, log):
+    """
+    Wall time of summarize_text against page count. max_chunks caps the model
+    calls spent on one document, so past it the time should stop growing:
+    scaling_exponent is the log-log slope between the two largest documents.
+    """
+    import math
+    from pdf_parser import SUMMARIZER_CONFIG, get_summarizer, summarize_text
+    from benchmarks.generators import page_texts
+
+    get_summarizer()
+    pages = {}
+    for count in sorted(args.pages):
+        text = '\n'.join(page_texts(args.seed, count))
+        start = time.perf_counter()
+        summarize_text(text).result()
+        pages[count] = round(time.perf_counter() - start, 3)
+        log(f"  {count:>5} pages: {pages[count]:>8.2f} s  {pages[count] / count * 1000:>8.1f} ms/page")
+
+    small, large = sorted(pages)[-2:]
+    exponent = round(math.log(pages[large] / pages[small]) / math.log(large / small), 2)
+    log(f"  scaling exponent {exponent} between {small} and {large} pages")
+    return {'seconds_at_max_pages': pages[large], 'scaling_exponent': exponent, 'model': SUMMARIZER_CONFIG['model'],
+            'pages': pages}
+
+def extraction_speedup(args, limits, log):
+    """
+    Text extraction of one large PDF with the page pool at 1 worker up to
+    one per core. efficiency is the speedup at the most workers divided by
+    their number: 1.0 is perfect scaling.
+    """
+    import tempfile
+    import pdf_parser
+    from benchmarks.generators import make_pdf, page_texts
+
+    cores = os.cpu_count() or 1
+    counts = sorted({workers for workers in (1, 2, 4, 8, 16, 32, 64) if workers < cores} | {cores})
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        f.write(make_pdf([text.split('\n') for text in page_texts(args.seed, args.pdf_pages)]))
+    try:
+        seconds = {}
+        for workers in counts:
+            pdf_parser.EXTRACTION_CONFIG['workers'] = workers
+            if pdf_parser._page_executor is not None:
+                pdf_parser._page_executor.shutdown()
+                pdf_parser._page_executor = None
+            if workers > 1:
+                # The first run starts the pool's processes
+                pdf_parser.extract_text_from_pdf(f.name)
+            start = time.perf_counter()
+            pdf_parser.extract_text_from_pdf(f.name)
+            seconds[workers] = round(time.perf_counter() - start, 3)
+            log(f"  {workers:>3} workers: {seconds[workers]:>8.2f} s  {args.pdf_pages / seconds[workers]:>8.1f} pages/s  "
+                f"{seconds[1] / seconds[workers]:>5.2f}x")
+    finally:
+        os.remove(f.name)
+
+    speedup = round(seconds[1] / seconds[cores], 2)
+    return {'speedup': speedup, 'efficiency': round(speedup / cores, 2), 'cores': cores,
+            'pages': args.pdf_pages, 'seconds': seconds}
+
+@contextmanager
+def counted_queries(db):
+    """Yields the list of queries db.execute_query runs in the block."""
+    queries = []
+    execute_query = db.execute_query
+
+    def counting(query, *args, **kwargs):
+        queries.append(query)
+        return execute_query(query, *args, **kwargs)
+
+    db.execute_query = counting
+    try:
+        yield queries
+    finally:
+        del db.execute_query
+
+def folder_tree(args, limits, log):
+    """
+    A company with --folders folders in --depth levels. Compares the breadcrumb
+    of the deepest folders walked one get_folder_by_id per ancestor with the
+    recursive CTE, and times the whole-company tree and a top-level subtree.
+    """
+    from app import build_folder_tree
+    from db import db
+    from benchmarks.generators import seed_folder_tree
+
+    fixtures = database_fixtures(args, log)
+    created_by = fixtures['companies'][0]['user_ids'][0]
+    company_id = db.create_company(f"Bench Folder Tree {args.seed}")
+    start = time.perf_counter()
+    levels = seed_folder_tree(company_id, created_by, args.folders, args.depth, args.seed)
+    log(f"  seeded {sum(len(level) for level in levels)} folders in {len(levels)} levels "
+        f"in {time.perf_counter() - start:.1f}s")
+
+    def walk_path(folder_id):
+        names = []
+        while folder_id is not None:
+            folder = db.get_folder_by_id(folder_id)
+            names.append(folder['name'])
+            folder_id = folder['parent_id']
+        return ' / '.join(reversed(names))
+
+    def tree():
+        folders = db.get_company_folders_with_counts(company_id)
+        known = {folder['id'] for folder in folders}
+        return build_folder_tree(folders, [folder['id'] for folder in folders if folder['parent_id'] not in known])
+
+    rng = random.Random(args.seed)
+    deepest = [rng.choice(levels[-1]) for _ in range(args.calls // 10 or 1)]
+    result = {'folders': sum(len(level) for level in levels), 'depth': len(levels)}
+    for name, function, items in (('walk_path', walk_path, deepest), ('path', db.get_folder_path, deepest),
+                                  ('subtree', db.get_folder_subtree, levels[0][:20]),
+                                  ('tree', lambda _: tree(), range(5))):
+        with counted_queries(db) as queries:
+            _, latencies = timed_calls(function, items, 1)
+        result[f"{name}_queries"] = round(len(queries) / len(items), 1)
+        result[f"{name}_p95_ms"] = round(percentile(latencies, 0.95) * 1000, 1)
+        log(f"  {name:<10}: {result[f'{name}_queries']:>5.1f} queries  p95 {result[f'{name}_p95_ms']:>8.1f} ms")
+    return result
+
+def user_cache(args, limits, log):
+    """
+    Runs the same authenticated requests twice through the Flask app, once
+    with the user caches emptied before every request and once warm, and
+    counts the queries each request saves.
+    """
+    from flask_jwt_extended import create_access_token
+    from app import app
+    from db import db
+
+    fixtures = database_fixtures(args, log)
+    with app.app_context():
+        users = [
+            (create_access_token(identity=username, additional_claims={
+                'id': user_id, 'role': 'user', 'username': username}), company['id'])
+            for company in fixtures['companies']
+            for username, user_id in list(zip(company['users'], company['user_ids']))[:5]
+        ]
+    paths = ['/companies', '/documents?company_id={}&limit=50', '/folders?company_id={}',
+             '/invoices?company_id={}&limit=50', '/folders/tree?company_id={}']
+    requests = [(token, paths[i % len(paths)].format(company_id))
+                for i, (token, company_id) in enumerate(users * (args.calls // len(users) or 1))]
+    caches = (db.user_cache, db.username_cache, db.user_companies_cache)
+    client = app.test_client()
+
+    queries = {}
+    for mode in ('cold', 'warm'):
+        for cache in caches:
+            cache.clear()
+        with counted_queries(db) as executed:
+            for token, path in requests:
+                if mode == 'cold':
+                    for cache in caches:
+                        cache.clear()
+                response = client.get(path, headers={'Authorization': f"Bearer {token}"})
+                if response.status_code != 200:
+                    raise SystemExit(f"GET {path}: {response.status_code} {response.get_data(as_text=True)[:200]}")
+        queries[mode] = len(executed)
+        log(f"  {mode}: {len(executed) / len(requests):.2f} queries per request")
+
+    saved = round((queries['cold'] - queries['warm']) / len(requests), 2)
+    hit_ratio = round(db.user_companies_cache.stats()['hit_ratio'], 3)
+    log(f"  the caches save {saved} queries per request")
+    return {'queries_saved_per_request': saved, 'requests': len(requests),
+            'cold_queries_per_request': round(queries['cold'] / len(requests), 2),
+            'warm_queries_per_request': round(queries['warm'] / len(requests), 2),
+            'user_companies_hit_ratio': hit_ratio}
+
+STARTUP_SCRIPT = """
+import os, sys, time
+start = time.perf_counter()
+import app
+import_seconds = time.perf_counter() - start
+import pdf_parser
+forks = []
+for _ in range({forks}):
+    read_end, write_end = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write_end, b'.')
+        os._exit(0)
+    os.read(read_end, 1)
+    forks.append(time.perf_counter() - start)
+    os.waitpid(pid, 0)
+    os.close(read_end)
+    os.close(write_end)
+print(import_seconds, sorted(forks)[len(forks) // 2], pdf_parser.is_model_loaded())
+"""
+
+def startup(args, limits, log):
+    """
+    Cold import of the app in a fresh interpreter, and the time for a process
+    that imported it to fork a child that is running. Neither should load the
+    model or touch the database.
+    """
+    imports, forks = [], []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT.format(forks=20)], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.split()
+        imports.append(float(output[0]))
+        forks.append(float(output[1]))
+        if output[2] == 'True':
+            raise SystemExit("Importing app loaded the summarization model")
+    result = {
+        'import_seconds': round(sorted(imports)[len(imports) // 2], 3),
+        'fork_ms': round(sorted(forks)[len(forks) // 2] * 1000, 2),
+        'runs': args.runs,
+    }
+    log(f"  import app {result['import_seconds']:.3f} s  fork {result['fork_ms']:.2f} ms (medians of {args.runs})")
+    return result
+
+def ocr_throughput(args, limits, log):
+    """Pages per second and mean confidence of ocr_pages on a synthetic --scan-pages page scan."""
+    import shutil
+    import tempfile
+    import ocr_utils
+    from benchmarks.generators import scanned_pages
+
+    if ocr_utils.tesserocr is None and shutil.which('tesseract') is None:
+        raise SystemExit("ocr-throughput needs tesseract (or tesserocr) installed")
+    with tempfile.NamedTemporaryFile(suffix='.tiff', delete=False) as f:
+        f.write(scanned_pages(args.seed, args.scan_pages))
+    try:
+        start = time.perf_counter()
+        pages = ocr_utils.ocr_pages(f.name)
+        elapsed = time.perf_counter() - start
+    finally:
+        os.remove(f.name)
+
+    result = {
+        'pages_per_second': round(len(pages) / elapsed, 2),
+        'mean_confidence': round(sum(page['confidence'] for page in pages) / len(pages), 1),
+        'pages': len(pages),
+        'workers': ocr_utils.OCR_CONFIG['workers'],
+        'engine': 'tesserocr' if ocr_utils.tesserocr is not None else 'pytesseract',
+    }
+    log(f"  {result['pages']} pages in {elapsed:.1f} s: {result['pages_per_second']} pages/s, "
+        f"mean confidence {result['mean_confidence']} ({result['engine']}, {result['workers']} workers)")
+    return result
+
+_fixtures = None
+
+def database_fixtures(args, log):
+    """Resets and seeds the bench database once per run, for the components that need one."""
+    global _fixtures
+    if _fixtures is None:
+        from benchmarks.run import reset_data
+        _fixtures = reset_data(args, log)
+    return _fixtures
+
+# name: (function, settings --record writes back, help)
+COMPONENTS = {
+    'summarizer-batch': (summarizer_batch, ('batch_size', 'model'),
+                         'summarization throughput and latency by batch size'),
+    'worker-memory': (worker_memory, (), 'Rss and Pss of each gunicorn worker with and without preload'),
+    'pool-scaling': (pool_scaling, (), 'database throughput by request threads sharing the pool (database)'),
+    'summary-scaling': (summary_scaling, (), 'summarization wall time by page count'),
+    'extraction-speedup': (extraction_speedup, (), 'PDF text extraction speedup by page pool workers'),
+    'folder-tree': (folder_tree, (), 'breadcrumb, subtree and tree queries on a deep, wide tree (database)'),
+    'user-cache': (user_cache, (), 'queries the user caches save per request (database)'),
+    'startup': (startup, (), 'cold import time of the app and fork time of a worker'),
+    'ocr-throughput': (ocr_throughput, (), 'OCR pages per second on a synthetic scan (needs tesseract)'),
+}
+
+def check_limits(name, result, limits):
+    """Returns the broken min_/max_ limits of one component."""
+    failures = []
+    for key, limit in limits.items():
+        bound, _, metric = key.partition('_')
+        if bound not in ('min', 'max') or metric not in result:
+            continue
+        if (bound == 'min' and result[metric] < limit) or (bound == 'max' and result[metric] > limit):
+            failures.append(f"{name}: {metric} {result[metric]} is {'under' if bound == 'min' else 'over'} "
+                            f"the limit of {limit}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description='DMS backend component benchmarks')
+    parser.add_argument('components', nargs='+', choices=sorted(COMPONENTS), metavar='component',
+                        help='; '.join(f"{name}: {COMPONENTS[name][2]}" for name in sorted(COMPONENTS)))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--model', choices=['stub', 'real'], default='stub',
+                        help='stub: StubSummarizer, no transformers download (default)')
+    parser.add_argument('--texts', type=int, default=64, help='summarizer-batch: texts summarized per batch size')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--concurrency', type=int, default=os.cpu_count() or 2,
+                        help='extraction jobs running at once (the job queue runs one per CPU)')
+    parser.add_argument('--workers', type=int, default=2, help='worker-memory: gunicorn workers')
+    parser.add_argument('--startup-timeout', type=float, default=300)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32], help='pool-scaling')
+    parser.add_argument('--calls', type=int, default=2000,
+                        help='pool-scaling: calls per thread count; user-cache: requests; '
+                             'folder-tree: a tenth of them are breadcrumbs')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 50, 200, 500], help='summary-scaling')
+    parser.add_argument('--pdf-pages', type=int, default=200, help='extraction-speedup')
+    parser.add_argument('--folders', type=int, default=50000, help='folder-tree')
+    parser.add_argument('--depth', type=int, default=10, help='folder-tree')
+    parser.add_argument('--runs', type=int, default=5, help='startup: fresh interpreters timed')
+    parser.add_argument('--scan-pages', type=int, default=100, help='ocr-throughput')
+    parser.add_argument('--scale', choices=['small', 'medium', 'large'], default='small',
+                        help='data seeded for the components marked (database)')
+    parser.add_argument('--database', default=os.environ.get('DMS_BENCH_DB_NAME', 'dms_bench'))
+    parser.add_argument('--work-dir', default=os.path.join(BENCHMARKS_DIR, 'work'))
+    parser.add_argument('--thresholds', default=os.path.join(BENCHMARKS_DIR, 'thresholds.json'))
+    parser.add_argument('--record', action='store_true', help='write the chosen settings back to --thresholds')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    if args.record and args.model == 'stub':
+        parser.error('--record needs --model real: the stub model says nothing about the settings to deploy')
+
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    from benchmarks.run import bench_environment
+
+    # Before anything imports db or pdf_parser: the configuration is read at import time
+    os.environ.update(bench_environment(args))
+    os.makedirs(args.work_dir, exist_ok=True)
+    log = lambda message: print(message, flush=True)
+
+    with open(args.thresholds, encoding='utf-8') as f:
+        thresholds = json.load(f)
+    limits = thresholds.setdefault('components', {})
+
+    results, failures = {}, []
+    for name in args.components:
+        function, settings, _ = COMPONENTS[name]
+        log(f"{name}:")
+        results[name] = function(args, limits.get(name, {}), log)
+        failures += check_limits(name, results[name], limits.get(name, {}))
+        if args.record:
+            limits.setdefault(name, {}).update({key: results[name][key] for key in settings})
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        log(f"Results written to {args.output}")
+    if args.record:
+        with open(args.thresholds, 'w', encoding='utf-8') as f:
+            json.dump(thresholds, f, indent=2)
+            f.write('\n')
+        log(f"Chosen settings recorded in {args.thresholds}")
+
+    for failure in failures:
+        log(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    log("All thresholds met")
+
+if __name__ == '__main__':
+    main()
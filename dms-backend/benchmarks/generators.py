@@ -0,0 +1,309 @@
+# backend/benchmarks/generators.py
+#
+# Deterministic synthetic data for the benchmark suite. The same seed and
+# scale always produce the same companies, users, folders, documents, files,
+# invoice fields and history, so runs on different commits are comparable.
+
+import io
+import json
+import random
+from datetime import datetime, timedelta
+
+from invoice_extractor import synthetic_invoice
+
+# Rows per company; history is per document
+SCALES = {
+    'small': {'companies': 3, 'users': 5, 'folders': 20, 'documents': 2000, 'history': 5, 'files': 20},
+    'medium': {'companies': 10, 'users': 20, 'folders': 100, 'documents': 20000, 'history': 10, 'files': 50},
+    'large': {'companies': 20, 'users': 50, 'folders': 500, 'documents': 100000, 'history': 10, 'files': 100},
+}
+
+PASSWORD = 'bench-password'
+ADMIN_USERNAME = 'bench-admin'
+
+TOPICS = ['Meeting notes', 'Employment contract', 'Project report', 'Travel policy', 'Board minutes',
+          'Service agreement', 'Quarterly review', 'Onboarding checklist', 'Delivery note', 'Memo']
+WORDS = ['budget', 'schedule', 'delivery', 'contract', 'review', 'team', 'customer', 'quality', 'risk',
+         'milestone', 'approval', 'policy', 'warehouse', 'shipment', 'renewal', 'training', 'audit',
+         'forecast', 'supplier', 'agreement', 'signature', 'meeting', 'project', 'report', 'office']
+ACTIONS = ['Document updated', 'Document viewed', 'Document moved', 'Document downloaded']
+
+BATCH_SIZE = 5000
+
+def document_text(rng):
+    """Text of a non-invoice document: a topic heading and a few paragraphs of plain sentences."""
+    lines = [rng.choice(TOPICS), '']
+    for _ in range(rng.randint(3, 12)):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 16))]
+        lines.append(' '.join(words).capitalize() + '.')
+    return '\n'.join(lines)
+
+def labelled_texts(seed, count):
+    """(texts, labels) for training the benchmark's classifier model."""
+    rng = random.Random(seed)
+    texts, labels = [], []
+    for i in range(count):
+        if i % 2:
+            texts.append(synthetic_invoice(rng)[0])
+            labels.append('invoice')
+        else:
+            texts.append(document_text(rng))
+            labels.append('non_invoice')
+    return texts, labels
+
+def make_pdf(pages):
+    """A minimal PDF with a Helvetica text layer; `pages` is a list of lists of lines."""
+    def escape(line):
+        return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    page_ids = []
+    next_id = 4
+    for lines in pages:
+        content = ("BT /F1 10 Tf 13 TL 50 800 Td "
+                   + ' '.join(f"({escape(line)}) Tj T*" for line in lines) + " ET").encode('latin-1', 'replace')
+        objects[next_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {next_id + 1} 0 R >>"
+        ).encode('ascii')
+        objects[next_id + 1] = b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream"
+        page_ids.append(next_id)
+        next_id += 2
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode('ascii')
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(out)
+        out += b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % next_id
+    for object_id in range(1, next_id):
+        out += b"%010d 00000 n \n" % offsets[object_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (next_id, xref)
+    return bytes(out)
+
+def text_to_pdf(text, lines_per_page=55):
+    lines = text.split('\n')
+    return make_pdf([lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)] or [[]])
+
+def page_texts(seed, pages):
+    """`pages` pages of non-invoice text, about 500 words each."""
+    rng = random.Random(seed)
+    return ['\n\n'.join(document_text(rng) for _ in range(4)) for _ in range(pages)]
+
+def scanned_pages(seed, pages, dpi=200):
+    """
+    A multi-page TIFF of rendered text, as a scanner would produce it: letter
+    size at `dpi`, bilevel, with the DPI recorded. Returns the TIFF bytes.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    font = ImageFont.load_default(size=dpi // 7)
+    images = []
+    for text in page_texts(seed, pages):
+        image = Image.new('L', (int(8.5 * dpi), 11 * dpi), 255)
+        draw = ImageDraw.Draw(image)
+        y = dpi // 2
+        for line in text.split('\n'):
+            # Wrapped at about 60 characters, the width of the page at this font size
+            words, current = line.split(), ''
+            for word in words + [None]:
+                if word is not None and len(current) + len(word) < 60:
+                    current = f"{current} {word}".strip()
+                    continue
+                draw.text((dpi // 2, y), current, fill=0, font=font)
+                y += dpi // 5
+                current = word or ''
+            if y > 10 * dpi:
+                break
+        images.append(image.convert('1'))
+
+    out = io.BytesIO()
+    images[0].save(out, format='TIFF', save_all=True, append_images=images[1:], compression='group4',
+                   dpi=(dpi, dpi))
+    return out.getvalue()
+
+def upload_document(seed, index):
+    """
+    The index-th file uploaded by a run: (filename, document_type, pdf bytes, pages).
+    Each one is unique, so the extraction cache never answers for it.
+    """
+    rng = random.Random(seed * 1_000_003 + index)
+    if index % 2:
+        text, _ = synthetic_invoice(rng)
+        document_type = 'invoice'
+    else:
+        text = '\n\n'.join(document_text(rng) for _ in range(rng.randint(1, 8)))
+        document_type = 'non_invoice'
+    text += f"\nReference {seed}-{index}"
+    pdf = text_to_pdf(text)
+    pages = max(1, -(-len(text.split('\n')) // 55))
+    return f"upload-{index:06d}.pdf", document_type, pdf, pages
+
+def import_payload(seed, index, count):
+    """An NDJSON body for POST /documents/import with `count` records."""
+    rng = random.Random(seed * 7919 + index)
+    lines = []
+    for i in range(count):
+        document_type = rng.choice(['invoice', 'non_invoice'])
+        lines.append(json.dumps({
+            'filename': f"import-{index:04d}-{i:05d}.pdf",
+            'document_type': document_type,
+            'file_size': rng.randint(10_000, 5_000_000),
+        }))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+def _insert_many(cursor, query, rows):
+    """Multi-row INSERT in BATCH_SIZE chunks; returns the ids, which InnoDB hands out consecutively."""
+    ids = []
+    for start in range(0, len(rows), BATCH_SIZE):
+        chunk = rows[start:start + BATCH_SIZE]
+        cursor.executemany(query, chunk)
+        ids.extend(range(cursor.lastrowid, cursor.lastrowid + len(chunk)))
+    return ids
+
+def seed_folder_tree(company_id, created_by, folders, depth, seed):
+    """
+    `folders` folders in `depth` levels of equal size under one company, each
+    hanging under a random folder of the level above. Returns the ids by level.
+    """
+    from db import db
+
+    rng = random.Random(seed)
+    per_level = folders // depth
+    levels = []
+    with db.transaction() as cursor:
+        for level in range(depth):
+            parents = levels[-1] if levels else [None]
+            levels.append(_insert_many(
+                cursor, "INSERT INTO folders (name, parent_id, company_id, created_by) VALUES (%s, %s, %s, %s)",
+                [(f"Level {level} folder {i:05d}", rng.choice(parents), company_id, created_by)
+                 for i in range(per_level)]
+            ))
+    db.bump_versions(f"folders:{company_id}")
+    return levels
+
+def seed_database(scale, seed, log=print):
+    """
+    Fills the configured (empty) database, file store and search index.
+    Returns the fixtures the scenarios need: credentials and the ids of every
+    generated row, grouped by company.
+    """
+    from db import db
+    from search_index import search_index
+    from storage import file_store
+
+    sizes = SCALES[scale]
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    password_hash = db.hash_password(PASSWORD)
+
+    files = []
+    for i in range(sizes['files']):
+        text = synthetic_invoice(rng)[0] if i % 2 else document_text(rng)
+        _, size, relative_path = file_store.save_stream(io.BytesIO(text_to_pdf(text)))
+        files.append((relative_path, size))
+
+    fixtures = {'scale': scale, 'seed': seed, 'password': PASSWORD, 'admin': ADMIN_USERNAME, 'companies': []}
+    with db.transaction() as cursor:
+        cursor.execute(
+            "INSERT INTO users (username, password_hash, role, is_active) VALUES (%s, %s, 'admin', TRUE)",
+            (ADMIN_USERNAME, password_hash)
+        )
+        admin_id = cursor.lastrowid
+
+        for company_index in range(sizes['companies']):
+            cursor.execute("INSERT INTO companies (name) VALUES (%s)", (f"Bench Company {company_index:03d}",))
+            company_id = cursor.lastrowid
+            usernames = [f"bench-c{company_index:03d}-u{i:03d}" for i in range(sizes['users'])]
+            user_ids = _insert_many(
+                cursor, "INSERT INTO users (username, password_hash, role, is_active) VALUES (%s, %s, 'user', TRUE)",
+                [(username, password_hash) for username in usernames]
+            )
+            cursor.executemany("INSERT INTO user_companies (user_id, company_id) VALUES (%s, %s)",
+                               [(user_id, company_id) for user_id in user_ids + [admin_id]])
+
+            # A tree: each folder hangs under an earlier one, or at the root
+            folder_ids = []
+            for i in range(sizes['folders']):
+                parent_id = rng.choice(folder_ids) if folder_ids and rng.random() < 0.7 else None
+                cursor.execute(
+                    "INSERT INTO folders (name, parent_id, company_id, created_by) VALUES (%s, %s, %s, %s)",
+                    (f"Folder {i:04d}", parent_id, company_id, rng.choice(user_ids))
+                )
+                folder_ids.append(cursor.lastrowid)
+
+            fixtures['companies'].append({
+                'id': company_id, 'users': usernames, 'user_ids': user_ids, 'folders': folder_ids,
+                'documents': [], 'invoices': 0,
+            })
+    log(f"Seeded {sizes['companies']} companies, {sizes['companies'] * sizes['users']} users, "
+        f"{sizes['companies'] * sizes['folders']} folders")
+
+    total_documents = 0
+    for company in fixtures['companies']:
+        documents, texts, invoices = [], [], []
+        for i in range(sizes['documents']):
+            created_at = now - timedelta(seconds=rng.randint(0, 730 * 86400))
+            if rng.random() < 0.4:
+                text, fields = synthetic_invoice(rng)
+                document_type = 'invoice'
+            else:
+                text, fields = document_text(rng), None
+                document_type = 'non_invoice'
+            file_path, file_size = files[rng.randrange(len(files))]
+            documents.append((
+                f"{document_type}-{i:06d}.pdf", document_type, rng.choice(company['user_ids']), company['id'],
+                rng.choice(company['folders']) if rng.random() < 0.8 else None,
+                file_path, file_size, 'done', ' '.join(text.split()[:30]), created_at
+            ))
+            texts.append(text)
+            invoices.append(fields)
+
+        with db.transaction() as cursor:
+            document_ids = _insert_many(cursor, """
+                INSERT INTO documents (filename, document_type, owner_id, company_id, folder_id, file_path,
+                                       file_size, extraction_status, summary, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, documents)
+            _insert_many(cursor, """
+                INSERT INTO invoice_fields (document_id, company_id, invoice_number, invoice_date, currency,
+                                            net_amount, vat_amount, total_amount, supplier)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [
+                (document_id, company['id'], fields['invoice_number'], fields['invoice_date'], fields['currency'],
+                 fields['net_amount'], fields['vat_amount'], fields['total_amount'], fields['supplier'])
+                for document_id, fields in zip(document_ids, invoices) if fields
+            ])
+
+        history = []
+        for document_id, document in zip(document_ids, documents):
+            owner_id, created_at = document[2], document[9]
+            history.append((document_id, owner_id, 'Document uploaded', created_at))
+            age = max(1, int((now - created_at).total_seconds()))
+            for _ in range(sizes['history'] - 1):
+                history.append((document_id, rng.choice(company['user_ids']), rng.choice(ACTIONS),
+                                created_at + timedelta(seconds=rng.randint(0, age))))
+        with db.transaction() as cursor:
+            _insert_many(cursor, "INSERT INTO document_history (document_id, user_id, action, timestamp) "
+                                 "VALUES (%s, %s, %s, %s)", history)
+
+        search_index.index_documents(
+            (document_id, company['id'], document[0], text)
+            for document_id, document, text in zip(document_ids, documents, texts)
+        )
+        company['documents'] = document_ids
+        company['invoices'] = sum(1 for fields in invoices if fields)
+        total_documents += len(document_ids)
+        log(f"Seeded company {company['id']}: {len(document_ids)} documents, {len(history)} history events")
+
+    # Seeded rows bypass the write paths that bump the ETag versions
+    db.bump_versions('users', *(f"{kind}:{company['id']}" for company in fixtures['companies']
+                                for kind in ('documents', 'folders')))
+    fixtures['documents'] = total_documents
+    return fixtures
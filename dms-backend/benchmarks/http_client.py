@@ -0,0 +1,98 @@
+# backend/benchmarks/http_client.py
+#
+# A small HTTP/1.1 keep-alive client on asyncio streams. A thousand simulated
+# clients are a thousand coroutines with one connection each, which a thread
+# per client or a client library's own pooling would not give us.
+
+import asyncio
+import json
+from urllib.parse import urlsplit
+
+class HTTPResponse:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+class Connection:
+    def __init__(self, base_url, timeout=60.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+            self._reader = self._writer = None
+
+    async def request(self, method, path, headers=None, body=None):
+        # A kept-alive connection may have been closed by the server in the meantime: retry once on a fresh one
+        reused = self._writer is not None
+        try:
+            return await asyncio.wait_for(self._request(method, path, headers or {}, body), self.timeout)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            if not reused:
+                raise
+            return await asyncio.wait_for(self._request(method, path, headers or {}, body), self.timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise
+
+    async def _request(self, method, path, headers, body):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+        body = body or b''
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self._writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self._writer.drain()
+
+        status_line = await self._reader.readuntil(b'\r\n')
+        if not status_line:
+            raise ConnectionResetError("Connection closed by server")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self._reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            response_body = b''
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            response_body = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            response_body = await self._reader.readexactly(int(response_headers['content-length']))
+        else:
+            response_body = await self._reader.read()
+            response_headers['connection'] = 'close'
+
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return HTTPResponse(status, response_headers, response_body)
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self._reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            if size == 0:
+                # Trailers end with an empty line
+                while await self._reader.readuntil(b'\r\n') != b'\r\n':
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self._reader.readexactly(size))
+            await self._reader.readexactly(2)
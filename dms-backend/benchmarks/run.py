@@ -0,0 +1,455 @@
+# backend/benchmarks/run.py
+#
+# End-to-end benchmark and load test. Needs a MySQL server the DMS_DB_*
+# settings point at (a local mysqld or mariadbd started without a container
+# is enough); everything else lives under --work-dir. From dms-backend/:
+#
+#     python -m benchmarks.run                                  # every route, Flask, stub model
+#     python -m benchmarks.run --server flask asgi --clients 1000 \
+#         --only 'GET /(documents|folders|companies)$'          # both serving modes at 1k clients
+#     python -m benchmarks.run --baseline benchmarks/results/main.json
+#
+# Each server run starts from the same seeded data: the bench database (its
+# name must end in _bench, it is wiped) is migrated, truncated and refilled by
+# benchmarks.generators. The server is started as a subprocess, gunicorn for
+# flask and uvicorn for asgi, with the stub summarizer unless --model real.
+# Results are written as JSON; the run exits 1 when a scenario returns
+# unexpected statuses or breaks a limit in --thresholds, either an absolute
+# limit or a regression against --baseline.
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.join(BACKEND_DIR, 'benchmarks')
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def bench_environment(args):
+    """Settings for this process and the server: every path under the work directory."""
+    work = os.path.abspath(args.work_dir)
+    return {
+        'DMS_DB_NAME': args.database,
+        'DMS_SUMMARY_MODEL': 'stub' if args.model == 'stub' else os.environ.get(
+            'DMS_SUMMARY_MODEL', 'sshleifer/distilbart-cnn-12-6'),
+        'DMS_STORAGE_ROOT': os.path.join(work, 'uploads'),
+        'DMS_SEARCH_INDEX': os.path.join(work, 'search', 'documents.sqlite3'),
+        'DMS_EXTRACTION_CACHE_DIR': os.path.join(work, 'cache', 'extraction'),
+        'DMS_HISTORY_SPILL_DIR': os.path.join(work, 'cache', 'history'),
+        'DMS_CLASSIFIER_MODEL': os.path.join(work, 'models', 'document_type.npz'),
+        # Uploads are capped per scenario; the queue should not be what is measured
+        'DMS_JOB_MAX_QUEUE': os.environ.get('DMS_JOB_MAX_QUEUE', '1024'),
+    }
+
+def reset_data(args, log):
+    """Migrates the bench database, empties it and the work directory, and seeds it again."""
+    import mysql.connector
+    from db import db, DB_CONFIG
+    from migrations import migrate
+    from search_index import search_index
+    from benchmarks.generators import seed_database
+
+    if not DB_CONFIG['database'].endswith('_bench'):
+        raise SystemExit(f"Refusing to wipe {DB_CONFIG['database']}: the bench database name must end in _bench")
+
+    migrate(db, DB_CONFIG)
+    connection = mysql.connector.connect(**DB_CONFIG)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT table_name FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name != 'schema_migrations'
+        """)
+        tables = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in tables:
+            cursor.execute(f"TRUNCATE TABLE {table}")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    finally:
+        connection.close()
+
+    # The seeding process keeps the index open, so it is emptied rather than deleted
+    connection = search_index.connection
+    connection.execute("DELETE FROM document_text")
+    connection.commit()
+    for variable in ('DMS_EXTRACTION_CACHE_DIR', 'DMS_HISTORY_SPILL_DIR'):
+        shutil.rmtree(os.environ[variable], ignore_errors=True)
+    for cache in (db.user_cache, db.username_cache, db.user_companies_cache):
+        cache.clear()
+
+    start = time.perf_counter()
+    fixtures = seed_database(args.scale, args.seed, log=log)
+    log(f"Seeded in {time.perf_counter() - start:.1f}s")
+    with open(os.path.join(args.work_dir, 'fixtures.json'), 'w', encoding='utf-8') as f:
+        json.dump(fixtures, f)
+    return fixtures
+
+def train_classifier(seed, log):
+    """A classifier model for uploads without a type, so the stub mode needs no trained artifact."""
+    from classifier import CLASSIFIER_CONFIG, DocumentClassifier
+    from benchmarks.generators import labelled_texts
+
+    if os.path.exists(CLASSIFIER_CONFIG['model_path']):
+        return
+    texts, labels = labelled_texts(seed, 400)
+    DocumentClassifier.train(texts, labels, seed=seed).save(CLASSIFIER_CONFIG['model_path'])
+    log(f"Trained classifier model on {len(texts)} synthetic documents")
+
+def start_server(kind, port, workers, env):
+    if kind == 'flask':
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+        env = dict(env, DMS_BIND=f"127.0.0.1:{port}", WEB_CONCURRENCY=str(workers))
+    else:
+        command = [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--host', '127.0.0.1', '--port', str(port),
+                   '--workers', str(workers), '--log-level', 'warning']
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+async def wait_ready(base_url, process, timeout):
+    from benchmarks.http_client import Connection
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Server exited with status {process.returncode} before it was ready")
+        connection = Connection(base_url, timeout=5)
+        try:
+            response = await connection.request('GET', '/ready')
+            if response.status == 200:
+                return
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            await connection.close()
+        await asyncio.sleep(0.5)
+    raise SystemExit(f"{base_url} was not ready after {timeout}s")
+
+async def login(base_url, username, password):
+    from benchmarks.http_client import Connection
+
+    connection = Connection(base_url)
+    try:
+        response = await connection.request('POST', '/login', {'Content-Type': 'application/json'},
+                                            json.dumps({'username': username, 'password': password}).encode('utf-8'))
+    finally:
+        await connection.close()
+    if response.status != 200:
+        raise SystemExit(f"Login as {username} failed with {response.status}: {response.body[:200]!r}")
+    return response.json()['access_token']
+
+async def build_context(base_url, fixtures, sample_users):
+    from benchmarks.scenarios import Context
+
+    admin_token = await login(base_url, fixtures['admin'], fixtures['password'])
+    companies = fixtures['companies']
+    per_company = max(1, sample_users // len(companies))
+    users = [(username, company) for company in companies for username in company['users'][:per_company]]
+    tokens = await asyncio.gather(*(login(base_url, username, fixtures['password']) for username, _ in users))
+    return Context(fixtures, admin_token, [(token, company) for token, (_, company) in zip(tokens, users)],
+                   run_id=int(time.time()))
+
+async def run_requests(base_url, scenario, ctx, clients, total, record, stop=None):
+    """Sends `total` requests over `clients` connections, or keeps sending until `stop` is set."""
+    from benchmarks.http_client import Connection
+
+    counter = itertools.count()
+    latencies = []
+    statuses = {}
+
+    async def client():
+        connection = Connection(base_url)
+        try:
+            while True:
+                i = next(counter)
+                if stop.is_set() if stop is not None else i >= total:
+                    return
+                request = scenario.build(ctx, i)
+                start = time.perf_counter()
+                try:
+                    response = await connection.request(request.method, request.path, request.headers, request.body)
+                    status = response.status
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                    response, status = None, type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if record and scenario.collect and status in scenario.expect:
+                    scenario.collect(ctx, i, response)
+        finally:
+            await connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients if stop is not None else min(clients, total))))
+    return time.perf_counter() - start, latencies, statuses
+
+def summarize(scenario, clients, elapsed, latencies, statuses):
+    expected = {str(status) for status in scenario.expect}
+    total = len(latencies)
+    return {
+        'requests': total,
+        'clients': min(clients, total),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(max(latencies, default=0.0) * 1000, 3),
+        'statuses': statuses,
+        'errors': sum(count for status, count in statuses.items() if status not in expected),
+    }
+
+async def run_scenario(base_url, scenario, ctx, clients, requests):
+    total = scenario.count(ctx, requests)
+    if total == 0:
+        return None
+    if scenario.idempotent:
+        await run_requests(base_url, scenario, ctx, min(clients, 8), min(total, 20), record=False)
+    return summarize(scenario, clients, *await run_requests(base_url, scenario, ctx, clients, total, record=True))
+
+async def run_mixed(base_url, mixed, ctx, clients, requests):
+    stop = asyncio.Event()
+    background = asyncio.create_task(run_requests(
+        base_url, mixed.background, ctx, mixed.background_clients, None, record=False, stop=stop
+    ))
+    try:
+        result = await run_scenario(base_url, mixed.foreground, ctx, clients, requests)
+    finally:
+        stop.set()
+        background_result = summarize(mixed.background, mixed.background_clients, *await background)
+    if result is not None:
+        result['background'] = dict(background_result, name=mixed.background.name)
+    return result
+
+def wait_for_extraction(document_ids, started, pages, timeout):
+    """Polls the uploaded documents until their extraction jobs finished; returns documents/s and pages/s."""
+    from db import db
+
+    if not document_ids:
+        return None
+    placeholders = ', '.join(['%s'] * len(document_ids))
+    deadline = time.monotonic() + timeout
+    while True:
+        rows = db.execute_query(f"""
+            SELECT extraction_status, COUNT(*) AS count FROM documents
+            WHERE id IN ({placeholders}) GROUP BY extraction_status
+        """, document_ids, fetch=True)
+        counts = {row['extraction_status']: row['count'] for row in rows}
+        finished = counts.get('done', 0) + counts.get('failed', 0)
+        if finished == len(document_ids) or time.monotonic() > deadline:
+            break
+        time.sleep(0.25)
+    elapsed = time.perf_counter() - started
+    return {
+        'documents': len(document_ids),
+        'finished': finished,
+        'failed': counts.get('failed', 0),
+        'seconds': round(elapsed, 3),
+        'documents_per_second': round(finished / elapsed, 2),
+        'pages_per_second': round(pages * finished / len(document_ids) / elapsed, 2),
+    }
+
+async def run_server(args, kind, base_url, fixtures, log):
+    from benchmarks.scenarios import SCENARIOS, MixedScenario
+
+    ctx = await build_context(base_url, fixtures, args.sample_users)
+    pattern = re.compile(args.only) if args.only else None
+    results = {'scenarios': {}}
+    for scenario in SCENARIOS:
+        if pattern and not pattern.search(scenario.name):
+            continue
+        started = time.perf_counter()
+        runner = run_mixed if isinstance(scenario, MixedScenario) else run_scenario
+        result = await runner(base_url, scenario, ctx, args.clients, args.requests)
+        if result is None:
+            log(f"  {scenario.name}: skipped, nothing to run against")
+            continue
+        results['scenarios'][scenario.name] = result
+        log(f"  {scenario.name:<36} {result['requests']:>6} req {result['throughput_rps']:>9.1f} req/s  "
+            f"p50 {result['p50_ms']:>8.2f}  p95 {result['p95_ms']:>8.2f}  p99 {result['p99_ms']:>8.2f} ms"
+            f"{'  ' + str(result['errors']) + ' errors ' + json.dumps(result['statuses']) if result['errors'] else ''}")
+        if 'background' in result:
+            background = result['background']
+            log(f"    alongside {background['name']:<26} {background['requests']:>6} req "
+                f"{background['throughput_rps']:>9.1f} req/s  p95 {background['p95_ms']:>8.2f} ms"
+                f"{'  ' + str(background['errors']) + ' errors' if background['errors'] else ''}")
+        if scenario.name == 'POST /documents/upload':
+            # Extraction runs behind the uploads; let it drain before the next scenario competes for CPU
+            extraction = await asyncio.to_thread(
+                wait_for_extraction, ctx.pools['uploads'], started, ctx.upload_pages, args.extraction_timeout
+            )
+            if extraction:
+                results['extraction'] = extraction
+                log(f"  {'extraction pipeline':<36} {extraction['finished']:>6} doc "
+                    f"{extraction['documents_per_second']:>9.1f} doc/s  {extraction['pages_per_second']:.1f} pages/s"
+                    f"{'  ' + str(extraction['failed']) + ' failed' if extraction['failed'] else ''}")
+    return results
+
+def comparable(results, baseline):
+    """Latencies are only comparable between runs with the same data and load."""
+    keys = ('scale', 'seed', 'model', 'clients', 'requests', 'workers')
+    return all(baseline['meta'].get(key) == results['meta'].get(key) for key in keys)
+
+def check_thresholds(results, thresholds, baseline):
+    """Returns the list of broken limits; an empty list means the run passed."""
+    failures = []
+    limits = thresholds.get('scenarios', {})
+    if baseline is not None and not comparable(results, baseline):
+        baseline = None
+
+    for server, server_results in results['servers'].items():
+        base_server = (baseline or {}).get('servers', {}).get(server, {})
+        for name, result in server_results['scenarios'].items():
+            label = f"{server} {name}"
+            if result['errors']:
+                failures.append(f"{label}: {result['errors']} unexpected responses {result['statuses']}")
+            background = result.get('background')
+            if background and background['errors']:
+                failures.append(f"{label}: {background['errors']} unexpected {background['name']} responses "
+                                f"{background['statuses']}")
+            limit = limits.get(name, {})
+            if 'max_p95_ms' in limit and result['p95_ms'] > limit['max_p95_ms']:
+                failures.append(f"{label}: p95 {result['p95_ms']} ms is over the limit of {limit['max_p95_ms']} ms")
+            if 'min_rps' in limit and result['throughput_rps'] < limit['min_rps']:
+                failures.append(f"{label}: {result['throughput_rps']} req/s is under the limit of {limit['min_rps']}")
+
+            base = base_server.get('scenarios', {}).get(name)
+            if not base:
+                continue
+            p95_limit = base['p95_ms'] * (1 + thresholds['max_p95_regression'])
+            # Sub-millisecond routes jitter by more than any sensible percentage
+            if result['p95_ms'] > p95_limit and result['p95_ms'] - base['p95_ms'] > thresholds['min_p95_delta_ms']:
+                failures.append(f"{label}: p95 {result['p95_ms']} ms regressed from {base['p95_ms']} ms")
+            if result['throughput_rps'] < base['throughput_rps'] * (1 - thresholds['max_throughput_regression']):
+                failures.append(f"{label}: {result['throughput_rps']} req/s regressed from {base['throughput_rps']}")
+
+        extraction, base = server_results.get('extraction'), base_server.get('extraction')
+        if extraction and base and extraction['pages_per_second'] < (
+                base['pages_per_second'] * (1 - thresholds['max_throughput_regression'])):
+            failures.append(f"{server} extraction: {extraction['pages_per_second']} pages/s regressed from "
+                            f"{base['pages_per_second']}")
+    return failures
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def raise_open_files_limit(clients):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = clients * 2 + 256
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted if hard == resource.RLIM_INFINITY else min(wanted, hard), hard))
+
+def main():
+    parser = argparse.ArgumentParser(description='DMS backend end-to-end benchmark and load test')
+    parser.add_argument('--scale', choices=['small', 'medium', 'large'], default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--model', choices=['stub', 'real'], default='stub',
+                        help='stub: StubSummarizer, no transformers download (default)')
+    parser.add_argument('--server', nargs='+', choices=['flask', 'asgi'], default=['flask'])
+    parser.add_argument('--url', help='benchmark a server that is already running instead of starting one')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=32, help='concurrent connections per scenario')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per scenario, before per-route caps')
+    parser.add_argument('--sample-users', type=int, default=20, help='seeded users that log in and send requests')
+    parser.add_argument('--only', help='regular expression of scenario names to run')
+    parser.add_argument('--database', default=os.environ.get('DMS_BENCH_DB_NAME', 'dms_bench'))
+    parser.add_argument('--work-dir', default=os.path.join(BENCHMARKS_DIR, 'work'))
+    parser.add_argument('--no-reset', action='store_true', help='reuse the data and fixtures of the previous run')
+    parser.add_argument('--output')
+    parser.add_argument('--baseline', help='results of an earlier run to check for regressions')
+    parser.add_argument('--thresholds', default=os.path.join(BENCHMARKS_DIR, 'thresholds.json'))
+    parser.add_argument('--extraction-timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    # Before anything imports db: the configuration is read at import time
+    os.environ.update(bench_environment(args))
+    os.makedirs(args.work_dir, exist_ok=True)
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    raise_open_files_limit(args.clients)
+    log = lambda message: print(message, flush=True)
+
+    train_classifier(args.seed, log)
+    started_at = datetime.now(timezone.utc)
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': started_at.isoformat(),
+            'scale': args.scale,
+            'seed': args.seed,
+            'model': args.model,
+            'clients': args.clients,
+            'requests': args.requests,
+            'workers': args.workers,
+            'only': args.only,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'servers': {},
+    }
+
+    for kind in args.server:
+        if args.no_reset:
+            with open(os.path.join(args.work_dir, 'fixtures.json'), encoding='utf-8') as f:
+                fixtures = json.load(f)
+        else:
+            fixtures = reset_data(args, log)
+
+        process = None if args.url else start_server(kind, args.port, args.workers, dict(os.environ))
+        base_url = args.url or f"http://127.0.0.1:{args.port}"
+        try:
+            asyncio.run(wait_ready(base_url, process, timeout=120))
+            log(f"{kind} at {base_url}, {args.clients} clients:")
+            results['servers'][kind] = asyncio.run(run_server(args, kind, base_url, fixtures, log))
+        finally:
+            if process is not None:
+                stop_server(process)
+
+    output = args.output or os.path.join(BENCHMARKS_DIR, 'results', f"{started_at:%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    log(f"Results written to {output}")
+
+    with open(args.thresholds, encoding='utf-8') as f:
+        thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    if baseline is not None and not comparable(results, baseline):
+        log("Baseline ran with other settings (scale, seed, model, clients, requests or workers); "
+            "only absolute limits are checked")
+    failures = check_thresholds(results, thresholds, baseline)
+    for failure in failures:
+        log(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    log("All thresholds met")
+
+if __name__ == '__main__':
+    main()
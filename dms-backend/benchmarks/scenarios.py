@@ -0,0 +1,260 @@
+# backend/benchmarks/scenarios.py
+#
+# One scripted scenario per route of app.py (a few routes get a second
+# variant), in the order they run. Reads come first so they see the seeded
+# data only; writes then create the rows that later updates and deletes use.
+
+import json
+from urllib.parse import urlencode
+
+from benchmarks.generators import WORDS, import_payload, upload_document
+
+class Request:
+    def __init__(self, method, path, token=None, json_body=None, body=None, headers=None):
+        self.method = method
+        self.path = path
+        self.headers = dict(headers or {})
+        self.body = body
+        if json_body is not None:
+            self.body = json.dumps(json_body).encode('utf-8')
+            self.headers['Content-Type'] = 'application/json'
+        if token:
+            self.headers['Authorization'] = f"Bearer {token}"
+
+class Scenario:
+    """
+    `build(ctx, i)` returns the i-th Request. `expect` are the statuses that
+    count as success. `limit` caps the number of requests (routes that hash
+    passwords or queue extraction jobs), and `pool` names the ctx.pools list
+    of ids created by an earlier scenario that this one consumes.
+    `collect(ctx, i, response)` runs after every successful response.
+    """
+
+    def __init__(self, name, build, expect=(200,), limit=None, pool=None, collect=None, idempotent=True):
+        self.name = name
+        self.build = build
+        self.expect = expect
+        self.limit = limit
+        self.pool = pool
+        self.collect = collect
+        self.idempotent = idempotent
+
+    def count(self, ctx, requests):
+        if self.limit is not None:
+            requests = min(requests, self.limit)
+        if self.pool is not None:
+            requests = min(requests, len(ctx.pools[self.pool]))
+        return requests
+
+class MixedScenario:
+    """
+    Runs `foreground` as usual while `background_clients` connections keep
+    sending `background` requests until it is done. The result is the
+    foreground's, so a route's latency can be compared with and without the
+    load next to it; the background's own numbers are reported alongside.
+    """
+
+    def __init__(self, name, foreground, background, background_clients):
+        self.name = name
+        self.foreground = foreground
+        self.background = background
+        self.background_clients = background_clients
+
+    def count(self, ctx, requests):
+        return self.foreground.count(ctx, requests)
+
+class Context:
+    """Fixtures from the generators plus the tokens and ids gathered while the scenarios run."""
+
+    def __init__(self, fixtures, admin_token, user_tokens, run_id):
+        self.fixtures = fixtures
+        self.admin_token = admin_token
+        # [(token, company)] for a sample of the seeded users
+        self.user_tokens = user_tokens
+        self.run_id = run_id
+        self.pools = {'users': [], 'documents': [], 'folders': [], 'jobs': [], 'uploads': []}
+        self.etags = {}
+        self.upload_pages = 0
+
+    def user(self, i):
+        return self.user_tokens[i % len(self.user_tokens)]
+
+    def pick(self, items, i):
+        # A stride that is coprime with any realistic size spreads requests over the items
+        return items[(i * 7919) % len(items)]
+
+def query(path, **params):
+    return f"{path}?{urlencode({key: value for key, value in params.items() if value is not None})}"
+
+def _documents(ctx, i):
+    token, company = ctx.user(i)
+    return Request('GET', query('/documents', company_id=company['id'], limit=50), token)
+
+def _remember_etag(ctx, i, response):
+    _, company = ctx.user(i)
+    ctx.etags[company['id']] = response.headers.get('etag')
+
+def _documents_revalidate(ctx, i):
+    token, company = ctx.user(i)
+    headers = {'If-None-Match': ctx.etags[company['id']]} if ctx.etags.get(company['id']) else {}
+    return Request('GET', query('/documents', company_id=company['id'], limit=50), token, headers=headers)
+
+def _documents_in_folder(ctx, i):
+    token, company = ctx.user(i)
+    return Request('GET', query('/documents', company_id=company['id'], folder_id=ctx.pick(company['folders'], i),
+                                document_type='invoice', limit=50), token)
+
+def _document(ctx, i, suffix):
+    token, company = ctx.user(i)
+    return Request('GET', f"/documents/{ctx.pick(company['documents'], i)}{suffix}", token)
+
+def _search(ctx, i):
+    token, company = ctx.user(i)
+    return Request('GET', query('/documents/search', company_id=company['id'], q=WORDS[i % len(WORDS)]), token)
+
+def _invoices(ctx, i):
+    token, company = ctx.user(i)
+    return Request('GET', query('/invoices', company_id=company['id'], limit=50,
+                                min_total=1000 if i % 2 else None), token)
+
+def _invoice_totals(ctx, i):
+    token, company = ctx.user(i)
+    return Request('GET', query('/invoices/totals', company_id=company['id'],
+                                group_by=('month', 'supplier', 'currency')[i % 3]), token)
+
+def _folders(ctx, i):
+    token, company = ctx.user(i)
+    return Request('GET', query('/folders', company_id=company['id']), token)
+
+def _folder_tree(ctx, i):
+    token, company = ctx.user(i)
+    return Request('GET', query('/folders/tree', company_id=company['id']), token)
+
+def _folder_path(ctx, i):
+    token, company = ctx.user(i)
+    return Request('GET', f"/folders/{ctx.pick(company['folders'], i)}/path", token)
+
+def _login(ctx, i):
+    _, company = ctx.user(i)
+    return Request('POST', '/login', json_body={
+        'username': company['users'][i % len(company['users'])], 'password': ctx.fixtures['password']
+    })
+
+def _register(ctx, i):
+    return Request('POST', '/register', json_body={
+        'username': f"bench-reg-{ctx.run_id}-{i}", 'password': ctx.fixtures['password']
+    })
+
+def _create_user(ctx, i):
+    return Request('POST', '/admin/users', ctx.admin_token, json_body={
+        'username': f"bench-new-{ctx.run_id}-{i}", 'password': ctx.fixtures['password']
+    })
+
+def _create_company(ctx, i):
+    token, _ = ctx.user(i)
+    return Request('POST', '/companies', token, json_body={'name': f"Bench New Company {ctx.run_id}-{i}"})
+
+def _create_document(ctx, i):
+    token, company = ctx.user(i)
+    return Request('POST', '/documents', token, json_body={
+        'company_id': company['id'], 'filename': f"created-{ctx.run_id}-{i}.pdf",
+        'document_type': ('invoice', 'non_invoice')[i % 2]
+    })
+
+def _upload(ctx, i):
+    token, company = ctx.user(i)
+    filename, document_type, pdf, pages = upload_document(ctx.fixtures['seed'], i)
+    ctx.upload_pages += pages
+    # Every fourth upload leaves the type to the classifier
+    return Request('POST', query('/documents/upload', company_id=company['id'], filename=filename,
+                                 document_type=document_type if i % 4 else None),
+                   token, body=pdf, headers={'Content-Type': 'application/pdf'})
+
+def _collect_upload(ctx, i, response):
+    data = response.json()
+    ctx.pools['jobs'].append(data['job_id'])
+    ctx.pools['uploads'].append(data['document_id'])
+
+def _import(ctx, i):
+    token, company = ctx.user(i)
+    return Request('POST', query('/documents/import', company_id=company['id'], format='ndjson'), token,
+                   body=import_payload(ctx.fixtures['seed'], i, 1000), headers={'Content-Type': 'application/x-ndjson'})
+
+def _create_folder(ctx, i):
+    token, company = ctx.user(i)
+    return Request('POST', '/folders', token, json_body={
+        'name': f"New folder {ctx.run_id}-{i}", 'company_id': company['id'],
+        'parent_id': ctx.pick(company['folders'], i) if i % 2 else None
+    })
+
+def _collect(pool, key):
+    def collect(ctx, i, response):
+        ctx.pools[pool].append(response.json()[key])
+    return collect
+
+def _on_pool(method, pool, path, body=None, admin=False):
+    def build(ctx, i):
+        token = ctx.admin_token if admin else ctx.user(i)[0]
+        return Request(method, path.format(ctx.pools[pool][i]), token, json_body=body(i) if body else None)
+    return build
+
+def _admin_get(path):
+    def build(ctx, i):
+        return Request('GET', path, ctx.admin_token)
+    return build
+
+def _anonymous_get(path):
+    def build(ctx, i):
+        return Request('GET', path)
+    return build
+
+SCENARIOS = [
+    Scenario('GET /ready', _anonymous_get('/ready')),
+    Scenario('GET /metrics', _anonymous_get('/metrics')),
+    Scenario('GET /companies', lambda ctx, i: Request('GET', '/companies', ctx.user(i)[0])),
+    Scenario('GET /documents', _documents, collect=_remember_etag),
+    Scenario('GET /documents (304)', _documents_revalidate, expect=(304,)),
+    Scenario('GET /documents (folder, type)', _documents_in_folder),
+    Scenario('GET /documents/<id>/history', lambda ctx, i: _document(ctx, i, '/history?limit=50')),
+    Scenario('GET /documents/<id>/download', lambda ctx, i: _document(ctx, i, '/download')),
+    Scenario('GET /documents/search', _search),
+    Scenario('GET /invoices', _invoices),
+    Scenario('GET /invoices/totals', _invoice_totals),
+    Scenario('GET /folders', _folders),
+    Scenario('GET /folders/tree', _folder_tree),
+    Scenario('GET /folders/<id>/path', _folder_path),
+    Scenario('GET /admin/users', _admin_get('/admin/users')),
+    Scenario('GET /admin/db/pool', _admin_get('/admin/db/pool')),
+    Scenario('GET /admin/extraction-cache', _admin_get('/admin/extraction-cache')),
+    Scenario('GET /admin/cache', _admin_get('/admin/cache')),
+    # bcrypt bound: a few hundred ms of CPU each
+    Scenario('POST /login', _login, limit=200),
+    # Logins hash on their own worker pool: other routes should barely notice a storm of them.
+    # 503 is the hasher shedding load, which is what it should do under a storm.
+    MixedScenario('GET /documents (login storm)', Scenario('GET /documents', _documents),
+                  Scenario('POST /login', _login, expect=(200, 503)), background_clients=32),
+    MixedScenario('GET /folders/tree (login storm)', Scenario('GET /folders/tree', _folder_tree),
+                  Scenario('POST /login', _login, expect=(200, 503)), background_clients=32),
+    Scenario('POST /register', _register, expect=(201,), limit=50, idempotent=False),
+    Scenario('POST /admin/users', _create_user, expect=(201,), limit=50, idempotent=False,
+             collect=_collect('users', 'user_id')),
+    Scenario('PUT /admin/users/<id>', _on_pool('PUT', 'users', '/admin/users/{}', lambda i: {'user_limit': i},
+                                               admin=True), pool='users', idempotent=False),
+    Scenario('DELETE /admin/users/<id>', _on_pool('DELETE', 'users', '/admin/users/{}', admin=True),
+             pool='users', idempotent=False),
+    Scenario('POST /companies', _create_company, expect=(201,), idempotent=False),
+    Scenario('POST /documents', _create_document, expect=(201,), idempotent=False,
+             collect=_collect('documents', 'document_id')),
+    Scenario('POST /documents/upload', _upload, expect=(202,), limit=200, idempotent=False,
+             collect=_collect_upload),
+    Scenario('GET /jobs/<id>', _on_pool('GET', 'jobs', '/jobs/{}'), pool='jobs'),
+    Scenario('POST /documents/import', _import, limit=20, idempotent=False),
+    Scenario('DELETE /documents/<id>', _on_pool('DELETE', 'documents', '/documents/{}'), pool='documents',
+             idempotent=False),
+    Scenario('POST /folders', _create_folder, expect=(201,), idempotent=False,
+             collect=_collect('folders', 'folder_id')),
+    Scenario('PUT /folders/<id>', _on_pool('PUT', 'folders', '/folders/{}', lambda i: {'name': f"Renamed {i}"}),
+             pool='folders', idempotent=False),
+    Scenario('DELETE /folders/<id>', _on_pool('DELETE', 'folders', '/folders/{}'), pool='folders',
+             idempotent=False),
+]
@@ -0,0 +1,174 @@
+# backend/bulk_import.py
+
+import csv
+import io
+import json
+import sqlite3
+
+from mysql.connector import Error
+
+from classifier import classify_texts
+from search_index import search_index
+
+IMPORT_CONFIG = {
+    'default_batch_size': 1000,
+    'max_batch_size': 10000,
+    # Errors beyond this are counted but not listed in the response
+    'max_reported_errors': 1000,
+}
+
+DOCUMENT_TYPES = ('invoice', 'non_invoice')
+
+def iter_ndjson(stream):
+    """Yields (line_number, record) for each non-empty line; bad JSON yields the error."""
+    for line_number, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8'), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, e
+
+def iter_csv(stream):
+    """Yields (line_number, record) for each CSV row; the first line is the header."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+    for record in reader:
+        yield reader.line_num, record
+
+def validate_record(record, folder_in_company):
+    """
+    Returns (document, None) for a valid record or (None, error message).
+    A record may leave out document_type if it carries the document's text.
+    folder_in_company(folder_id) tells whether the folder belongs to the target company.
+    """
+    if isinstance(record, Exception):
+        return None, f"Invalid JSON: {record}"
+    if not isinstance(record, dict):
+        return None, "Record must be an object"
+
+    filename = (record.get('filename') or '').strip()
+    if not filename:
+        return None, "Missing filename"
+    document_type = record.get('document_type') or None
+    if document_type not in DOCUMENT_TYPES and not (document_type is None and record.get('text')):
+        return None, "Invalid document type"
+
+    try:
+        folder_id = int(record['folder_id']) if record.get('folder_id') not in (None, '') else None
+        file_size = int(record['file_size']) if record.get('file_size') not in (None, '') else 0
+    except (TypeError, ValueError):
+        return None, "folder_id and file_size must be integers"
+    if folder_id is not None and not folder_in_company(folder_id):
+        return None, "Folder not found in this company"
+
+    return {
+        'filename': filename,
+        'document_type': document_type,
+        'folder_id': folder_id,
+        'file_path': record.get('file_path') or None,
+        'file_size': file_size,
+        # Only kept until the classifier has filled in the type
+        'text': record['text'] if document_type is None else None
+    }, None
+
+class DocumentImporter:
+    """Streams records into the documents table in batches, one transaction per batch."""
+
+    def __init__(self, db, owner_id, company_id, batch_size):
+        self.db = db
+        self.owner_id = owner_id
+        self.company_id = company_id
+        self.batch_size = batch_size
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        # Batches that were imported but could not be added to the search index
+        self.index_errors = []
+        # folder_id: whether it belongs to the company; imports reuse a handful of folders
+        self._folders = {}
+
+    def _folder_in_company(self, folder_id):
+        if folder_id not in self._folders:
+            self._folders[folder_id] = self.db.get_folder_company_id(folder_id) == self.company_id
+        return self._folders[folder_id]
+
+    def _error(self, line_number, msg):
+        self.failed += 1
+        if len(self.errors) < IMPORT_CONFIG['max_reported_errors']:
+            self.errors.append({"line": line_number, "msg": msg})
+
+    def _classify(self, batch):
+        """Fills in document_type for records that only carried text, one model call per batch."""
+        untyped = [(line_number, doc) for line_number, doc in batch if doc['document_type'] is None]
+        if not untyped:
+            return batch
+
+        predictions = classify_texts([doc['text'] for _, doc in untyped])
+        if not predictions:
+            for line_number, _ in untyped:
+                self._error(line_number, "Missing document type and no classifier model is trained")
+            return [(line_number, doc) for line_number, doc in batch if doc['document_type'] is not None]
+
+        for (_, doc), (document_type, _) in zip(untyped, predictions):
+            doc['document_type'] = document_type
+        return batch
+
+    def _index(self, created):
+        """
+        Adds the committed (line_number, document_id, doc) rows to the search index.
+        They stay imported if that fails; the batch is reported in index_errors.
+        """
+        if not created:
+            return
+        try:
+            search_index.index_documents(
+                (document_id, self.company_id, doc['filename'], doc['text']) for _, document_id, doc in created
+            )
+        except sqlite3.Error as e:
+            self.index_errors.append({
+                "lines": [created[0][0], created[-1][0]],
+                "document_ids": [document_id for _, document_id, _ in created],
+                "msg": str(e)
+            })
+
+    def _flush(self, batch):
+        batch = self._classify(batch)
+        if not batch:
+            return
+        docs = [doc for _, doc in batch]
+        try:
+            document_ids = self.db.bulk_create_documents(self.owner_id, self.company_id, docs)
+            created = [(line_number, document_id, doc) for (line_number, doc), document_id in zip(batch, document_ids)]
+        except Error:
+            # The batch was rolled back; redo it row by row to find the offending rows
+            created = []
+            for line_number, doc in batch:
+                try:
+                    document_id, = self.db.bulk_create_documents(self.owner_id, self.company_id, [doc])
+                    created.append((line_number, document_id, doc))
+                except Error as e:
+                    self._error(line_number, str(e))
+        self.imported += len(created)
+        self._index(created)
+
+    def run(self, records):
+        batch = []
+        for line_number, record in records:
+            doc, error = validate_record(record, self._folder_in_company)
+            if error:
+                self._error(line_number, error)
+                continue
+            batch.append((line_number, doc))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        self._flush(batch)
+
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "index_errors": self.index_errors
+        }
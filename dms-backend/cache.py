@@ -0,0 +1,142 @@
+# backend/cache.py
+
+import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_CONFIG = {
+    'max_entries': int(os.environ.get('DMS_CACHE_MAX_ENTRIES', 10000)),
+    'ttl': float(os.environ.get('DMS_CACHE_TTL', 60)),
+    # Directory of unix sockets shared by the workers of one deployment; unset disables it
+    'bus_directory': os.environ.get('DMS_CACHE_BUS_DIR'),
+}
+
+MISSING = object()
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, name, max_entries, ttl, bus=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bus = bus
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        if bus:
+            bus.register(self)
+
+    def get(self, key):
+        """Returns the cached value or MISSING."""
+        if self.bus:
+            self.bus.ensure_listening()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self._stats['misses'] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key, publish=True):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+        if publish and self.bus:
+            self.bus.publish(self.name, key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+class InvalidationBus:
+    """
+    Local pub/sub between the worker processes of one host: every process binds
+    a unix datagram socket in a shared directory and invalidations are sent to
+    all the other sockets found there.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._caches = {}
+        self._socket = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def register(self, cache):
+        self._caches[cache.name] = cache
+
+    def ensure_listening(self):
+        # Checked on every cache use so each forked worker binds its own socket
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{os.getpid()}.sock")
+            if os.path.exists(path):
+                os.remove(path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+            self._socket = sock
+            self._pid = os.getpid()
+            threading.Thread(target=self._listen, args=(sock,), name="cache-bus", daemon=True).start()
+
+    def _listen(self, sock):
+        while True:
+            try:
+                message = json.loads(sock.recv(65536))
+            except (OSError, ValueError):
+                continue
+            cache = self._caches.get(message.get('cache'))
+            if cache:
+                cache.invalidate(message.get('key'), publish=False)
+
+    def publish(self, cache_name, key):
+        self.ensure_listening()
+        payload = json.dumps({'cache': cache_name, 'key': key}).encode('utf-8')
+        own = f"{os.getpid()}.sock"
+        for name in os.listdir(self.directory):
+            if not name.endswith('.sock') or name == own:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                self._socket.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker that owned this socket is gone
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            except OSError as e:
+                print(f"Error publishing cache invalidation: {e}")
+
+invalidation_bus = InvalidationBus(CACHE_CONFIG['bus_directory']) if CACHE_CONFIG['bus_directory'] else None
+
+def make_cache(name):
+    return TTLCache(name, CACHE_CONFIG['max_entries'], CACHE_CONFIG['ttl'], bus=invalidation_bus)
@@ -0,0 +1,278 @@
+# backend/classifier.py
+#
+# Invoice / non-invoice classifier over extracted text: hashed word n-gram
+# features and a logistic regression, trained and run locally on the CPU.
+#
+#     python classifier.py train labelled.ndjson        # {"text": ..., "document_type": ...} per line
+#     python classifier.py train --from-db              # documents already typed by users
+#     python classifier.py evaluate labelled.ndjson     # accuracy and ms/document
+#     python classifier.py reclassify [--company-id N] [--only-missing] [--dry-run]
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+CLASSIFIER_CONFIG = {
+    'model_path': os.environ.get(
+        'DMS_CLASSIFIER_MODEL',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'document_type.npz')
+    ),
+    # Must be a power of two; changing it requires retraining
+    'n_features': 2 ** 18,
+    # The type is decided by the first pages, and long documents stay under 5 ms
+    'max_chars': 20000,
+    'batch_size': 256,
+    'epochs': 8,
+    'learning_rate': 0.5,
+    'l2': 1e-6,
+}
+
+LABELS = ('non_invoice', 'invoice')
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+DIGIT_RE = re.compile(r"\d")
+
+def hashed_features(text, n_features, max_chars):
+    """
+    Word unigrams and bigrams of the text hashed into n_features signed
+    buckets. Returns (indices, values) with the values L2-normalised.
+    Digits are folded to 0 so amounts and dates share features.
+    """
+    tokens = TOKEN_RE.findall(DIGIT_RE.sub('0', (text or '')[:max_chars].lower()))
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    # crc32 rather than hash(): it is stable across processes and restarts
+    hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint32, count=len(grams))
+    signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+    indices, inverse = np.unique((hashes & (n_features - 1)).astype(np.int64), return_inverse=True)
+    values = np.bincount(inverse, weights=signs)
+    norm = np.linalg.norm(values)
+    return indices, (values / norm if norm else values)
+
+class DocumentClassifier:
+    def __init__(self, weights, bias=0.0, n_features=CLASSIFIER_CONFIG['n_features'],
+                 max_chars=CLASSIFIER_CONFIG['max_chars']):
+        self.weights = weights
+        self.bias = bias
+        self.n_features = n_features
+        self.max_chars = max_chars
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as model:
+            return cls(model['weights'], float(model['bias']), int(model['n_features']), int(model['max_chars']))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # np.savez appends .npz to names without it; write to the exact path instead
+        with open(path, 'wb') as f:
+            np.savez(f, weights=self.weights, bias=self.bias, n_features=self.n_features, max_chars=self.max_chars)
+
+    def features(self, texts):
+        return [hashed_features(text, self.n_features, self.max_chars) for text in texts]
+
+    def predict_proba(self, texts):
+        """Probability that each text is an invoice, scored as one batch."""
+        features = self.features(texts)
+        if not features:
+            return np.zeros(0)
+        doc_ids = np.repeat(np.arange(len(features)), [len(indices) for indices, _ in features])
+        indices = np.concatenate([indices for indices, _ in features])
+        values = np.concatenate([values for _, values in features])
+        scores = np.bincount(doc_ids, weights=self.weights[indices] * values, minlength=len(features)) + self.bias
+        return 1.0 / (1.0 + np.exp(-scores))
+
+    def predict(self, texts):
+        """Returns [(document_type, probability of that type)] for each text."""
+        return [
+            (LABELS[1], float(p)) if p >= 0.5 else (LABELS[0], float(1.0 - p))
+            for p in self.predict_proba(texts)
+        ]
+
+    @classmethod
+    def train(cls, texts, labels, epochs=CLASSIFIER_CONFIG['epochs'], learning_rate=CLASSIFIER_CONFIG['learning_rate'],
+              l2=CLASSIFIER_CONFIG['l2'], seed=0):
+        """Logistic regression fitted by SGD over the hashed features."""
+        model = cls(np.zeros(CLASSIFIER_CONFIG['n_features']))
+        features = model.features(texts)
+        targets = np.array([1.0 if label == LABELS[1] else 0.0 for label in labels])
+        rng = np.random.default_rng(seed)
+
+        step = 0
+        for _ in range(epochs):
+            for i in rng.permutation(len(features)):
+                indices, values = features[i]
+                rate = learning_rate / (1.0 + 0.01 * step)
+                step += 1
+                score = model.weights[indices] @ values + model.bias
+                error = 1.0 / (1.0 + np.exp(-score)) - targets[i]
+                model.weights[indices] -= rate * (error * values + l2 * model.weights[indices])
+                model.bias -= rate * error
+        return model
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_classifier():
+    """The trained model, loaded on first use; None when no model has been trained."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None and os.path.exists(CLASSIFIER_CONFIG['model_path']):
+            _classifier = DocumentClassifier.load(CLASSIFIER_CONFIG['model_path'])
+        return _classifier
+
+def classify_texts(texts):
+    """Batch prediction in chunks of batch_size; an empty list when no model is available."""
+    classifier = get_classifier()
+    if classifier is None:
+        return []
+    predictions = []
+    for start in range(0, len(texts), CLASSIFIER_CONFIG['batch_size']):
+        predictions.extend(classifier.predict(texts[start:start + CLASSIFIER_CONFIG['batch_size']]))
+    return predictions
+
+def read_labelled(path):
+    texts, labels = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get('document_type') in LABELS and record.get('text'):
+                texts.append(record['text'])
+                labels.append(record['document_type'])
+    return texts, labels
+
+def iter_documents(company_id=None, only_missing=False, only_typed=False, batch_size=CLASSIFIER_CONFIG['batch_size']):
+    """Yields batches of (document row, extracted text) for documents with indexed text."""
+    from db import db
+    from search_index import search_index
+
+    after_id = 0
+    while True:
+        rows = db.get_documents_for_classification(
+            after_id, batch_size, company_id=company_id, only_missing=only_missing, only_typed=only_typed
+        )
+        if not rows:
+            return
+        after_id = rows[-1]['id']
+        texts = search_index.document_texts([row['id'] for row in rows])
+        yield [(row, texts[row['id']]) for row in rows if texts.get(row['id'])]
+
+def evaluate(model, texts, labels):
+    start = time.perf_counter()
+    predictions = [label for label, _ in model.predict(texts)]
+    batch_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in texts[:500]:
+        model.predict([text])
+    single_ms = (time.perf_counter() - start) * 1000 / max(min(len(texts), 500), 1)
+
+    true_positive = sum(p == l == 'invoice' for p, l in zip(predictions, labels))
+    predicted_positive = predictions.count('invoice')
+    actual_positive = labels.count('invoice')
+    return {
+        "documents": len(texts),
+        "accuracy": sum(p == l for p, l in zip(predictions, labels)) / max(len(texts), 1),
+        "invoice_precision": true_positive / predicted_positive if predicted_positive else 0.0,
+        "invoice_recall": true_positive / actual_positive if actual_positive else 0.0,
+        "batch_docs_per_second": len(texts) / batch_seconds if batch_seconds else 0.0,
+        "single_ms_per_document": single_ms,
+    }
+
+def reclassify(company_id=None, only_missing=False, dry_run=False):
+    """Runs the model over stored documents and updates the ones whose type changes."""
+    from db import db
+    from invoice_extractor import extract_invoice_fields
+
+    classifier = get_classifier()
+    if classifier is None:
+        sys.exit(f"No model at {CLASSIFIER_CONFIG['model_path']}; run `python classifier.py train` first")
+
+    checked = changed = 0
+    for batch in iter_documents(company_id=company_id, only_missing=only_missing):
+        predictions = classifier.predict([text for _, text in batch])
+        for (row, text), (document_type, probability) in zip(batch, predictions):
+            checked += 1
+            if row['document_type'] == document_type:
+                continue
+            changed += 1
+            print(f"Document {row['id']}: {row['document_type']} -> {document_type} ({probability:.2f})")
+            if dry_run:
+                continue
+            db.update_document_type(row['id'], document_type)
+            db.add_document_history(
+                row['id'], row['owner_id'], f"Document type set to {document_type} by classifier ({probability:.2f})"
+            )
+            if document_type == 'invoice':
+                db.save_invoice_fields(row['id'], row['company_id'], extract_invoice_fields(text))
+            else:
+                db.delete_invoice_fields(row['id'])
+    print(f"{checked} documents checked, {changed} {'would change' if dry_run else 'changed'}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Invoice / non-invoice document classifier')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train = commands.add_parser('train', help='train a model and save it to DMS_CLASSIFIER_MODEL')
+    train.add_argument('data', nargs='?', help='NDJSON file of {"text", "document_type"} records')
+    train.add_argument('--from-db', action='store_true', help='train on documents already typed by users')
+    train.add_argument('--holdout', type=float, default=0.2, help='share of the data kept back for evaluation')
+
+    evaluate_command = commands.add_parser('evaluate', help='accuracy and throughput of the saved model')
+    evaluate_command.add_argument('data', help='NDJSON file of {"text", "document_type"} records')
+
+    reclassify_command = commands.add_parser('reclassify', help='re-run the model over stored documents')
+    reclassify_command.add_argument('--company-id', type=int)
+    reclassify_command.add_argument('--only-missing', action='store_true', help='only documents without a type')
+    reclassify_command.add_argument('--dry-run', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        if args.from_db:
+            texts, labels = [], []
+            for batch in iter_documents(only_typed=True):
+                for row, text in batch:
+                    texts.append(text)
+                    labels.append(row['document_type'])
+        elif args.data:
+            texts, labels = read_labelled(args.data)
+        else:
+            parser.error('train needs a data file or --from-db')
+        if not texts:
+            sys.exit('No labelled documents found')
+
+        order = np.random.default_rng(0).permutation(len(texts))
+        split = int(len(texts) * (1 - args.holdout))
+        train_ids, test_ids = order[:split], order[split:]
+        start = time.perf_counter()
+        model = DocumentClassifier.train([texts[i] for i in train_ids], [labels[i] for i in train_ids])
+        print(f"Trained on {len(train_ids)} documents in {time.perf_counter() - start:.1f}s")
+        if len(test_ids):
+            print(json.dumps(evaluate(model, [texts[i] for i in test_ids], [labels[i] for i in test_ids]), indent=2))
+        model.save(CLASSIFIER_CONFIG['model_path'])
+        print(f"Saved model to {CLASSIFIER_CONFIG['model_path']}")
+
+    elif args.command == 'evaluate':
+        model = get_classifier()
+        if model is None:
+            sys.exit(f"No model at {CLASSIFIER_CONFIG['model_path']}")
+        texts, labels = read_labelled(args.data)
+        print(json.dumps(evaluate(model, texts, labels), indent=2))
+
+    else:
+        reclassify(args.company_id, args.only_missing, args.dry_run)
+
+if __name__ == '__main__':
+    main()
@@ -1,156 +1,274 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
 import mysql.connector
-from mysql.connector import Error
-import bcrypt
+from mysql.connector import Error, errorcode
+from mysql.connector.errors import PoolError, ProgrammingError
 from datetime import datetime
 
+from password_hasher import password_hasher
+from history_writer import history_writer
+from cache import MISSING, make_cache
+import metrics
+
 # Database configuration
 DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'dms_db',
-    'user': 'root',
-    'password': '',  # Set your MySQL password
+    'host': os.environ.get('DMS_DB_HOST', 'localhost'),
+    'port': int(os.environ.get('DMS_DB_PORT', 3306)),
+    'database': os.environ.get('DMS_DB_NAME', 'dms_db'),
+    'user': os.environ.get('DMS_DB_USER', 'root'),
+    'password': os.environ.get('DMS_DB_PASSWORD', ''),  # Set your MySQL password
 }
 
-class DatabaseManager:
-    def __init__(self):
-        self.connection = None
+# Connection pool configuration
+POOL_CONFIG = {
+    'pool_size': int(os.environ.get('DMS_DB_POOL_SIZE', 10)),
+    'checkout_timeout': float(os.environ.get('DMS_DB_POOL_TIMEOUT', 10)),
+    # Connections idle for longer than this are pinged before being handed out
+    'health_check_interval': float(os.environ.get('DMS_DB_POOL_PING_INTERVAL', 1)),
+}
 
-    def connect(self):
-        try:
-            self.connection = mysql.connector.connect(**DB_CONFIG)
-            return self.connection
-        except Error as e:
-            print(f"Error connecting to MySQL: {e}")
-            return None
+# Columns that can be requested through the `fields=` projection of the document listing
+DOCUMENT_FIELDS = {
+    'id': 'd.id',
+    'filename': 'd.filename',
+    'document_type': 'd.document_type',
+    'owner_id': 'd.owner_id',
+    'company_id': 'd.company_id',
+    'folder_id': 'd.folder_id',
+    'file_path': 'd.file_path',
+    'file_size': 'd.file_size',
+    'summary': 'd.summary',
+    'extraction_status': 'd.extraction_status',
+    'created_at': 'd.created_at',
+    'updated_at': 'd.updated_at',
+    'owner_name': 'u.username',
+    'folder_name': 'f.name',
+}
 
-    def disconnect(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+USER_COMPANIES_QUERY = """
+    SELECT c.* FROM companies c
+    JOIN user_companies uc ON c.id = uc.company_id
+    WHERE uc.user_id = %s
+    ORDER BY c.name
+"""
 
-    def execute_query(self, query, params=None, fetch=False):
+# Never kept in the user caches: logins read them from the database (get_user_credentials)
+AUTH_FIELDS = ('password_hash', 'is_active')
+
+# Status of an extraction job from its document row, for jobs this process did not run
+EXTRACTION_JOB_QUERY = """
+    SELECT extraction_job_id AS job_id, id AS document_id, company_id, extraction_status AS status
+    FROM documents
+    WHERE extraction_job_id = %s
+"""
+
+# Recursive folder queries stop here, so a parent_id cycle cannot loop forever
+MAX_FOLDER_DEPTH = 100
+
+class ConnectionPool:
+    """Fixed-size pool of MySQL connections shared by the request threads."""
+
+    def __init__(self, pool_size, checkout_timeout, health_check_interval, **config):
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.config = config
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'reconnects': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def _new_connection(self):
+        return mysql.connector.connect(**self.config)
+
+    def _reserve_slot(self):
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                return True
+            return False
+
+    def _release_slot(self):
+        with self._lock:
+            self._created -= 1
+
+    def _checked(self, connection, released_at):
+        # Only ping connections that sat idle long enough to have been dropped
+        if time.monotonic() - released_at < self.health_check_interval:
+            return connection
+        if connection.is_connected():
+            return connection
+        with self._lock:
+            self._stats['reconnects'] += 1
         try:
-            if not self.connection or not self.connection.is_connected():
-                self.connect()
-            
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            
-            if fetch:
-                result = cursor.fetchall()
-                cursor.close()
-                return result
+            connection.close()
+        except Error:
+            pass
+        return self._new_connection()
+
+    def acquire(self):
+        start = time.perf_counter()
+        try:
+            connection, released_at = self._idle.get_nowait()
+        except queue.Empty:
+            if self._reserve_slot():
+                try:
+                    connection = self._new_connection()
+                except Error:
+                    self._release_slot()
+                    raise
+                released_at = None
             else:
-                self.connection.commit()
-                last_id = cursor.lastrowid
-                cursor.close()
-                return last_id
-        except Error as e:
-            print(f"Database error: {e}")
-            if self.connection:
-                self.connection.rollback()
-            raise e
-
-    def init_database(self):
+                try:
+                    connection, released_at = self._idle.get(timeout=self.checkout_timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise PoolError("Timed out waiting for a database connection")
+
+        if released_at is not None:
+            try:
+                connection = self._checked(connection, released_at)
+            except Error:
+                self._release_slot()
+                raise
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        return connection
+
+    def release(self, connection):
         try:
-            self.connect()
-            cursor = self.connection.cursor()
+            # Never hand a connection with an open transaction/snapshot to the next borrower
+            if connection.in_transaction:
+                connection.rollback()
+        except Error:
+            try:
+                connection.close()
+            except Error:
+                pass
+            self._release_slot()
+            return
+        self._idle.put((connection, time.monotonic()))
 
-            # Create database if not exists
-            cursor.execute("CREATE DATABASE IF NOT EXISTS dms_db")
-            cursor.execute("USE dms_db")
+    def close_all(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                connection.close()
+            except Error:
+                pass
+            self._release_slot()
 
-            # Create companies table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS companies (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL UNIQUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pool_size'] = self.pool_size
+            stats['open'] = self._created
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['open'] - stats['idle']
+        stats['wait_time_avg'] = (
+            stats['wait_time_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        )
+        return stats
 
-            # Create users table with new fields
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    username VARCHAR(50) NOT NULL UNIQUE,
-                    password_hash VARCHAR(255) NOT NULL,
-                    role ENUM('admin', 'user') DEFAULT 'user',
-                    is_active BOOLEAN DEFAULT TRUE,
-                    user_limit INT DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+class DatabaseManager:
+    def __init__(self):
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._local = threading.local()
+        # user id -> user row, username -> user id, user id -> company rows
+        self.user_cache = make_cache('users')
+        self.username_cache = make_cache('usernames')
+        self.user_companies_cache = make_cache('user_companies')
 
-            # Create user_companies junction table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_companies (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT,
-                    company_id INT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                    FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
-                    UNIQUE KEY unique_user_company (user_id, company_id)
-                )
-            """)
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(**POOL_CONFIG, **DB_CONFIG)
+        return self._pool
 
-            # Create folders table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS folders (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL,
-                    parent_id INT NULL,
-                    company_id INT NOT NULL,
-                    created_by INT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (parent_id) REFERENCES folders(id) ON DELETE CASCADE,
-                    FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
-                    FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE CASCADE
-                )
-            """)
+    @contextmanager
+    def pooled_connection(self):
+        """Check out a pooled connection for the duration of the block.
 
-            # Create documents table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS documents (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    filename VARCHAR(255) NOT NULL,
-                    document_type ENUM('invoice', 'non_invoice') NOT NULL,
-                    owner_id INT NOT NULL,
-                    company_id INT NOT NULL,
-                    folder_id INT NULL,
-                    file_path VARCHAR(500),
-                    file_size INT DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (owner_id) REFERENCES users(id) ON DELETE CASCADE,
-                    FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
-                    FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE SET NULL
-                )
-            """)
+        Nested blocks on the same thread reuse the connection that is already
+        checked out, so a caller can group several queries on one connection.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            yield connection
+            return
 
-            # Create document_history table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS document_history (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    document_id INT NOT NULL,
-                    user_id INT NOT NULL,
-                    action VARCHAR(255) NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE,
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-                )
-            """)
+        connection = self.pool.acquire()
+        self._local.connection = connection
+        try:
+            yield connection
+        finally:
+            self._local.connection = None
+            self.pool.release(connection)
 
-            self.connection.commit()
+    @contextmanager
+    def transaction(self):
+        """Run several statements on one pooled connection, committed together."""
+        with self.pooled_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                yield cursor
+                connection.commit()
+            except Error as e:
+                print(f"Database error: {e}")
+                connection.rollback()
+                raise e
+            finally:
+                cursor.close()
 
-            # Create default users if they don't exist
-            self.create_default_users()
+    def disconnect(self):
+        if self._pool is not None:
+            self._pool.close_all()
 
-            cursor.close()
-            print("Database initialized successfully")
+    def execute_query(self, query, params=None, fetch=False):
+        with self.pooled_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            start = time.perf_counter()
+            rows = 0
+            try:
+                cursor.execute(query, params or ())
 
-        except Error as e:
-            print(f"Error initializing database: {e}")
+                if fetch:
+                    result = cursor.fetchall()
+                    rows = len(result)
+                    return result
+                else:
+                    connection.commit()
+                    rows = cursor.rowcount
+                    return cursor.lastrowid
+            except Error as e:
+                print(f"Database error: {e}")
+                connection.rollback()
+                raise e
+            finally:
+                metrics.record_query(query, time.perf_counter() - start, rows)
+                cursor.close()
 
     def create_default_users(self):
         try:
@@ -170,10 +288,54 @@ class DatabaseManager:
             print(f"Error creating default users: {e}")
 
     def hash_password(self, password):
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        return password_hasher.hash(password)
 
     def verify_password(self, hashed_password, password):
-        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+        return password_hasher.verify(hashed_password, password)
+
+    def password_needs_rehash(self, hashed_password):
+        return password_hasher.needs_rehash(hashed_password)
+
+    # Cache version methods
+    def bump_versions(self, *scopes):
+        """
+        Moves the version stamps of the given scopes on, e.g. 'documents:<company_id>'.
+        Called after the write itself is committed, so a reader never pairs a new
+        version with old data.
+        """
+        placeholders = ', '.join(['(%s, 1)'] * len(scopes))
+        query = f"""
+            INSERT INTO cache_versions (scope, version) VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE version = version + 1
+        """
+        try:
+            self.execute_query(query, scopes)
+        except ProgrammingError as e:
+            # Writes made by migrations before cache_versions exists (migration 6 creates
+            # the default users, 9 the table): no client holds an ETag yet, so none goes stale
+            if e.errno != errorcode.ER_NO_SUCH_TABLE:
+                raise
+
+    def get_versions(self, scopes):
+        """Current stamps as {scope: version}; scopes never written to are at 0."""
+        rows = self.execute_query(self.versions_query(scopes), list(scopes), fetch=True)
+        versions = {row['scope']: row['version'] for row in rows}
+        return {scope: versions.get(scope, 0) for scope in scopes}
+
+    @staticmethod
+    def versions_query(scopes):
+        placeholders = ', '.join(['%s'] * len(scopes))
+        return f"SELECT scope, version FROM cache_versions WHERE scope IN ({placeholders})"
+
+    def _company_of(self, table, row_id):
+        result = self.execute_query(f"SELECT company_id FROM {table} WHERE id = %s", (row_id,), fetch=True)
+        return result[0]['company_id'] if result else None
+
+    def _bump_company_versions(self, table, row_id, *kinds):
+        """Bumps e.g. 'documents:<company_id>' for the company owning the row."""
+        company_id = self._company_of(table, row_id)
+        if company_id:
+            self.bump_versions(*(f"{kind}:{company_id}" for kind in kinds))
 
     # User management methods
     def create_user(self, username, password, role='user', is_active=True, user_limit=0):
@@ -182,17 +344,56 @@ class DatabaseManager:
             INSERT INTO users (username, password_hash, role, is_active, user_limit)
             VALUES (%s, %s, %s, %s, %s)
         """
-        return self.execute_query(query, (username, hashed_password, role, is_active, user_limit))
+        user_id = self.execute_query(query, (username, hashed_password, role, is_active, user_limit))
+        self.bump_versions('users')
+        return user_id
+
+    def _cache_user(self, user):
+        """Caches the user without its auth fields and returns what was cached."""
+        cached = {key: value for key, value in user.items() if key not in AUTH_FIELDS}
+        self.user_cache.set(user['id'], cached)
+        self.username_cache.set(user['username'], user['id'])
+        return cached
 
     def get_user_by_username(self, username):
+        """The user without password_hash and is_active; see get_user_credentials."""
+        user_id = self.username_cache.get(username)
+        if user_id is not MISSING:
+            user = self.user_cache.get(user_id)
+            # The user may have been renamed since the username was cached
+            if user is not MISSING and user['username'] == username:
+                return user
+
         query = "SELECT * FROM users WHERE username = %s"
         result = self.execute_query(query, (username,), fetch=True)
-        return result[0] if result else None
+        return self._cache_user(result[0]) if result else None
+
+    def get_user_credentials(self, username):
+        """
+        The full user row, read from the database on every call: a password
+        change or deactivation applies at the next login in every worker,
+        whatever the other workers still have cached.
+        """
+        query = "SELECT * FROM users WHERE username = %s"
+        result = self.execute_query(query, (username,), fetch=True)
+        if not result:
+            return None
+        self._cache_user(result[0])
+        return result[0]
 
     def get_user_by_id(self, user_id):
+        """The user without password_hash and is_active."""
+        user = self.user_cache.get(user_id)
+        if user is not MISSING:
+            return user
+
         query = "SELECT * FROM users WHERE id = %s"
         result = self.execute_query(query, (user_id,), fetch=True)
-        return result[0] if result else None
+        return self._cache_user(result[0]) if result else None
+
+    def invalidate_user(self, user_id):
+        self.user_cache.invalidate(user_id)
+        self.user_companies_cache.invalidate(user_id)
 
     def get_all_users(self):
         query = "SELECT id, username, role, is_active, user_limit, created_at FROM users ORDER BY created_at DESC"
@@ -226,17 +427,23 @@ class DatabaseManager:
         
         try:
             self.execute_query(query, params)
+            self.bump_versions('users')
             return True
         except:
             return False
+        finally:
+            self.invalidate_user(user_id)
 
     def delete_user(self, user_id):
         query = "DELETE FROM users WHERE id = %s"
         try:
             self.execute_query(query, (user_id,))
+            self.bump_versions('users')
             return True
         except:
             return False
+        finally:
+            self.invalidate_user(user_id)
 
     # Company management methods
     def create_company(self, name):
@@ -244,33 +451,155 @@ class DatabaseManager:
         return self.execute_query(query, (name,))
 
     def get_user_companies(self, user_id):
-        query = """
-            SELECT c.* FROM companies c
-            JOIN user_companies uc ON c.id = uc.company_id
-            WHERE uc.user_id = %s
-            ORDER BY c.name
-        """
-        return self.execute_query(query, (user_id,), fetch=True)
+        companies = self.user_companies_cache.get(user_id)
+        if companies is not MISSING:
+            return companies
+
+        companies = self.execute_query(USER_COMPANIES_QUERY, (user_id,), fetch=True)
+        self.user_companies_cache.set(user_id, companies)
+        return companies
+
+    def user_has_company(self, user_id, company_id):
+        """Membership check served from the cached company list of the user"""
+        try:
+            company_id = int(company_id)
+        except (TypeError, ValueError):
+            return False
+        return any(company['id'] == company_id for company in self.get_user_companies(user_id))
 
     def add_user_to_company(self, user_id, company_id):
         query = "INSERT INTO user_companies (user_id, company_id) VALUES (%s, %s)"
-        return self.execute_query(query, (user_id, company_id))
+        try:
+            result = self.execute_query(query, (user_id, company_id))
+            self.bump_versions(f"user_companies:{user_id}")
+            return result
+        finally:
+            self.user_companies_cache.invalidate(user_id)
 
     def remove_user_from_company(self, user_id, company_id):
         query = "DELETE FROM user_companies WHERE user_id = %s AND company_id = %s"
         try:
             self.execute_query(query, (user_id, company_id))
+            self.bump_versions(f"user_companies:{user_id}")
             return True
         except:
             return False
+        finally:
+            self.user_companies_cache.invalidate(user_id)
+
+    def cache_stats(self):
+        return {
+            'users': self.user_cache.stats(),
+            'usernames': self.username_cache.stats(),
+            'user_companies': self.user_companies_cache.stats()
+        }
 
     # Document management methods
-    def create_document(self, owner_id, company_id, filename, document_type, folder_id=None, file_path=None, file_size=0):
+    def create_document(self, owner_id, company_id, filename, document_type, folder_id=None, file_path=None, file_size=0,
+                        extraction_status=None, extraction_job_id=None):
         query = """
-            INSERT INTO documents (filename, document_type, owner_id, company_id, folder_id, file_path, file_size)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            INSERT INTO documents (filename, document_type, owner_id, company_id, folder_id, file_path, file_size,
+                                   extraction_status, extraction_job_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        document_id = self.execute_query(query, (filename, document_type, owner_id, company_id, folder_id, file_path,
+                                                 file_size, extraction_status, extraction_job_id))
+        self.bump_versions(f"documents:{company_id}")
+        return document_id
+
+    def bulk_create_documents(self, owner_id, company_id, documents, action='Document imported'):
+        """
+        Insert many documents and their history rows in one transaction using
+        multi-row INSERTs. Returns the new document ids in input order.
+        """
+        if not documents:
+            return []
+
+        batch = uuid.uuid4().hex
+        with self.transaction() as cursor:
+            cursor.executemany("""
+                INSERT INTO documents (filename, document_type, owner_id, company_id, folder_id, file_path, file_size,
+                                       import_batch)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, [
+                (doc['filename'], doc['document_type'], owner_id, company_id,
+                 doc.get('folder_id'), doc.get('file_path'), doc.get('file_size') or 0, batch)
+                for doc in documents
+            ])
+            # Ids of one INSERT need not be consecutive (interleaved auto-increment locking,
+            # auto_increment_increment), but they do increase in row order
+            cursor.execute("SELECT id FROM documents WHERE import_batch = %s ORDER BY id", (batch,))
+            document_ids = [row['id'] for row in cursor.fetchall()]
+
+            cursor.executemany(
+                "INSERT INTO document_history (document_id, user_id, action) VALUES (%s, %s, %s)",
+                [(document_id, owner_id, action) for document_id in document_ids]
+            )
+        self.bump_versions(f"documents:{company_id}")
+        return document_ids
+
+    def update_document_type(self, document_id, document_type):
+        query = "UPDATE documents SET document_type = %s WHERE id = %s"
+        try:
+            self.execute_query(query, (document_type, document_id))
+            self._bump_company_versions('documents', document_id, 'documents')
+            return True
+        except:
+            return False
+
+    def get_documents_for_classification(self, after_id, limit, company_id=None, only_missing=False, only_typed=False):
+        """Documents with id > after_id in id order, for batch jobs walking the whole table."""
+        conditions = ["id > %s"]
+        params = [after_id]
+        if company_id:
+            conditions.append("company_id = %s")
+            params.append(company_id)
+        if only_missing:
+            conditions.append("document_type IS NULL")
+        if only_typed:
+            conditions.append("document_type IS NOT NULL")
+        query = f"""
+            SELECT id, owner_id, company_id, document_type
+            FROM documents
+            WHERE {' AND '.join(conditions)}
+            ORDER BY id
+            LIMIT %s
         """
-        return self.execute_query(query, (filename, document_type, owner_id, company_id, folder_id, file_path, file_size))
+        params.append(limit)
+        return self.execute_query(query, params, fetch=True)
+
+    def get_extraction_job(self, job_id):
+        result = self.execute_query(EXTRACTION_JOB_QUERY, (job_id,), fetch=True)
+        return dict(result[0], error=None) if result else None
+
+    def update_document_extraction(self, document_id, extraction_status, summary=None):
+        query = "UPDATE documents SET extraction_status = %s, summary = %s WHERE id = %s"
+        try:
+            self.execute_query(query, (extraction_status, summary, document_id))
+            self._bump_company_versions('documents', document_id, 'documents')
+            return True
+        except:
+            return False
+
+    def fail_interrupted_extractions(self):
+        """
+        Marks documents whose extraction was still queued or running as failed.
+        Jobs live in the memory of the process that accepted them, so call this
+        only while no web worker is running. Returns the number of documents.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT company_id FROM documents
+                WHERE extraction_status IN ('queued', 'running') FOR UPDATE
+            """)
+            company_ids = [row['company_id'] for row in cursor.fetchall()]
+            cursor.execute(
+                "UPDATE documents SET extraction_status = 'failed' WHERE extraction_status IN ('queued', 'running')"
+            )
+            count = cursor.rowcount
+        if company_ids:
+            self.bump_versions(*(f"documents:{company_id}" for company_id in company_ids))
+        return count
 
     def get_documents_by_company(self, company_id, document_type=None):
         if document_type:
@@ -294,6 +623,89 @@ class DatabaseManager:
             """
             return self.execute_query(query, (company_id,), fetch=True)
 
+    def get_documents_page(self, company_id, limit=None, cursor=None, fields=None,
+                           document_type=None, folder_id=None):
+        """Keyset-paginated document listing ordered by (created_at, id) descending.
+
+        `cursor` is the (created_at, id) of the last row of the previous page.
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        """
+        query, params, fields = self.documents_page_query(company_id, limit, cursor, fields, document_type, folder_id)
+        return self.documents_page_result(self.execute_query(query, params, fetch=True), limit, fields)
+
+    @staticmethod
+    def documents_page_query(company_id, limit=None, cursor=None, fields=None, document_type=None, folder_id=None):
+        """SQL of get_documents_page as (query, params, fields); shared with the async database layer."""
+        fields = [f for f in (fields or DOCUMENT_FIELDS) if f in DOCUMENT_FIELDS]
+        if not fields:
+            raise ValueError("No valid fields requested")
+
+        # created_at and id are always needed to build the next cursor
+        selected = list(dict.fromkeys(fields + ['created_at', 'id']))
+        columns = ', '.join(f"{DOCUMENT_FIELDS[f]} AS {f}" for f in selected)
+
+        joins = []
+        if 'owner_name' in selected:
+            joins.append("LEFT JOIN users u ON d.owner_id = u.id")
+        if 'folder_name' in selected:
+            joins.append("LEFT JOIN folders f ON d.folder_id = f.id")
+
+        conditions = ["d.company_id = %s"]
+        params = [company_id]
+        if document_type:
+            conditions.append("d.document_type = %s")
+            params.append(document_type)
+        if folder_id:
+            conditions.append("d.folder_id = %s")
+            params.append(folder_id)
+        if cursor:
+            created_at, last_id = cursor
+            conditions.append("(d.created_at < %s OR (d.created_at = %s AND d.id < %s))")
+            params.extend([created_at, created_at, last_id])
+
+        query = f"""
+            SELECT {columns}
+            FROM documents d
+            {' '.join(joins)}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY d.created_at DESC, d.id DESC
+        """
+        if limit is not None:
+            # Fetch one extra row to know whether another page exists
+            query += " LIMIT %s"
+            params.append(limit + 1)
+        return query, params, fields
+
+    @staticmethod
+    def documents_page_result(rows, limit, fields):
+        """Trims the extra row of a page and returns (rows, next_cursor)."""
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]['created_at'], rows[-1]['id'])
+
+        for row in rows:
+            for key in ('created_at', 'id'):
+                if key not in fields:
+                    row.pop(key)
+        return rows, next_cursor
+
+    @staticmethod
+    def document_filenames_query(company_id, document_ids):
+        placeholders = ', '.join(['%s'] * len(document_ids))
+        query = f"SELECT id, filename FROM documents WHERE company_id = %s AND id IN ({placeholders})"
+        return query, [company_id, *document_ids]
+
+    def get_document_filenames(self, company_id, document_ids):
+        """{document_id: filename} of the given documents that exist in the company."""
+        if not document_ids:
+            return {}
+        rows = self.execute_query(*self.document_filenames_query(company_id, document_ids), fetch=True)
+        return {row['id']: row['filename'] for row in rows}
+
+    def get_folder_company_id(self, folder_id):
+        return self._company_of('folders', folder_id)
+
     def get_document_by_id(self, document_id):
         query = """
             SELECT d.*, u.username as owner_name, f.name as folder_name
@@ -331,42 +743,214 @@ class DatabaseManager:
         
         try:
             self.execute_query(query, params)
+            self._bump_company_versions('documents', document_id, 'documents')
             return True
         except:
             return False
 
-    def delete_document(self, document_id):
-        query = "DELETE FROM documents WHERE id = %s"
+    def delete_document(self, document_id, on_unreferenced_file=None):
+        """
+        Deletes a document and its history. on_unreferenced_file(file_path) is
+        called before the commit when no other document uses its stored file.
+        """
         try:
-            self.execute_query(query, (document_id,))
+            company_id = self._company_of('documents', document_id)
+            with self.transaction() as cursor:
+                cursor.execute("SELECT file_path FROM documents WHERE id = %s FOR UPDATE", (document_id,))
+                document = cursor.fetchone()
+                # document_history is partitioned and has no foreign key to cascade. Events
+                # still buffered by a history writer are skipped once the document is gone
+                cursor.execute("DELETE FROM document_history WHERE document_id = %s", (document_id,))
+                cursor.execute("DELETE FROM documents WHERE id = %s", (document_id,))
+                if on_unreferenced_file and document and document['file_path']:
+                    # Locks the file_path index range: an upload of the same content waits
+                    # on its INSERT until the file is gone, and then stores it again
+                    cursor.execute(
+                        "SELECT COUNT(*) AS count FROM documents WHERE file_path = %s FOR UPDATE",
+                        (document['file_path'],)
+                    )
+                    if not cursor.fetchone()['count']:
+                        on_unreferenced_file(document['file_path'])
+            if company_id:
+                self.bump_versions(f"documents:{company_id}")
             return True
         except:
             return False
 
     # Document history methods
     def add_document_history(self, document_id, user_id, action):
+        if history_writer.enabled:
+            # Written in batches by the write-behind buffer, off the request path
+            history_writer.add(document_id, user_id, action)
+            return None
         query = "INSERT INTO document_history (document_id, user_id, action) VALUES (%s, %s, %s)"
         return self.execute_query(query, (document_id, user_id, action))
 
     def get_document_history(self, document_id):
-        query = """
+        return self.get_document_history_page(document_id)[0]
+
+    def get_document_history_page(self, document_id, limit=None, cursor=None):
+        """Keyset-paginated timeline of a document, newest first.
+
+        `cursor` is the (timestamp, id) of the last event of the previous page.
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        """
+        # Events buffered by this process show up immediately; other workers' within flush_interval
+        history_writer.flush()
+        query, params = self.history_page_query(document_id, limit, cursor)
+        rows = self.execute_query(query, params, fetch=True)
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]['timestamp'], rows[-1]['id'])
+        return rows, next_cursor
+
+    @staticmethod
+    def history_page_query(document_id, limit=None, cursor=None, table='document_history'):
+        """SQL of get_document_history_page as (query, params); the retention benchmark runs it on its own table."""
+        conditions = ["dh.document_id = %s"]
+        params = [document_id]
+        if cursor:
+            timestamp, last_id = cursor
+            conditions.append("(dh.timestamp < %s OR (dh.timestamp = %s AND dh.id < %s))")
+            params.extend([timestamp, timestamp, last_id])
+
+        query = f"""
             SELECT dh.*, u.username
-            FROM document_history dh
+            FROM {table} dh
             LEFT JOIN users u ON dh.user_id = u.id
-            WHERE dh.document_id = %s
-            ORDER BY dh.timestamp DESC
+            WHERE {' AND '.join(conditions)}
+            ORDER BY dh.timestamp DESC, dh.id DESC
+        """
+        if limit is not None:
+            # Fetch one extra row to know whether another page exists
+            query += " LIMIT %s"
+            params.append(limit + 1)
+        return query, params
+
+    def get_document_history_summary(self, document_id):
+        """Per-month action counts of events compacted out of document_history, newest month first."""
+        query = """
+            SELECT month, action, event_count, first_at, last_at
+            FROM document_history_summary
+            WHERE document_id = %s
+            ORDER BY month DESC, action
         """
         return self.execute_query(query, (document_id,), fetch=True)
 
+    # Invoice field methods
+    def save_invoice_fields(self, document_id, company_id, fields):
+        """Stores the fields extracted from an invoice, replacing any earlier extraction."""
+        query = """
+            INSERT INTO invoice_fields (document_id, company_id, invoice_number, invoice_date, currency,
+                                        net_amount, vat_amount, total_amount, supplier)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                invoice_number = VALUES(invoice_number), invoice_date = VALUES(invoice_date),
+                currency = VALUES(currency), net_amount = VALUES(net_amount),
+                vat_amount = VALUES(vat_amount), total_amount = VALUES(total_amount),
+                supplier = VALUES(supplier)
+        """
+        return self.execute_query(query, (
+            document_id, company_id, fields.get('invoice_number'), fields.get('invoice_date'),
+            fields.get('currency'), fields.get('net_amount'), fields.get('vat_amount'),
+            fields.get('total_amount'), fields.get('supplier')
+        ))
+
+    def delete_invoice_fields(self, document_id):
+        return self.execute_query("DELETE FROM invoice_fields WHERE document_id = %s", (document_id,))
+
+    def _invoice_conditions(self, company_id, date_from=None, date_to=None, min_total=None,
+                            max_total=None, supplier=None, currency=None):
+        conditions = ["i.company_id = %s"]
+        params = [company_id]
+        for condition, value in (
+            ("i.invoice_date >= %s", date_from),
+            ("i.invoice_date <= %s", date_to),
+            ("i.total_amount >= %s", min_total),
+            ("i.total_amount <= %s", max_total),
+            ("i.currency = %s", currency),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        if supplier:
+            conditions.append("i.supplier LIKE %s")
+            params.append(supplier.replace('%', r'\%').replace('_', r'\_') + '%')
+        return conditions, params
+
+    def get_invoices(self, company_id, limit=50, cursor=None, **filters):
+        """Keyset-paginated invoices, newest invoice date first; undated invoices come last.
+
+        `cursor` is the (invoice_date, document_id) of the last row of the previous page.
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        """
+        conditions, params = self._invoice_conditions(company_id, **filters)
+        if cursor:
+            invoice_date, last_id = cursor
+            if invoice_date is None:
+                conditions.append("(i.invoice_date IS NULL AND i.document_id < %s)")
+                params.append(last_id)
+            else:
+                conditions.append(
+                    "(i.invoice_date < %s OR (i.invoice_date = %s AND i.document_id < %s) OR i.invoice_date IS NULL)"
+                )
+                params.extend([invoice_date, invoice_date, last_id])
+
+        query = f"""
+            SELECT i.*, d.filename, d.folder_id
+            FROM invoice_fields i
+            JOIN documents d ON d.id = i.document_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY i.invoice_date DESC, i.document_id DESC
+            LIMIT %s
+        """
+        params.append(limit + 1)
+        rows = self.execute_query(query, params, fetch=True)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]['invoice_date'], rows[-1]['document_id'])
+        return rows, next_cursor
+
+    def get_invoice_totals(self, company_id, group_by='month', **filters):
+        """Invoice counts and amount sums per month or supplier, kept apart per currency."""
+        group_expression = {
+            'month': "DATE_FORMAT(i.invoice_date, '%%Y-%%m')",
+            'supplier': "i.supplier",
+            'currency': "i.currency",
+        }[group_by]
+        conditions, params = self._invoice_conditions(company_id, **filters)
+        query = f"""
+            SELECT {group_expression} AS group_key, i.currency,
+                   COUNT(*) AS invoice_count,
+                   SUM(i.net_amount) AS net_amount,
+                   SUM(i.vat_amount) AS vat_amount,
+                   SUM(i.total_amount) AS total_amount
+            FROM invoice_fields i
+            WHERE {' AND '.join(conditions)}
+            GROUP BY group_key, i.currency
+            ORDER BY group_key, i.currency
+        """
+        return self.execute_query(query, params, fetch=True)
+
     # Folder management methods
     def create_folder(self, name, created_by, company_id, parent_id=None):
         query = """
             INSERT INTO folders (name, parent_id, company_id, created_by)
             VALUES (%s, %s, %s, %s)
         """
-        return self.execute_query(query, (name, parent_id, company_id, created_by))
+        folder_id = self.execute_query(query, (name, parent_id, company_id, created_by))
+        self.bump_versions(f"folders:{company_id}")
+        return folder_id
 
     def get_folders_by_company(self, company_id, parent_id=None):
+        return self.execute_query(*self.folders_query(company_id, parent_id), fetch=True)
+
+    @staticmethod
+    def folders_query(company_id, parent_id=None):
+        """SQL of get_folders_by_company as (query, params); shared with the async database layer."""
         if parent_id is None:
             query = """
                 SELECT f.*, u.username as created_by_name
@@ -375,7 +959,7 @@ class DatabaseManager:
                 WHERE f.company_id = %s AND f.parent_id IS NULL
                 ORDER BY f.name
             """
-            return self.execute_query(query, (company_id,), fetch=True)
+            return query, (company_id,)
         else:
             query = """
                 SELECT f.*, u.username as created_by_name
@@ -384,7 +968,7 @@ class DatabaseManager:
                 WHERE f.company_id = %s AND f.parent_id = %s
                 ORDER BY f.name
             """
-            return self.execute_query(query, (company_id, parent_id), fetch=True)
+            return query, (company_id, parent_id)
 
     def get_folder_by_id(self, folder_id):
         query = """
@@ -415,6 +999,8 @@ class DatabaseManager:
         
         try:
             self.execute_query(query, params)
+            # Document listings carry the folder name
+            self._bump_company_versions('folders', folder_id, 'folders', 'documents')
             return True
         except:
             return False
@@ -422,26 +1008,72 @@ class DatabaseManager:
     def delete_folder(self, folder_id):
         query = "DELETE FROM folders WHERE id = %s"
         try:
+            company_id = self._company_of('folders', folder_id)
             self.execute_query(query, (folder_id,))
+            if company_id:
+                # Deleting a folder moves its documents out of it
+                self.bump_versions(f"folders:{company_id}", f"documents:{company_id}")
             return True
         except:
             return False
 
+    def get_folder_ancestors(self, folder_id):
+        """Get the folder and all its ancestors, root first, in a single query"""
+        query = """
+            WITH RECURSIVE ancestors (id, name, parent_id, company_id, depth) AS (
+                SELECT id, name, parent_id, company_id, 0 FROM folders WHERE id = %s
+                UNION ALL
+                SELECT f.id, f.name, f.parent_id, f.company_id, a.depth + 1
+                FROM folders f
+                JOIN ancestors a ON f.id = a.parent_id
+                WHERE a.depth < %s
+            )
+            SELECT id, name, parent_id, company_id FROM ancestors ORDER BY depth DESC
+        """
+        return self.execute_query(query, (folder_id, MAX_FOLDER_DEPTH), fetch=True)
+
     def get_folder_path(self, folder_id):
         """Get the full path of a folder"""
-        path = []
-        current_id = folder_id
-        
-        while current_id:
-            folder = self.get_folder_by_id(current_id)
-            if not folder:
-                break
-            path.insert(0, folder['name'])
-            current_id = folder['parent_id']
-        
+        path = [folder['name'] for folder in self.get_folder_ancestors(folder_id)]
         return ' / '.join(path) if path else ''
 
-# Create global database instance
-db = DatabaseManager()
-db.init_database()
+    def get_folder_subtree(self, folder_id):
+        """Get a folder and all its descendants with per-folder document counts"""
+        query = """
+            WITH RECURSIVE subtree (id, depth) AS (
+                SELECT id, 0 FROM folders WHERE id = %s
+                UNION ALL
+                SELECT f.id, s.depth + 1
+                FROM folders f
+                JOIN subtree s ON f.parent_id = s.id
+                WHERE s.depth < %s
+            )
+            SELECT f.id, f.name, f.parent_id, f.company_id, f.created_by, f.created_at,
+                   s.depth, COUNT(d.id) AS document_count
+            FROM subtree s
+            JOIN folders f ON f.id = s.id
+            LEFT JOIN documents d ON d.folder_id = f.id
+            GROUP BY f.id, s.depth
+            ORDER BY s.depth, f.name
+        """
+        return self.execute_query(query, (folder_id, MAX_FOLDER_DEPTH), fetch=True)
 
+    def get_company_folders_with_counts(self, company_id):
+        """Get every folder of a company with its document count in a single query"""
+        query = """
+            SELECT f.id, f.name, f.parent_id, f.company_id, f.created_by, f.created_at,
+                   COALESCE(dc.document_count, 0) AS document_count
+            FROM folders f
+            LEFT JOIN (
+                SELECT folder_id, COUNT(*) AS document_count
+                FROM documents
+                WHERE company_id = %s AND folder_id IS NOT NULL
+                GROUP BY folder_id
+            ) dc ON dc.folder_id = f.id
+            WHERE f.company_id = %s
+            ORDER BY f.name
+        """
+        return self.execute_query(query, (company_id, company_id), fetch=True)
+
+# Create global database instance; the schema is set up by migrations.py
+db = DatabaseManager()
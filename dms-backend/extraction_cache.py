@@ -0,0 +1,147 @@
+# backend/extraction_cache.py
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+CACHE_CONFIG = {
+    'enabled': os.environ.get('DMS_EXTRACTION_CACHE', '1') != '0',
+    'directory': os.environ.get(
+        'DMS_EXTRACTION_CACHE_DIR',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'extraction')
+    ),
+    # Least recently used entries are evicted once the store grows past this
+    'max_bytes': int(os.environ.get('DMS_EXTRACTION_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_digest(file_storage):
+    """
+    SHA-256 of the file content. Accepts an uploaded file (via Flask), an open
+    binary stream or a path; streams are rewound to where they were.
+    """
+    digest = hashlib.sha256()
+    if isinstance(file_storage, (str, os.PathLike)):
+        with open(file_storage, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    stream = getattr(file_storage, 'stream', file_storage)
+    position = stream.tell()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(position)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """
+    Content-addressed on-disk store of extraction results. Entries are keyed by
+    the file digest plus the engine version that produced them, so upgrading the
+    model or OCR engine never serves stale results.
+    """
+
+    def __init__(self, directory, max_bytes, enabled=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._size = None
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+    def key(self, digest, engine_version):
+        return hashlib.sha256(f"{digest}:{engine_version}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            # The modification time doubles as the LRU clock
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self._stats['hits'] += 1
+        return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a concurrent reader never sees a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing extraction cache entry: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self._stats['writes'] += 1
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Other processes share the directory, so re-read it rather than trusting our counter
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        # Evict down to 90% of the budget so the next writes do not evict again
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+            self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            if self._size is None and self.enabled:
+                self._size = self._scan_size()
+            stats['bytes'] = self._size or 0
+        stats['max_bytes'] = self.max_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+extraction_cache = ExtractionCache(**CACHE_CONFIG)
@@ -0,0 +1,34 @@
+# backend/gunicorn.conf.py
+#
+#     gunicorn -c gunicorn.conf.py app:app
+#
+# With DMS_PRELOAD_MODEL=1 the app and the summarization model are loaded once
+# in the master process and shared copy-on-write by all workers.
+
+import os
+
+bind = os.environ.get('DMS_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('DMS_THREADS', 4))
+timeout = int(os.environ.get('DMS_TIMEOUT', 120))
+
+preload_app = os.environ.get('DMS_PRELOAD_MODEL') == '1'
+
+def on_starting(server):
+    # Extraction jobs of the previous workers died with them; no worker is running yet
+    from db import db
+    interrupted = db.fail_interrupted_extractions()
+    if interrupted:
+        server.log.warning("Marked %d interrupted extractions as failed", interrupted)
+    db.disconnect()
+
+    if preload_app:
+        import pdf_parser
+        pdf_parser.preload_for_fork()
+
+def post_fork(server, worker):
+    from pdf_parser import SUMMARIZER_CONFIG
+    if preload_app and SUMMARIZER_CONFIG['model'] != 'stub':
+        # Split the cores between workers instead of every worker using all of them
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
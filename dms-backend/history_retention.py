@@ -0,0 +1,218 @@
+# backend/history_retention.py
+#
+# Monthly RANGE partitions of document_history (created by migration 10) and
+# the retention job that keeps them in shape. Run it daily or monthly:
+#
+#     python history_retention.py maintain [--retention-months 12] [--dry-run]
+#
+# It adds partitions for the coming months, rolls every month older than the
+# retention window into document_history_summary (one row per document, month
+# and action), and then drops that month's partition. Dropping a partition is
+# a metadata operation, unlike DELETEing millions of rows.
+#
+#     python history_retention.py benchmark --rows 100000000
+#
+# fills a scratch copy of the table with synthetic events and reports the
+# insert rate and the latency of per-document timeline pages.
+
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+
+HISTORY_RETENTION_CONFIG = {
+    'retention_months': int(os.environ.get('DMS_HISTORY_RETENTION_MONTHS', 12)),
+    # Partitions are created this far ahead so inserts never land in pmax
+    'months_ahead': int(os.environ.get('DMS_HISTORY_MONTHS_AHEAD', 3)),
+}
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+def partition_month(name):
+    """The month a pYYYYMM partition holds; None for pmax."""
+    try:
+        return datetime.strptime(name, 'p%Y%m').date()
+    except ValueError:
+        return None
+
+def partition_definitions(first_month, last_month):
+    definitions = []
+    month = first_month
+    while month <= last_month:
+        definitions.append(
+            f"PARTITION {partition_name(month)} VALUES LESS THAN "
+            f"(UNIX_TIMESTAMP('{add_months(month, 1):%Y-%m-%d} 00:00:00'))"
+        )
+        month = add_months(month, 1)
+    return definitions
+
+def list_partitions(cursor, table):
+    cursor.execute("""
+        SELECT partition_name FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+def partition_by_month(cursor, table, months_ahead, first_month=None):
+    """
+    (Re)partitions a table by month from first_month, by default the month of
+    its oldest row, to months_ahead from now.
+    """
+    this_month = month_start(date.today())
+    if first_month is None:
+        cursor.execute(f"SELECT MIN(timestamp) FROM {table}")
+        oldest = cursor.fetchone()[0]
+        first_month = month_start(oldest) if oldest else this_month
+    definitions = partition_definitions(first_month, add_months(this_month, months_ahead))
+    definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    cursor.execute(f"""
+        ALTER TABLE {table}
+        PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) ({', '.join(definitions)})
+    """)
+
+def ensure_future_partitions(cursor, table, months_ahead, dry_run=False):
+    """Splits the months up to months_ahead from now out of pmax. Returns the new partition names."""
+    months = [partition_month(name) for name in list_partitions(cursor, table)]
+    months = [month for month in months if month]
+    last_month = add_months(month_start(date.today()), months_ahead)
+    if not months or months[-1] >= last_month:
+        return []
+
+    first_new = add_months(months[-1], 1)
+    definitions = partition_definitions(first_new, last_month)
+    if not dry_run:
+        cursor.execute(f"""
+            ALTER TABLE {table} REORGANIZE PARTITION pmax INTO
+            ({', '.join(definitions + ['PARTITION pmax VALUES LESS THAN MAXVALUE'])})
+        """)
+    return [definition.split()[1] for definition in definitions]
+
+def compact_partitions(cursor, table, retention_months, dry_run=False):
+    """
+    Rolls each month older than the retention window into document_history_summary
+    and drops its partition. Safe to re-run after a failure: summaries are replaced,
+    not added to. Returns the compacted partition names.
+    """
+    cutoff = add_months(month_start(date.today()), -retention_months)
+    compacted = []
+    for name in list_partitions(cursor, table):
+        month = partition_month(name)
+        if month is None or month >= cutoff:
+            continue
+        compacted.append(name)
+        if dry_run:
+            continue
+        cursor.execute(f"""
+            INSERT INTO document_history_summary (document_id, month, action, event_count, first_at, last_at)
+            SELECT dh.document_id, %s, dh.action, COUNT(*), MIN(dh.timestamp), MAX(dh.timestamp)
+            FROM {table} PARTITION ({name}) dh
+            -- Events of documents deleted with their company are dropped here
+            JOIN documents d ON d.id = dh.document_id
+            GROUP BY dh.document_id, dh.action
+            ON DUPLICATE KEY UPDATE
+                event_count = VALUES(event_count), first_at = VALUES(first_at), last_at = VALUES(last_at)
+        """, (month,))
+        # DDL commits implicitly, so the summaries are durable before the rows go
+        cursor.execute(f"ALTER TABLE {table} DROP PARTITION {name}")
+    return compacted
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def benchmark(connection, rows, documents, months, batch_size, timelines, keep):
+    from db import DatabaseManager
+
+    cursor = connection.cursor()
+    table = 'document_history_bench'
+    rng = random.Random(42)
+    now = datetime.now().replace(microsecond=0)
+    span = int(timedelta(days=30 * months).total_seconds())
+
+    # LIKE copies the indexes of the real table. Its partitions start at the
+    # oldest real row, so the bench table gets one per month of the synthetic span
+    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(f"CREATE TABLE {table} LIKE document_history")
+    partition_by_month(cursor, table, HISTORY_RETENTION_CONFIG['months_ahead'],
+                       first_month=month_start(now - timedelta(seconds=span)))
+    print(f"{len(list_partitions(cursor, table))} partitions")
+    actions = ['Document created', 'Document uploaded', 'Document updated', 'Document viewed', 'Document moved']
+    query = f"INSERT INTO {table} (document_id, user_id, action, timestamp) VALUES (%s, %s, %s, %s)"
+
+    start = time.perf_counter()
+    inserted = 0
+    while inserted < rows:
+        batch = [
+            (rng.randint(1, documents), rng.randint(1, 1000), rng.choice(actions),
+             now - timedelta(seconds=rng.randint(0, span)))
+            for _ in range(min(batch_size, rows - inserted))
+        ]
+        cursor.executemany(query, batch)
+        connection.commit()
+        inserted += len(batch)
+        if inserted % (batch_size * 100) == 0 or inserted == rows:
+            print(f"{inserted:,} rows, {inserted / (time.perf_counter() - start):,.0f} rows/s")
+
+    dict_cursor = connection.cursor(dictionary=True)
+    latencies = []
+    for _ in range(timelines):
+        history_query, params = DatabaseManager.history_page_query(rng.randint(1, documents), 50, table=table)
+        call_start = time.perf_counter()
+        dict_cursor.execute(history_query, params)
+        dict_cursor.fetchall()
+        latencies.append(time.perf_counter() - call_start)
+    print(f"Timeline page of 50 over {timelines} documents: p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+
+    if not keep:
+        cursor.execute(f"DROP TABLE {table}")
+
+def main():
+    from db import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description='document_history partition maintenance')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    maintain = commands.add_parser('maintain', help='add future partitions, compact and drop old ones')
+    maintain.add_argument('--retention-months', type=int, default=HISTORY_RETENTION_CONFIG['retention_months'])
+    maintain.add_argument('--months-ahead', type=int, default=HISTORY_RETENTION_CONFIG['months_ahead'])
+    maintain.add_argument('--dry-run', action='store_true')
+
+    bench = commands.add_parser('benchmark', help='insert rate and timeline latency on synthetic rows')
+    bench.add_argument('--rows', type=int, default=100_000_000)
+    bench.add_argument('--documents', type=int, default=1_000_000)
+    bench.add_argument('--months', type=int, default=24)
+    bench.add_argument('--batch-size', type=int, default=10000)
+    bench.add_argument('--timelines', type=int, default=1000)
+    bench.add_argument('--keep', action='store_true', help='keep document_history_bench afterwards')
+
+    args = parser.parse_args()
+    connection = mysql.connector.connect(**DB_CONFIG)
+    try:
+        if args.command == 'maintain':
+            cursor = connection.cursor()
+            added = ensure_future_partitions(cursor, 'document_history', args.months_ahead, args.dry_run)
+            compacted = compact_partitions(cursor, 'document_history', args.retention_months, args.dry_run)
+            connection.commit()
+            verb = 'Would' if args.dry_run else 'Did'
+            print(f"{verb} add partitions: {', '.join(added) or 'none'}")
+            print(f"{verb} compact and drop partitions: {', '.join(compacted) or 'none'}")
+        else:
+            benchmark(connection, args.rows, args.documents, args.months, args.batch_size, args.timelines, args.keep)
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+# backend/history_writer.py
+#
+# Write-behind buffer for document_history. Events are appended to a local
+# spill file and kept in memory; a background thread writes them with
+# multi-row INSERTs once max_batch events are waiting or every flush_interval
+# seconds, and again at exit. Spill files left behind by a crashed process
+# are replayed by the next process that starts a writer, so delivery is
+# at-least-once: an event inserted just before a crash may be written twice.
+#
+# Spill files that fail max_attempts flushes with something other than an
+# unreachable database, or that pile up past max_sealed while it stays
+# unreachable, are moved to dead-letter/ in the spill directory. Once the
+# cause is fixed they are written with --replay-dead-letter.
+#
+# Benchmark against direct INSERTs (needs the configured database):
+#
+#     python history_writer.py --events 20000
+
+import argparse
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from mysql.connector import DataError, IntegrityError, InterfaceError, OperationalError
+from mysql.connector.errors import PoolError
+
+HISTORY_CONFIG = {
+    'enabled': os.environ.get('DMS_HISTORY_WRITE_BEHIND', '1') == '1',
+    'max_batch': int(os.environ.get('DMS_HISTORY_MAX_BATCH', 500)),
+    'flush_interval': float(os.environ.get('DMS_HISTORY_FLUSH_INTERVAL', 1.0)),
+    'spill_directory': os.environ.get(
+        'DMS_HISTORY_SPILL_DIR',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'history')
+    ),
+    # fsync every event: survives power loss, not just a crashed process, at ~1 ms per event
+    'fsync': os.environ.get('DMS_HISTORY_FSYNC') == '1',
+    # Failed flushes of a spill file before it is dead-lettered
+    'max_attempts': int(os.environ.get('DMS_HISTORY_MAX_ATTEMPTS', 5)),
+    # Spill files kept waiting in memory while the database is unreachable
+    'max_sealed': int(os.environ.get('DMS_HISTORY_MAX_SEALED', 200)),
+}
+
+# The database could not be reached: the rows themselves may be fine, so these
+# do not count as attempts
+UNREACHABLE_ERRORS = (InterfaceError, OperationalError, PoolError)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# Events per INSERT; a flush after an outage can carry many spill files
+INSERT_CHUNK_ROWS = 500
+
+def history_insert_query(count):
+    """
+    INSERT of `count` events that keeps only those whose document still
+    exists. document_history is partitioned and has no foreign key, so
+    nothing else keeps an event buffered before its document was deleted
+    from becoming an orphan row.
+    """
+    events = ' UNION ALL '.join(
+        ['SELECT %s AS document_id, %s AS user_id, %s AS action, %s AS unix_time'] + ['SELECT %s, %s, %s, %s'] * (count - 1)
+    )
+    return f"""
+        INSERT INTO document_history (document_id, user_id, action, timestamp)
+        SELECT e.document_id, e.user_id, e.action, FROM_UNIXTIME(e.unix_time)
+        FROM ({events}) e
+        JOIN documents d ON d.id = e.document_id
+    """
+
+def insert_history_rows(events):
+    """
+    Writes events with multi-row INSERTs in one transaction. Events of
+    documents deleted before the flush are skipped. If a batch fails on a bad
+    row (e.g. an action too long for the column), rows are retried one at a
+    time and rows that can never be written are dropped.
+    Timestamps are Unix times, so they mean the same instant whatever the
+    time zone of the worker or of the database session.
+    """
+    from db import db
+
+    rows = [(event['document_id'], event['user_id'], event['action'], event['timestamp']) for event in events]
+    try:
+        with db.transaction() as cursor:
+            written = 0
+            for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+                chunk = rows[start:start + INSERT_CHUNK_ROWS]
+                cursor.execute(history_insert_query(len(chunk)), [value for row in chunk for value in row])
+                written += cursor.rowcount
+        if written < len(rows):
+            print(f"Skipped {len(rows) - written} history events of deleted documents")
+    except (IntegrityError, DataError):
+        for row in rows:
+            try:
+                db.execute_query(history_insert_query(1), row)
+            except (IntegrityError, DataError) as e:
+                print(f"Dropping history event for document {row[0]}: {e}")
+
+def read_segment(path):
+    """The events of a spill file."""
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # Torn last line of a crash
+                continue
+            if isinstance(event['timestamp'], str):
+                # Written before timestamps were Unix times: local time of the worker
+                event['timestamp'] = int(datetime.strptime(event['timestamp'], '%Y-%m-%d %H:%M:%S').timestamp())
+            events.append(event)
+    return events
+
+class HistoryWriter:
+    def __init__(self, enabled, max_batch, flush_interval, spill_directory, fsync, max_attempts, max_sealed,
+                 insert=insert_history_rows):
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.spill_directory = spill_directory
+        self.dead_letter_directory = os.path.join(spill_directory, 'dead-letter')
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+        self.max_sealed = max_sealed
+        self.insert = insert
+        self._events = []
+        # Segments closed by a flush whose INSERT has not succeeded yet:
+        # [{'path', 'events', 'attempts'}], oldest first
+        self._sealed = []
+        self._segment = None
+        self._segment_path = None
+        self._sequence = 0
+        self._pid = None
+        # Set on every start, so segment names never repeat even when a pid is reused
+        self._start_id = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._stats = {'events': 0, 'flushes': 0, 'rows_written': 0, 'failed_flushes': 0, 'recovered': 0,
+                       'dead_lettered': 0}
+
+    def _segment_name(self):
+        self._sequence += 1
+        return os.path.join(self.spill_directory, f"{os.getpid()}-{self._start_id}-{self._sequence}.log")
+
+    def _open_segment(self):
+        self._segment_path = self._segment_name()
+        self._segment = open(self._segment_path, 'a', encoding='utf-8')
+
+    def _start(self):
+        # Checked on every add so each forked worker gets its own spill file and thread
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.spill_directory, exist_ok=True)
+            self._events, self._sealed, self._sequence = [], [], 0
+            self._start_id = uuid.uuid4().hex[:12]
+            self._open_segment()
+            self._recover()
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="history-writer", daemon=True).start()
+
+    def _recover(self):
+        """
+        Claims the spill files of processes that are gone; their events go out
+        with the next flush. A file with this process's pid but another start
+        id was left by an earlier process that had the same pid.
+        """
+        for path in glob.glob(os.path.join(self.spill_directory, '*.log')):
+            # {pid}-{start id}-{sequence}.log, or {pid}-{sequence}.log from before start ids
+            parts = os.path.basename(path)[:-len('.log')].split('-')
+            try:
+                pid = int(parts[0])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                if len(parts) == 3 and parts[1] == self._start_id:
+                    continue
+            elif _pid_alive(pid):
+                continue
+            claimed = self._segment_name()
+            try:
+                # Atomic: only one worker wins each orphaned file
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            events = read_segment(claimed)
+            self._sealed.append({'path': claimed, 'events': events, 'attempts': 0})
+            self._stats['recovered'] += len(events)
+
+    def add(self, document_id, user_id, action):
+        self._start()
+        event = {
+            'document_id': document_id,
+            'user_id': user_id,
+            'action': action,
+            'timestamp': int(time.time())
+        }
+        with self._lock:
+            self._segment.write(json.dumps(event) + '\n')
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+            self._events.append(event)
+            self._stats['events'] += 1
+            full = len(self._events) >= self.max_batch
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Writes every buffered event now. Returns the number of rows written."""
+        if self._pid != os.getpid():
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                if self._events:
+                    self._segment.close()
+                    self._sealed.append({'path': self._segment_path, 'events': self._events, 'attempts': 0})
+                    self._events = []
+                    self._open_segment()
+                sealed = list(self._sealed)
+            if not sealed:
+                return 0
+
+            written = []
+            try:
+                self.insert([event for segment in sealed for event in segment['events']])
+                written = sealed
+            except UNREACHABLE_ERRORS as e:
+                # Kept in memory and on disk; the next flush retries them
+                self._stats['failed_flushes'] += 1
+                print(f"Error flushing document history: {e}")
+            except Exception as e:
+                self._stats['failed_flushes'] += 1
+                print(f"Error flushing document history: {e}")
+                # One at a time, so a segment that cannot be written does not hold back the others
+                for segment in sealed:
+                    try:
+                        self.insert(segment['events'])
+                    except UNREACHABLE_ERRORS:
+                        break
+                    except Exception:
+                        segment['attempts'] += 1
+                    else:
+                        written.append(segment)
+
+            done = {segment['path'] for segment in written}
+            with self._lock:
+                waiting = [segment for segment in self._sealed if segment['path'] not in done]
+                # Past the cap the oldest go, even if they only waited for the database
+                over = max(0, len(waiting) - self.max_sealed)
+                failed = [segment for segment in waiting[over:] if segment['attempts'] >= self.max_attempts]
+                dead = waiting[:over] + failed
+                self._sealed = [segment for segment in waiting[over:] if segment['attempts'] < self.max_attempts]
+            for segment in written:
+                os.remove(segment['path'])
+            for segment in dead:
+                self._dead_letter(segment)
+
+            rows = sum(len(segment['events']) for segment in written)
+            if written:
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += rows
+            return rows
+
+    def _dead_letter(self, segment):
+        os.makedirs(self.dead_letter_directory, exist_ok=True)
+        os.replace(segment['path'], os.path.join(self.dead_letter_directory, os.path.basename(segment['path'])))
+        self._stats['dead_lettered'] += len(segment['events'])
+        print(f"Moved {len(segment['events'])} history events to {self.dead_letter_directory} "
+              f"after {segment['attempts']} failed flushes ({len(self._sealed)} spill files waiting)")
+
+    def replay_dead_letter(self):
+        """Writes the dead-lettered events; files that still fail stay. Returns the number of rows written."""
+        rows = 0
+        for path in sorted(glob.glob(os.path.join(self.dead_letter_directory, '*.log'))):
+            events = read_segment(path)
+            try:
+                self.insert(events)
+            except Exception as e:
+                print(f"Could not replay {path}: {e}")
+                continue
+            os.remove(path)
+            rows += len(events)
+        return rows
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error in history writer: {e}")
+
+    def close(self):
+        """Final flush at shutdown; whatever cannot be written stays in the spill file."""
+        self._stopped = True
+        self._wakeup.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['buffered'] = len(self._events) + sum(len(segment['events']) for segment in self._sealed)
+        return stats
+
+history_writer = HistoryWriter(**HISTORY_CONFIG)
+atexit.register(history_writer.close)
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def main():
+    from db import db
+
+    parser = argparse.ArgumentParser(description='Document history write throughput, direct vs write-behind')
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--document-id', type=int, help='existing document to log against (default: the newest)')
+    parser.add_argument('--replay-dead-letter', action='store_true',
+                        help='write the dead-lettered events instead of benchmarking')
+    args = parser.parse_args()
+
+    if args.replay_dead_letter:
+        print(f"Replayed {history_writer.replay_dead_letter()} history events")
+        return
+
+    document_id = args.document_id
+    if document_id is None:
+        newest = db.execute_query("SELECT id, owner_id FROM documents ORDER BY id DESC LIMIT 1", fetch=True)
+        if not newest:
+            raise SystemExit("Create a document first")
+        document_id, user_id = newest[0]['id'], newest[0]['owner_id']
+    else:
+        user_id = db.get_document_by_id(document_id)['owner_id']
+
+    query = "INSERT INTO document_history (document_id, user_id, action) VALUES (%s, %s, %s)"
+    for mode in ('direct', 'write-behind'):
+        latencies = []
+        start = time.perf_counter()
+        for i in range(args.events):
+            call_start = time.perf_counter()
+            if mode == 'direct':
+                db.execute_query(query, (document_id, user_id, f"benchmark event {i}"))
+            else:
+                history_writer.add(document_id, user_id, f"benchmark event {i}")
+            latencies.append(time.perf_counter() - call_start)
+        if mode == 'write-behind':
+            history_writer.flush()
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>12}: {args.events / elapsed:,.0f} inserts/s, per call p50 "
+              f"{percentile(latencies, 0.5) * 1000:.3f} ms, p99 {percentile(latencies, 0.99) * 1000:.3f} ms")
+
+    db.execute_query("DELETE FROM document_history WHERE document_id = %s AND action LIKE 'benchmark event %%'",
+                     (document_id,))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# backend/http_cache.py
+
+import hashlib
+import json
+import os
+from functools import wraps
+
+from flask import Response, make_response, request
+from flask_jwt_extended import get_jwt
+
+from cache import MISSING, TTLCache
+from db import db
+
+HTTP_CACHE_CONFIG = {
+    # Keep whole list responses in process, keyed by route, parameters and versions
+    'response_cache': os.environ.get('DMS_RESPONSE_CACHE') == '1',
+    'max_entries': int(os.environ.get('DMS_RESPONSE_CACHE_ENTRIES', 1000)),
+    'ttl': float(os.environ.get('DMS_RESPONSE_CACHE_TTL', 300)),
+}
+
+# The versions are part of every key, so entries are never invalidated; they just age out
+response_cache = TTLCache('responses', HTTP_CACHE_CONFIG['max_entries'], HTTP_CACHE_CONFIG['ttl'])
+
+def cache_key(path, args, versions, user_id=None):
+    """Response cache key and ETag for a request; `args` are (name, value) pairs."""
+    key_parts = [path, sorted(args), sorted(versions.items())]
+    if user_id is not None:
+        key_parts.append(user_id)
+    key = json.dumps(key_parts, default=str)
+    return key, hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def conditional_get(scopes, vary_user=False):
+    """
+    Serves a GET list endpoint behind an ETag derived from version stamps
+    (see DatabaseManager.bump_versions).
+
+    `scopes()` runs first and returns the list of version scopes the response
+    depends on, a response to send instead (access denied), or None to skip
+    caching and let the view report the bad request. A matching If-None-Match
+    is answered 304 after one version lookup; otherwise the response cache is
+    tried before the view runs. `vary_user` adds the caller to the key for
+    responses that differ per user.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            result = scopes()
+            if result is None:
+                return view(*args, **kwargs)
+            if not isinstance(result, list):
+                return result
+
+            key, etag = cache_key(
+                request.path, request.args.items(multi=True), db.get_versions(result),
+                get_jwt().get('id') if vary_user else None
+            )
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                cached = response_cache.get(key) if HTTP_CACHE_CONFIG['response_cache'] else MISSING
+                if cached is not MISSING:
+                    body, mimetype = cached
+                    response = Response(body, status=200, mimetype=mimetype)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    if HTTP_CACHE_CONFIG['response_cache']:
+                        response_cache.set(key, (response.get_data(), response.mimetype))
+
+            response.set_etag(etag)
+            # Clients may keep the body but must revalidate it on every poll
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,414 @@
+# backend/invoice_extractor.py
+#
+# Pulls invoice number, date, amounts, currency and supplier out of extracted
+# text. All patterns are compiled once at import. For PDFs, word coordinates
+# from pdfplumber add layout cues: values printed below their label, and the
+# supplier name as the largest text at the top of the first page.
+#
+# Throughput over synthetic invoices, from text alone and with laid-out words:
+#
+#     python invoice_extractor.py --count 5000
+
+import argparse
+import random
+import re
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+# Part of the extraction cache key: bump whenever the extracted fields may change
+EXTRACTOR_VERSION = 'invoice-fields-1'
+
+INVOICE_CONFIG = {
+    # 03/04/2025 is read as 3 April unless the first number cannot be a day
+    'day_first': True,
+    # Words whose tops differ by less than this (points) are on the same line
+    'line_tolerance': 3.0,
+    # A value printed under its label is looked for this far below it (points)
+    'below_distance': 30.0,
+}
+
+# Unsigned, and never part of a hyphenated number such as a tax ID (12-3456789)
+AMOUNT = r'(?<![\d-])(?:\d{1,3}(?:[ ., \']\d{3})*(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?)(?![-\d])'
+AMOUNT_RE = re.compile(AMOUNT)
+
+MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ('jan', 'january'), ('feb', 'february'), ('mar', 'march'), ('apr', 'april'), ('may',),
+        ('jun', 'june'), ('jul', 'july'), ('aug', 'august'), ('sep', 'sept', 'september'),
+        ('oct', 'october'), ('nov', 'november'), ('dec', 'december')
+    ], start=1)
+    for name in names
+}
+MONTH_NAMES = '|'.join(sorted(MONTHS, key=len, reverse=True))
+
+DATE_PATTERNS = [
+    # 2025-03-14
+    (re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b'), 'ymd'),
+    # 14.03.2025, 14/03/2025, 03-14-2025
+    (re.compile(r'\b(\d{1,2})[./-](\d{1,2})[./-](\d{4})\b'), 'numeric'),
+    # 14 March 2025, 14 Mar. 2025
+    (re.compile(rf'\b(\d{{1,2}})\.?\s+({MONTH_NAMES})\.?,?\s+(\d{{4}})\b', re.IGNORECASE), 'dmy_name'),
+    # March 14, 2025
+    (re.compile(rf'\b({MONTH_NAMES})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}})\b', re.IGNORECASE), 'mdy_name'),
+]
+
+CURRENCY_SYMBOLS = {'€': 'EUR', '$': 'USD', '£': 'GBP', '¥': 'JPY'}
+CURRENCY_RE = re.compile(r'(€|\$|£|¥)|\b(EUR|USD|GBP|CHF|JPY|CAD|AUD|SEK|NOK|DKK|PLN|CZK)\b')
+
+INVOICE_NUMBER_RE = re.compile(
+    r'\b(?:invoice|inv|bill)\.?\s*(?:no\.?|number|num\.?|nr\.?|#|id)\s*[:#.]?\s*'
+    r'([A-Z0-9][A-Z0-9\-/.]{1,30}[A-Z0-9])',
+    re.IGNORECASE
+)
+# A bare "Date" counts, "Due date", "Delivery date" and the like do not
+INVOICE_DATE_LABEL_RE = re.compile(
+    r'\b(?:invoice\s+date|date\s+of\s+issue|issue\s+date|issued(?:\s+on)?'
+    r'|(?<!due\s)(?<!delivery\s)(?<!order\s)(?<!payment\s)(?<!service\s)date)\b\s*:?',
+    re.IGNORECASE
+)
+SUPPLIER_LABEL_RE = re.compile(r'^\s*(?:from|supplier|seller|vendor|issued\s+by|bill\s+from)\s*:\s*(.+)$',
+                               re.IGNORECASE)
+INVOICE_HEADING_RE = re.compile(r'^\s*(?:tax\s+|commercial\s+)?invoice\b', re.IGNORECASE)
+
+# Checked in this order on each line; the first label that matches decides the field,
+# so "Total excl. VAT" is a net amount and "Total incl. VAT" a total, never VAT
+AMOUNT_LABELS = [
+    ('net_amount', re.compile(
+        r'\b(?:sub-?\s?total|net\s+(?:amount|total)|total\s+(?:excl\.?|excluding|before)\s*(?:vat|tax)|amount\s+excl\.?\s*vat)\b',
+        re.IGNORECASE
+    )),
+    ('total_amount', re.compile(
+        r'\b(?:total\s+(?:amount\s+)?due|amount\s+due|balance\s+due|grand\s+total|invoice\s+total'
+        r'|total\s+(?:incl\.?|including)\s*(?:vat|tax)|gross(?:\s+(?:amount|total))?|total\s+amount)\b',
+        re.IGNORECASE
+    )),
+    ('vat_amount', re.compile(
+        r'\b(?:vat|tax|gst|sales\s+tax)\b(?:\s*\(?\s*\d{1,2}(?:[.,]\d+)?\s*%\s*\)?)?(?:\s+amount)?',
+        re.IGNORECASE
+    )),
+    # After VAT, so "VAT total" stays a VAT amount
+    ('total_amount', re.compile(r'\btotal\b', re.IGNORECASE)),
+]
+
+# "Tax ID", "VAT No.", "VAT Reg. Number": identifiers, not amounts
+IDENTIFIER_AFTER_LABEL_RE = re.compile(r'\s*(?:id|no|nr|number|num|reg)\b', re.IGNORECASE)
+
+FIELDS = ('invoice_number', 'invoice_date', 'currency', 'net_amount', 'vat_amount', 'total_amount', 'supplier')
+
+def parse_amount(raw):
+    """
+    '1.234,56', '1,234.56', "1'234.56" and '1 234,56' all become Decimal('1234.56').
+    A lone separator followed by one or two digits is the decimal separator.
+    """
+    value = raw.replace(' ', '').replace(' ', '').replace("'", '')
+    last_dot, last_comma = value.rfind('.'), value.rfind(',')
+    decimal_at = max(last_dot, last_comma)
+    if decimal_at != -1 and len(value) - decimal_at - 1 not in (1, 2):
+        # 1,234 or 1.234.567: separators are thousands only
+        decimal_at = -1
+    integer = value[:decimal_at] if decimal_at != -1 else value
+    fraction = value[decimal_at + 1:] if decimal_at != -1 else ''
+    integer = integer.replace('.', '').replace(',', '')
+    try:
+        return Decimal(f"{integer}.{fraction or '0'}").quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+def _valid_date(year, month, day):
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+def parse_date(text):
+    """First date found in the text, or None."""
+    for pattern, kind in DATE_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        a, b, c = match.groups()
+        if kind == 'ymd':
+            parsed = _valid_date(a, b, c)
+        elif kind == 'numeric':
+            day, month = (a, b) if INVOICE_CONFIG['day_first'] or int(b) > 12 else (b, a)
+            parsed = _valid_date(c, month, day) or _valid_date(c, day, month)
+        elif kind == 'dmy_name':
+            parsed = _valid_date(c, MONTHS[b.lower()], a)
+        else:
+            parsed = _valid_date(c, MONTHS[a.lower()], b)
+        if parsed:
+            return parsed
+    return None
+
+def last_amount(text):
+    amounts = [parse_amount(raw) for raw in AMOUNT_RE.findall(text)]
+    amounts = [amount for amount in amounts if amount is not None]
+    return amounts[-1] if amounts else None
+
+def classify_amount_line(line):
+    """Returns (field, text after the label) for a line carrying an amount label, else None."""
+    for field, pattern in AMOUNT_LABELS:
+        match = pattern.search(line)
+        if match:
+            if IDENTIFIER_AFTER_LABEL_RE.match(line, match.end()):
+                return None
+            return field, line[match.end():]
+    return None
+
+def fields_from_lines(lines):
+    """Regex pass over plain text lines."""
+    fields = {}
+    for line in lines:
+        if 'invoice_number' not in fields:
+            match = INVOICE_NUMBER_RE.search(line)
+            if match and any(ch.isdigit() for ch in match.group(1)):
+                fields['invoice_number'] = match.group(1)
+
+        if 'invoice_date' not in fields:
+            label = INVOICE_DATE_LABEL_RE.search(line)
+            if label:
+                parsed = parse_date(line[label.end():])
+                if parsed:
+                    fields['invoice_date'] = parsed
+
+        if 'supplier' not in fields:
+            match = SUPPLIER_LABEL_RE.match(line)
+            if match:
+                fields['supplier'] = match.group(1).strip()
+
+        if 'currency' not in fields:
+            match = CURRENCY_RE.search(line)
+            if match:
+                fields['currency'] = CURRENCY_SYMBOLS.get(match.group(1)) or match.group(2)
+
+        classified = classify_amount_line(line)
+        if classified:
+            field, rest = classified
+            amount = last_amount(rest)
+            if amount is not None:
+                # Later lines win: the totals block comes last on an invoice
+                fields[field] = amount
+
+    if 'invoice_date' not in fields:
+        # No labelled date: the first date in the document is usually the issue date
+        parsed = parse_date('\n'.join(lines[:40]))
+        if parsed:
+            fields['invoice_date'] = parsed
+    return fields
+
+def group_lines(words):
+    """Groups pdfplumber words into lines: lists of words sorted left to right."""
+    lines = []
+    for word in sorted(words, key=lambda w: (w.get('page', 1), w['top'], w['x0'])):
+        line = lines[-1] if lines else None
+        if (line and line[0].get('page', 1) == word.get('page', 1)
+                and abs(line[0]['top'] - word['top']) < INVOICE_CONFIG['line_tolerance']):
+            line.append(word)
+        else:
+            lines.append([word])
+    for line in lines:
+        line.sort(key=lambda w: w['x0'])
+    return lines
+
+def _line_text(line):
+    return ' '.join(word['text'] for word in line)
+
+def fields_from_layout(words):
+    """
+    Layout pass over word coordinates: amounts printed under their label
+    (column layouts) and the supplier as the largest text on the first page.
+    """
+    fields = {}
+    lines = group_lines(words)
+
+    for i, line in enumerate(lines):
+        text = _line_text(line)
+        classified = classify_amount_line(text)
+        if not classified:
+            continue
+        field, rest = classified
+        amount = last_amount(rest)
+        if amount is None:
+            # Label on its own: take the first amount in the column just below it
+            label_x0, label_x1 = line[0]['x0'], line[-1]['x1']
+            for below in lines[i + 1:]:
+                if below[0].get('page', 1) != line[0].get('page', 1):
+                    break
+                if below[0]['top'] - line[0]['top'] > INVOICE_CONFIG['below_distance']:
+                    break
+                column = [w for w in below if w['x1'] >= label_x0 - 5 and w['x0'] <= label_x1 + 40]
+                amount = last_amount(_line_text(column)) if column else None
+                if amount is not None:
+                    break
+        if amount is not None:
+            fields[field] = amount
+
+    first_page_number = min(w.get('page', 1) for w in words)
+    first_page = [w for w in words if w.get('page', 1) == first_page_number]
+    if first_page and all('size' in w for w in first_page):
+        page_bottom = max(w['bottom'] for w in first_page)
+        # The "Invoice" heading is often the largest text, so its words are left out
+        header_words = [
+            w for w in first_page if w['top'] < page_bottom / 3 and not INVOICE_HEADING_RE.match(w['text'])
+        ]
+        header = [line for line in group_lines(header_words) if sum(c.isalpha() for c in _line_text(line)) >= 3]
+        if header:
+            largest = max(header, key=lambda line: max(w['size'] for w in line))
+            fields['supplier'] = _line_text(largest)
+    return fields
+
+def guess_supplier(lines):
+    """First line that looks like a name: not the 'Invoice' heading, no digits-only content."""
+    for line in lines[:10]:
+        stripped = line.strip()
+        if (stripped and not INVOICE_HEADING_RE.match(stripped)
+                and sum(c.isalpha() for c in stripped) >= 3 and not INVOICE_NUMBER_RE.search(stripped)):
+            return stripped
+    return None
+
+def extract_invoice_fields(text, words=None):
+    """
+    Extracts invoice fields from document text, plus pdfplumber words when the
+    source is a PDF. Values are JSON-serialisable (amounts as strings, the date
+    in ISO format) so they can be stored in the extraction cache. Fields that
+    were not found are None.
+    """
+    lines = [line for line in (text or '').splitlines() if line.strip()]
+    fields = fields_from_lines(lines)
+
+    if words:
+        layout = fields_from_layout(words)
+        for field, value in layout.items():
+            # The largest header text beats the first-line guess; labelled supplier lines beat both
+            if field not in fields or field == 'supplier' and not any(SUPPLIER_LABEL_RE.match(l) for l in lines):
+                fields[field] = value
+
+    if 'supplier' not in fields:
+        supplier = guess_supplier(lines)
+        if supplier:
+            fields['supplier'] = supplier
+
+    net, vat, total = fields.get('net_amount'), fields.get('vat_amount'), fields.get('total_amount')
+    if total is None and net is not None and vat is not None:
+        fields['total_amount'] = net + vat
+    elif net is None and total is not None and vat is not None:
+        fields['net_amount'] = total - vat
+
+    result = {}
+    for field in FIELDS:
+        value = fields.get(field)
+        if isinstance(value, (Decimal, date)):
+            value = str(value) if isinstance(value, Decimal) else value.isoformat()
+        elif isinstance(value, str):
+            value = value[:255]
+        result[field] = value
+    return result
+
+def pdf_words(path):
+    """Words with coordinates and font size from the first and last page of a PDF."""
+    from pdf_parser import open_mapped_pdf
+
+    words = []
+    with open_mapped_pdf(path) as pdf:
+        pages = pdf.pages[:1] + pdf.pages[-1:] if len(pdf.pages) > 1 else pdf.pages
+        for page in pages:
+            for word in page.extract_words(extra_attrs=['size']):
+                word['page'] = page.page_number
+                words.append(word)
+            page.flush_cache()
+    return words
+
+SUPPLIERS = ['Acme Office Supplies Ltd', 'Nordic Timber AB', 'Bluewave Logistics GmbH', 'Kestrel IT Services',
+             'Harbor Catering Co.', 'Summit Legal LLP']
+
+def synthetic_invoice(rng):
+    """One generated invoice as (text, expected fields) for benchmarking."""
+    supplier = rng.choice(SUPPLIERS)
+    number = f"INV-{rng.randint(2020, 2026)}-{rng.randint(1, 99999):05d}"
+    issued = date(rng.randint(2020, 2026), rng.randint(1, 12), rng.randint(1, 28))
+    net = (Decimal(rng.randint(100, 5000000)) / 100).quantize(Decimal('0.01'))
+    vat = (net * Decimal('0.20')).quantize(Decimal('0.01'))
+    total = net + vat
+    european = rng.random() < 0.5
+
+    def money(amount):
+        text = f"{amount:,.2f}"
+        return text.replace(',', 'X').replace('.', ',').replace('X', '.') if european else text
+
+    date_text = issued.strftime('%d.%m.%Y') if european else issued.strftime('%B %d, %Y')
+    lines = [supplier, '12 Market Street', 'INVOICE', f"Invoice No: {number}", f"Invoice Date: {date_text}",
+             'Bill to: Example Customer', '']
+    for _ in range(rng.randint(2, 12)):
+        quantity, price = rng.randint(1, 20), Decimal(rng.randint(100, 50000)) / 100
+        lines.append(f"Item {rng.randint(1000, 9999)}  {quantity}  {money(price)}  {money(price * quantity)}")
+    lines += [f"Subtotal: {'EUR' if european else '$'} {money(net)}", f"VAT (20%): {money(vat)}",
+              f"Total due: {'EUR' if european else '$'} {money(total)}"]
+    expected = {'invoice_number': number, 'invoice_date': issued.isoformat(), 'currency': 'EUR' if european else 'USD',
+                'net_amount': str(net), 'vat_amount': str(vat), 'total_amount': str(total), 'supplier': supplier}
+    return '\n'.join(lines), expected
+
+TERMS_WORDS = ['payment', 'is', 'due', 'within', 'thirty', 'days', 'of', 'the', 'invoice', 'date', 'late',
+               'payments', 'accrue', 'interest', 'goods', 'remain', 'our', 'property', 'until', 'paid', 'in', 'full']
+
+def synthetic_layout(text, rng, lines_per_page=55):
+    """
+    pdfplumber-style words for a synthetic invoice, as pdf_words returns them:
+    the first and last page only. The supplier is set large, and small print
+    after the totals brings the pages to a realistic few hundred words.
+    """
+    invoice_lines = text.split('\n')
+    lines = invoice_lines + [' '.join(rng.choice(TERMS_WORDS) for _ in range(rng.randint(10, 16)))
+                             for _ in range(rng.randint(20, 80))]
+    pages = [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)]
+
+    words = []
+    for page_index in sorted({0, len(pages) - 1}):
+        top = 50.0
+        for line_index, line in enumerate(pages[page_index], start=page_index * lines_per_page):
+            if line_index == 0:
+                size = 16.0
+            elif line.strip() == 'INVOICE':
+                size = 20.0
+            else:
+                size = 10.0 if line_index < len(invoice_lines) else 7.0
+            x0 = 50.0
+            for word in line.split():
+                width = len(word) * size * 0.5
+                words.append({'text': word, 'x0': x0, 'x1': x0 + width, 'top': top, 'bottom': top + size,
+                              'size': size, 'page': page_index + 1})
+                x0 += width + size * 0.3
+            top += size * 1.2
+    return words
+
+def main():
+    parser = argparse.ArgumentParser(description='Invoice field extraction throughput on synthetic invoices')
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    invoices = [synthetic_invoice(rng) for _ in range(args.count)]
+    layouts = [synthetic_layout(text, rng) for text, _ in invoices]
+    print(f"{args.count} invoices, {sum(len(words) for words in layouts) / args.count:.0f} words each with layout")
+
+    for mode in ('text', 'layout'):
+        start = time.perf_counter()
+        if mode == 'text':
+            results = [extract_invoice_fields(text) for text, _ in invoices]
+        else:
+            results = [extract_invoice_fields(text, words) for (text, _), words in zip(invoices, layouts)]
+        elapsed = time.perf_counter() - start
+
+        correct = {field: 0 for field in FIELDS}
+        for result, (_, expected) in zip(results, invoices):
+            for field in FIELDS:
+                correct[field] += result[field] == expected[field]
+
+        print(f"{mode:>6}: {elapsed:.2f}s ({args.count / elapsed:.0f} invoices/s)")
+        for field in FIELDS:
+            print(f"  {field:<15} {correct[field] / args.count:.1%} correct")
+
+if __name__ == '__main__':
+    main()
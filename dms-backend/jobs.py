@@ -0,0 +1,241 @@
+# backend/jobs.py
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from extraction_cache import extraction_cache, file_digest
+from metrics import record_stage
+
+JOB_CONFIG = {
+    'workers': int(os.environ.get('DMS_JOB_WORKERS', os.cpu_count() or 2)),
+    # Jobs accepted but not yet finished; uploads beyond this are rejected
+    'max_queue_depth': int(os.environ.get('DMS_JOB_MAX_QUEUE', 32)),
+    # Finished jobs kept in memory for the status endpoint
+    'max_finished_jobs': int(os.environ.get('DMS_JOB_HISTORY', 1000)),
+    # Threads storing finished results (database, search index, classifier)
+    'completion_workers': int(os.environ.get('DMS_JOB_COMPLETION_WORKERS', 2)),
+}
+
+PDF_EXTENSIONS = {'.pdf'}
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.gif', '.webp'}
+
+class QueueFullError(Exception):
+    pass
+
+def file_kind(filename):
+    """Returns 'pdf', 'image' or None for unsupported files."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in PDF_EXTENSIONS:
+        return 'pdf'
+    if extension in IMAGE_EXTENSIONS:
+        return 'image'
+    return None
+
+def run_extraction(file_path, kind):
+    """
+    Runs inside a worker process and only does the text extraction and invoice
+    field parsing. PDF summaries are produced in the web process, where the
+    batch summarizer can group them.
+    """
+    from invoice_extractor import extract_invoice_fields, pdf_words
+
+    if kind == 'pdf':
+        from pdf_parser import extract_text_from_pdf
+        raw_text = extract_text_from_pdf(file_path)
+        return {
+            "summary": None,
+            "raw_text": raw_text,
+            "invoice_fields": extract_invoice_fields(raw_text, pdf_words(file_path))
+        }
+
+    from ocr_utils import ocr_pages
+    pages = ocr_pages(file_path)
+    raw_text = "\n\n".join(page['text'] for page in pages if page['text'])
+    return {
+        "summary": None,
+        "raw_text": raw_text,
+        "ocr_confidence": min((page['confidence'] for page in pages), default=None),
+        "invoice_fields": extract_invoice_fields(raw_text)
+    }
+
+def init_job_worker():
+    """
+    Runs once in every worker process. The queue already runs a job per CPU, so
+    the pages of a PDF are extracted and OCRed inside the job instead of on
+    page and OCR pools of its own, which would start CPU-count processes per worker.
+    """
+    from ocr_utils import OCR_CONFIG
+    from pdf_parser import EXTRACTION_CONFIG
+    EXTRACTION_CONFIG['workers'] = 1
+    OCR_CONFIG['workers'] = 1
+
+def engine_version(kind):
+    from invoice_extractor import EXTRACTOR_VERSION
+    if kind == 'pdf':
+        from pdf_parser import engine_version as pdf_engine_version
+        return f"{pdf_engine_version()}/{EXTRACTOR_VERSION}"
+    from ocr_utils import engine_version as ocr_engine_version
+    return f"{ocr_engine_version()}/{EXTRACTOR_VERSION}"
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+class JobQueue:
+    """Bounded work queue running extraction jobs on a local process pool."""
+
+    def __init__(self, workers, max_queue_depth, max_finished_jobs, completion_workers=2, on_complete=None):
+        self.workers = workers
+        self.max_queue_depth = max_queue_depth
+        self.max_finished_jobs = max_finished_jobs
+        self.on_complete = on_complete
+        self._executor = None
+        # Threads are only started on the first submit
+        self._completions = ThreadPoolExecutor(max_workers=completion_workers, thread_name_prefix='job-complete')
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # Created on first use so importing the app never forks worker processes
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_job_worker)
+            return self._executor
+
+    def is_full(self):
+        with self._lock:
+            return self._pending >= self.max_queue_depth
+
+    def submit(self, document_id, file_path, kind, digest=None, job_id=None, company_id=None):
+        job_id = job_id or new_job_id()
+        with self._lock:
+            if self._pending >= self.max_queue_depth:
+                raise QueueFullError("Extraction queue is full, retry later")
+            self._pending += 1
+            job = {
+                "job_id": job_id,
+                "document_id": document_id,
+                "company_id": company_id,
+                "kind": kind,
+                "status": "queued",
+                "error": None,
+                "future": None,
+                "cache_key": None,
+                "submitted_at": time.monotonic()
+            }
+            self._jobs[job_id] = job
+
+        try:
+            # Identical files were already extracted: answer from the cache without a worker
+            cache_key = extraction_cache.key(digest or file_digest(file_path), engine_version(kind))
+            cached = extraction_cache.get(cache_key)
+            if cached is not None:
+                self._finish(job, cached)
+                return job_id
+            job["cache_key"] = cache_key
+
+            future = self.executor.submit(run_extraction, file_path, kind)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self._jobs.pop(job_id, None)
+            raise
+
+        job["future"] = future
+        future.add_done_callback(lambda f: self._extracted(job, f))
+        return job_id
+
+    def _extracted(self, job, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            self._finish(job, None, e)
+            return
+        # Stages timed inside the worker process are not visible here, so record the job as a whole
+        record_stage(f"{job['kind']}_extraction_job", time.monotonic() - job["submitted_at"])
+
+        if job["kind"] != "pdf" or not result["raw_text"].strip():
+            self._finish(job, result)
+            return
+
+        from pdf_parser import summarize_text
+        job["status"] = "running"
+        try:
+            summary_future = summarize_text(result["raw_text"])
+        except Exception as e:
+            self._finish(job, None, e)
+            return
+        summary_future.add_done_callback(lambda f: self._summarized(job, result, f))
+
+    def _summarized(self, job, result, future):
+        try:
+            result["summary"] = future.result()
+        except Exception as e:
+            self._finish(job, None, e)
+            return
+        self._finish(job, result)
+
+    def _finish(self, job, result, error=None):
+        # Called on the process pool's management thread or the summarizer's batch
+        # thread; storing the result there would hold up every other job behind it
+        self._completions.submit(self._complete, job, result, error)
+
+    def _complete(self, job, result, error):
+        if error is None:
+            job["status"] = "done"
+            if job["cache_key"]:
+                extraction_cache.put(job["cache_key"], result)
+        else:
+            job["status"] = "failed"
+            job["error"] = str(error)
+
+        with self._lock:
+            self._pending -= 1
+            self._prune()
+
+        if self.on_complete:
+            try:
+                self.on_complete(job, result)
+            except Exception as e:
+                print(f"Error storing result of job {job['job_id']}: {e}")
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return None
+            status = job["status"]
+            if status == "queued" and job["future"] is not None and job["future"].running():
+                status = "running"
+            return {
+                "job_id": job_id,
+                "document_id": job["document_id"],
+                "company_id": job["company_id"],
+                "status": status,
+                "error": job["error"]
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "max_queue_depth": self.max_queue_depth,
+                "workers": self.workers
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait)
+        self._completions.shutdown(wait=wait)
@@ -0,0 +1,193 @@
+# backend/metrics.py
+
+import os
+import threading
+import time
+from collections import Counter as TallyCounter
+from contextlib import contextmanager
+
+METRICS_CONFIG = {
+    # The same query template run this many times in one request is reported as N+1
+    'n_plus_one_threshold': int(os.environ.get('DMS_N_PLUS_ONE_THRESHOLD', 5)),
+    'latency_buckets': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+}
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=METRICS_CONFIG['latency_buckets']):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series['buckets']):
+                    labels = _label_text(self.labels + ('le',), key + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _label_text(self.labels + ('le',), key + ('+Inf',))
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                labels = _label_text(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {series['sum']}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_gauges(self, prefix, help_text, collect):
+        """`collect` returns a flat dict of numbers, exported as <prefix>_<key> gauges."""
+        self._collectors.append((prefix, help_text, collect))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, help_text, collect in self._collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                print(f"Error collecting {prefix} metrics: {e}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{key}"
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"])
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+request_latency = registry.register(Histogram(
+    'dms_request_duration_seconds', 'HTTP request latency by route', ('route', 'method', 'status')
+))
+query_latency = registry.register(Histogram(
+    'dms_db_query_duration_seconds', 'Database query latency by statement type', ('statement',)
+))
+query_rows = registry.register(Counter(
+    'dms_db_query_rows_total', 'Rows returned or affected by statement type', ('statement',)
+))
+n_plus_one = registry.register(Counter(
+    'dms_n_plus_one_total', 'Requests that repeated one query template past the N+1 threshold', ('route',)
+))
+stage_latency = registry.register(Histogram(
+    'dms_stage_duration_seconds', 'Latency of extraction stages (PDF text, summarization, OCR)', ('stage',)
+))
+
+class RequestProfile:
+    """Everything measured while serving one request on the current thread."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.stages = []
+
+    def n_plus_one(self):
+        counts = TallyCounter(template for template, _, _ in self.queries)
+        return {
+            template: count for template, count in counts.items()
+            if count >= METRICS_CONFIG['n_plus_one_threshold']
+        }
+
+    def summary(self):
+        slowest = sorted(self.queries, key=lambda q: q[1], reverse=True)[:5]
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "db_ms": round(sum(duration for _, duration, _ in self.queries) * 1000, 2),
+            "queries": len(self.queries),
+            "slowest_queries": [
+                {"sql": template[:200], "ms": round(duration * 1000, 2), "rows": rows}
+                for template, duration, rows in slowest
+            ],
+            "stages": [{"stage": stage, "ms": round(duration * 1000, 2)} for stage, duration in self.stages],
+            "n_plus_one": [{"sql": template[:200], "count": count} for template, count in self.n_plus_one().items()]
+        }
+
+_local = threading.local()
+
+def start_request():
+    _local.profile = RequestProfile()
+
+def finish_request(route, method, status):
+    """Records the request metrics and returns its profile."""
+    profile = getattr(_local, 'profile', None)
+    _local.profile = None
+    if profile is None:
+        return None
+    request_latency.observe(time.perf_counter() - profile.started, route=route, method=method, status=status)
+    if profile.n_plus_one():
+        n_plus_one.inc(route=route)
+    return profile
+
+def record_query(query, duration, rows):
+    template = ' '.join(query.split())
+    statement = template.split(' ', 1)[0].upper() if template else ''
+    query_latency.observe(duration, statement=statement)
+    query_rows.inc(max(rows or 0, 0), statement=statement)
+    profile = getattr(_local, 'profile', None)
+    if profile is not None:
+        profile.queries.append((template, duration, rows))
+
+def record_stage(stage, duration):
+    stage_latency.observe(duration, stage=stage)
+    profile = getattr(_local, 'profile', None)
+    if profile is not None:
+        profile.stages.append((stage, duration))
+
+@contextmanager
+def timed_stage(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
@@ -0,0 +1,314 @@
+# backend/migrations.py
+#
+# Versioned schema migrations. Run them explicitly before starting the app:
+#
+#     python migrations.py
+#
+# Every migration is idempotent, so databases created by the old
+# init-on-import code converge to the same schema.
+
+import mysql.connector
+from mysql.connector.errors import ProgrammingError
+
+from history_retention import HISTORY_RETENTION_CONFIG, list_partitions, partition_by_month
+
+def _ensure_column(cursor, table, column, definition):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _ensure_index(cursor, table, index_name, columns):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index_name))
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+
+def _drop_index(cursor, table, index_name):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index_name))
+    if cursor.fetchone()[0]:
+        cursor.execute(f"DROP INDEX {index_name} ON {table}")
+
+def create_base_tables(db, cursor):
+    # Create companies table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS companies (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Create users table with new fields
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            role ENUM('admin', 'user') DEFAULT 'user',
+            is_active BOOLEAN DEFAULT TRUE,
+            user_limit INT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Create user_companies junction table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_companies (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT,
+            company_id INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
+            UNIQUE KEY unique_user_company (user_id, company_id)
+        )
+    """)
+
+    # Create folders table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS folders (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            parent_id INT NULL,
+            company_id INT NOT NULL,
+            created_by INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (parent_id) REFERENCES folders(id) ON DELETE CASCADE,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
+            FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Create documents table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            filename VARCHAR(255) NOT NULL,
+            document_type ENUM('invoice', 'non_invoice') NOT NULL,
+            owner_id INT NOT NULL,
+            company_id INT NOT NULL,
+            folder_id INT NULL,
+            file_path VARCHAR(500),
+            file_size INT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (owner_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
+            FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE SET NULL
+        )
+    """)
+
+    # Create document_history table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_history (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            document_id INT NOT NULL,
+            user_id INT NOT NULL,
+            action VARCHAR(255) NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+
+def add_document_listing_indexes(db, cursor):
+    # Keyset pagination of GET /documents on (created_at, id)
+    _ensure_index(cursor, 'documents', 'idx_documents_company_created',
+                  'company_id, created_at, id')
+    _ensure_index(cursor, 'documents', 'idx_documents_company_type_created',
+                  'company_id, document_type, created_at, id')
+    _ensure_index(cursor, 'documents', 'idx_documents_company_folder_created',
+                  'company_id, folder_id, created_at, id')
+
+def add_document_extraction_columns(db, cursor):
+    _ensure_column(cursor, 'documents', 'summary', 'TEXT NULL')
+    _ensure_column(cursor, 'documents', 'extraction_status', 'VARCHAR(20) NULL')
+
+def add_folder_parent_index(db, cursor):
+    _ensure_index(cursor, 'folders', 'idx_folders_company_parent', 'company_id, parent_id, name')
+
+def widen_file_size_and_index_file_path(db, cursor):
+    # Files over 2 GB do not fit the original INT file_size
+    cursor.execute("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = 'documents' AND column_name = 'file_size'
+    """)
+    if cursor.fetchone()[0] != 'bigint':
+        cursor.execute("ALTER TABLE documents MODIFY COLUMN file_size BIGINT DEFAULT 0")
+    # Stored files are shared by content; deletes check for other references
+    _ensure_index(cursor, 'documents', 'idx_documents_file_path', 'file_path(80)')
+
+def create_invoice_fields_table(db, cursor):
+    # One row per invoice document, filled by the extraction jobs; company_id is
+    # copied from documents so listings and aggregates need no join
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_fields (
+            document_id INT PRIMARY KEY,
+            company_id INT NOT NULL,
+            invoice_number VARCHAR(64) NULL,
+            invoice_date DATE NULL,
+            currency CHAR(3) NULL,
+            net_amount DECIMAL(14, 2) NULL,
+            vat_amount DECIMAL(14, 2) NULL,
+            total_amount DECIMAL(14, 2) NULL,
+            supplier VARCHAR(255) NULL,
+            extracted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+        )
+    """)
+    _ensure_index(cursor, 'invoice_fields', 'idx_invoice_fields_company_date',
+                  'company_id, invoice_date, document_id')
+    _ensure_index(cursor, 'invoice_fields', 'idx_invoice_fields_company_total', 'company_id, total_amount')
+    _ensure_index(cursor, 'invoice_fields', 'idx_invoice_fields_company_supplier', 'company_id, supplier(64)')
+
+def make_document_type_nullable(db, cursor):
+    # Uploads without a type are classified once their text is extracted
+    cursor.execute("""
+        SELECT is_nullable FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = 'documents' AND column_name = 'document_type'
+    """)
+    if cursor.fetchone()[0] != 'YES':
+        cursor.execute("ALTER TABLE documents MODIFY COLUMN document_type ENUM('invoice', 'non_invoice') NULL")
+
+def create_cache_versions_table(db, cursor):
+    # Version stamps behind the ETags of list endpoints; see http_cache.py
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            scope VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+
+def partition_document_history(db, cursor):
+    # Months rolled out of document_history by history_retention.py end up here
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_history_summary (
+            document_id INT NOT NULL,
+            month DATE NOT NULL,
+            action VARCHAR(255) NOT NULL,
+            event_count INT NOT NULL,
+            first_at TIMESTAMP NULL,
+            last_at TIMESTAMP NULL,
+            PRIMARY KEY (document_id, month, action),
+            FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+        )
+    """)
+    if list_partitions(cursor, 'document_history'):
+        return
+
+    # Partitioned InnoDB tables cannot have foreign keys: history of deleted
+    # documents is removed by delete_document, buffered events of deleted
+    # documents are skipped by history_writer.insert_history_rows, and
+    # orphans of deleted companies are skipped when their month is compacted
+    cursor.execute("""
+        SELECT constraint_name FROM information_schema.referential_constraints
+        WHERE constraint_schema = DATABASE() AND table_name = 'document_history'
+    """)
+    for (constraint_name,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE document_history DROP FOREIGN KEY {constraint_name}")
+
+    # Every unique key must contain the partitioning column
+    cursor.execute("UPDATE document_history SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL")
+    cursor.execute("""
+        ALTER TABLE document_history
+        MODIFY COLUMN timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)
+    """)
+    # Timelines: the index carries id through the primary key, so a keyset page
+    # on (timestamp, id) is found in the index and only its rows are read
+    _ensure_index(cursor, 'document_history', 'idx_document_history_document_time', 'document_id, timestamp')
+    # Left behind by the dropped foreign keys; nothing reads them and they slow inserts
+    _drop_index(cursor, 'document_history', 'document_id')
+    _drop_index(cursor, 'document_history', 'user_id')
+
+    partition_by_month(cursor, 'document_history', HISTORY_RETENTION_CONFIG['months_ahead'])
+
+def add_document_extraction_job_id(db, cursor):
+    # GET /jobs/<id> answers from the row when the job ran in another worker process
+    _ensure_column(cursor, 'documents', 'extraction_job_id', 'CHAR(32) NULL')
+    _ensure_index(cursor, 'documents', 'idx_documents_extraction_job', 'extraction_job_id')
+
+def add_document_import_batch(db, cursor):
+    # bulk_create_documents finds the ids of a batch by this key
+    _ensure_column(cursor, 'documents', 'import_batch', 'CHAR(32) NULL')
+    _ensure_index(cursor, 'documents', 'idx_documents_import_batch', 'import_batch')
+
+def create_default_users(db, cursor):
+    db.create_default_users()
+
+# (version, name, function) in the order they must be applied; never renumber
+MIGRATIONS = [
+    (1, 'create base tables', create_base_tables),
+    (2, 'add document listing indexes', add_document_listing_indexes),
+    (3, 'add document extraction columns', add_document_extraction_columns),
+    (4, 'add folder parent index', add_folder_parent_index),
+    (5, 'widen file_size and index file_path', widen_file_size_and_index_file_path),
+    (6, 'create default users', create_default_users),
+    (7, 'create invoice_fields table', create_invoice_fields_table),
+    (8, 'make document_type nullable', make_document_type_nullable),
+    (9, 'create cache_versions table', create_cache_versions_table),
+    (10, 'partition document_history by month', partition_document_history),
+    (11, 'add document extraction_job_id', add_document_extraction_job_id),
+    (12, 'add document import_batch', add_document_import_batch),
+]
+
+def _connect(db_config):
+    # Connect without selecting the database so it can be created on a fresh server
+    server_config = {key: value for key, value in db_config.items() if key != 'database'}
+    connection = mysql.connector.connect(**server_config)
+    cursor = connection.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_config['database']}")
+    cursor.execute(f"USE {db_config['database']}")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return connection, cursor
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+def pending_migrations(db):
+    """Migrations not applied yet, read through the app's connection pool."""
+    try:
+        rows = db.execute_query("SELECT version FROM schema_migrations", fetch=True)
+    except ProgrammingError:
+        # schema_migrations does not exist yet: nothing has been applied
+        return [version for version, _, _ in MIGRATIONS]
+    applied = {row['version'] for row in rows}
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+def migrate(db, db_config):
+    connection, cursor = _connect(db_config)
+    try:
+        applied = applied_versions(cursor)
+        for version, name, apply in MIGRATIONS:
+            if version in applied:
+                continue
+            print(f"Applying migration {version}: {name}")
+            apply(db, cursor)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name)
+            )
+            connection.commit()
+        print("Database schema is up to date")
+    finally:
+        cursor.close()
+        connection.close()
+
+if __name__ == '__main__':
+    from db import db, DB_CONFIG
+    migrate(db, DB_CONFIG)
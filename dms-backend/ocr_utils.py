@@ -1,16 +1,212 @@
 # backend/ocr_utils.py
 
-from PIL import Image
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+import pdfplumber
+from PIL import Image, ImageOps
 import pytesseract
-import io
+
+from extraction_cache import extraction_cache, file_digest
+from metrics import timed_stage
+
+try:
+    # Keeps one tesseract engine loaded per process instead of forking the CLI per page
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+OCR_CONFIG = {
+    # OCR pool size in the web process; job workers (jobs.init_job_worker) OCR in-process
+    'workers': int(os.environ.get('DMS_OCR_WORKERS', os.cpu_count() or 2)),
+    # Tesseract is most accurate around 300 DPI; scans are resampled towards it
+    'target_dpi': 300,
+    'max_upscale': 2.0,
+    # Used when the image carries no DPI information
+    'max_side': 4200,
+    'binarize': os.environ.get('DMS_OCR_BINARIZE', '1') == '1',
+    # Resolution scanned PDF pages are rasterized at before OCR
+    'pdf_resolution': int(os.environ.get('DMS_OCR_PDF_RESOLUTION', 300)),
+}
+
+@lru_cache(maxsize=None)
+def tesseract_version():
+    """Version of the tesseract library or CLI that recognize() runs, or None when neither is installed."""
+    if tesserocr is not None:
+        # "tesseract 5.3.0\n leptonica-1.82.0\n ..."
+        return f"tesserocr-{tesserocr.tesseract_version().split()[1]}"
+    try:
+        return f"tesseract-{pytesseract.get_tesseract_version()}"
+    except pytesseract.TesseractNotFoundError:
+        return None
+
+def engine_version():
+    """Part of the extraction cache key, so a tesseract upgrade invalidates cached text."""
+    engine = tesseract_version() or 'no-tesseract'
+    return f"{engine}/dpi-{OCR_CONFIG['target_dpi']}{'/bin' if OCR_CONFIG['binarize'] else ''}"
+
+def otsu_threshold(gray):
+    """Grey level that best separates ink from paper, from the image histogram."""
+    histogram = gray.histogram()
+    total = sum(histogram)
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+    sum_background, weight_background = 0, 0
+    best_level, best_variance = 127, 0.0
+    for level, count in enumerate(histogram):
+        weight_background += count
+        if not weight_background:
+            continue
+        weight_foreground = total - weight_background
+        if not weight_foreground:
+            break
+        sum_background += level * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+def preprocess(image):
+    """Greyscale, resample towards the target DPI and binarize a page before OCR."""
+    gray = ImageOps.grayscale(image)
+
+    dpi = image.info.get('dpi')
+    if dpi and dpi[0]:
+        scale = min(OCR_CONFIG['target_dpi'] / float(dpi[0]), OCR_CONFIG['max_upscale'])
+    else:
+        scale = min(1.0, OCR_CONFIG['max_side'] / float(max(gray.size)))
+    if abs(scale - 1.0) > 0.05:
+        size = (max(1, int(gray.width * scale)), max(1, int(gray.height * scale)))
+        gray = gray.resize(size, Image.LANCZOS)
+
+    if OCR_CONFIG['binarize']:
+        threshold = otsu_threshold(gray)
+        gray = gray.point(lambda level: 255 if level > threshold else 0)
+    return gray
+
+# tesseract engines are not thread-safe, so each thread gets its own
+_tesseract = threading.local()
+
+def recognize(image):
+    """OCR one preprocessed page. Returns (text, mean word confidence 0-100)."""
+    if tesserocr is not None:
+        api = getattr(_tesseract, 'api', None)
+        if api is None:
+            api = _tesseract.api = tesserocr.PyTessBaseAPI()
+        api.SetImage(image)
+        return api.GetUTF8Text().strip(), float(api.MeanTextConf())
+
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data['text']):
+        if not word.strip():
+            continue
+        line = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        lines.setdefault(line, []).append(word)
+        confidence = float(data['conf'][i])
+        if confidence >= 0:
+            confidences.append(confidence)
+    text = "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+    return text, (sum(confidences) / len(confidences) if confidences else 0.0)
+
+def ocr_frame(path, frame):
+    """OCR one page (frame) of an image file. Runs in a worker process."""
+    with Image.open(path) as image:
+        image.seek(frame)
+        text, confidence = recognize(preprocess(image))
+    return {"page": frame + 1, "text": text, "confidence": round(confidence, 1)}
+
+def ocr_pdf_page(path, page_number):
+    """Rasterizes one page (1-based) of a PDF and OCRs it. Runs in a worker process."""
+    resolution = OCR_CONFIG['pdf_resolution']
+    with pdfplumber.open(path, pages=[page_number]) as pdf:
+        page = pdf.pages[0]
+        image = page.to_image(resolution=resolution).original
+        page.flush_cache()
+    # The raster has a known DPI, so preprocess only resamples if it differs from the target
+    image.info['dpi'] = (resolution, resolution)
+    text, confidence = recognize(preprocess(image))
+    return {"page": page_number, "text": text, "confidence": round(confidence, 1)}
+
+_ocr_executor = None
+_ocr_executor_lock = threading.Lock()
+
+def get_ocr_executor():
+    global _ocr_executor
+    with _ocr_executor_lock:
+        if _ocr_executor is None:
+            _ocr_executor = ProcessPoolExecutor(max_workers=OCR_CONFIG['workers'])
+        return _ocr_executor
+
+@contextmanager
+def local_image_path(file_storage):
+    """Yields a path on disk for the image; uploads are spooled to a temp file."""
+    if isinstance(file_storage, (str, os.PathLike)):
+        yield os.fspath(file_storage)
+        return
+
+    stream = getattr(file_storage, 'stream', file_storage)
+    with tempfile.NamedTemporaryFile(delete=False) as spool:
+        shutil.copyfileobj(stream, spool, 1024 * 1024)
+    try:
+        yield spool.name
+    finally:
+        os.remove(spool.name)
+
+def ocr_pages(file_storage):
+    """
+    OCR every page of an image, including multi-page TIFFs. Pages are spread
+    over a process pool; returns [{"page", "text", "confidence"}] in page order.
+    """
+    with local_image_path(file_storage) as path:
+        with Image.open(path) as image:
+            frames = getattr(image, 'n_frames', 1)
+
+        with timed_stage('ocr'):
+            if frames == 1 or OCR_CONFIG['workers'] <= 1:
+                return [ocr_frame(path, frame) for frame in range(frames)]
+            executor = get_ocr_executor()
+            return list(executor.map(ocr_frame, [path] * frames, range(frames)))
+
+def ocr_pdf_pages(path, page_numbers):
+    """
+    OCR the given pages of a PDF on disk, rasterizing only those pages.
+    Returns [{"page", "text", "confidence"}] in page order.
+    """
+    page_numbers = sorted(page_numbers)
+    if not page_numbers:
+        return []
+    with timed_stage('ocr'):
+        if len(page_numbers) == 1 or OCR_CONFIG['workers'] <= 1:
+            return [ocr_pdf_page(path, page_number) for page_number in page_numbers]
+        executor = get_ocr_executor()
+        return list(executor.map(ocr_pdf_page, [path] * len(page_numbers), page_numbers))
+
+def ocr_image(file_storage):
+    """Runs OCR on an uploaded image or a stored file, raising on failure."""
+    return "\n\n".join(page['text'] for page in ocr_pages(file_storage) if page['text'])
 
 def extract_text_from_image(file_storage):
     """
-    Takes an uploaded image file (via Flask) and returns the OCR text.
+    Takes an uploaded image file (via Flask) or a path to a stored file and returns the OCR text.
+    Results are cached by file content, so re-uploads skip OCR entirely.
     """
+    source = getattr(file_storage, 'stream', file_storage)
     try:
-        image = Image.open(file_storage.stream).convert("RGB")
-        text = pytesseract.image_to_string(image)
-        return text.strip()
+        cache_key = extraction_cache.key(file_digest(source), engine_version())
+        cached = extraction_cache.get(cache_key)
+        if cached is not None:
+            return cached['raw_text']
+
+        text = ocr_image(source)
+        extraction_cache.put(cache_key, {"raw_text": text})
+        return text
     except Exception as e:
         return f"OCR failed: {str(e)}"
@@ -0,0 +1,81 @@
+# backend/password_hasher.py
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import bcrypt
+
+HASHER_CONFIG = {
+    # bcrypt cost factor; each +1 doubles the CPU time per hash
+    'rounds': int(os.environ.get('DMS_BCRYPT_ROUNDS', 12)),
+    'workers': int(os.environ.get('DMS_BCRYPT_WORKERS', max(1, (os.cpu_count() or 2) // 2))),
+    # Hash/verify calls waiting for a worker beyond this are rejected outright
+    'max_pending': int(os.environ.get('DMS_BCRYPT_MAX_PENDING', 64)),
+    'timeout': float(os.environ.get('DMS_BCRYPT_TIMEOUT', 5)),
+}
+
+class HasherBusyError(Exception):
+    pass
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _verify(hashed_password, password):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+def hash_rounds(hashed_password):
+    """Cost factor stored in a bcrypt hash ($2b$<rounds>$...), or None if unreadable."""
+    try:
+        return int(hashed_password.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated process pool so a burst of logins or user
+    creations cannot occupy the request threads' CPU time.
+    """
+
+    def __init__(self, rounds, workers, max_pending, timeout):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusyError("Too many password operations in progress, retry later")
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is freed when the work finishes, even if the caller gave up waiting
+        future.add_done_callback(lambda f: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise HasherBusyError("Password operation timed out, retry later")
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, hashed_password, password):
+        return self._run(_verify, hashed_password, password)
+
+    def needs_rehash(self, hashed_password):
+        return hash_rounds(hashed_password) != self.rounds
+
+password_hasher = PasswordHasher(**HASHER_CONFIG)
@@ -1,18 +1,401 @@
 # backend/pdf_parser.py
 
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import lru_cache
+
 import pdfplumber
-from transformers import pipeline
 
-# Load summarization model once
-summarizer = pipeline("summarization", model="sshleifer/distilbart-cnn-12-6")
+from extraction_cache import extraction_cache, file_digest
+from metrics import timed_stage
+
+SUMMARIZER_CONFIG = {
+    # 'stub' swaps in StubSummarizer: no download, no torch, a fixed cost per batch
+    'model': os.environ.get('DMS_SUMMARY_MODEL', 'sshleifer/distilbart-cnn-12-6'),
+    'stub_batch_seconds': float(os.environ.get('DMS_SUMMARY_STUB_BATCH_SECONDS', 0.05)),
+    'max_length': 150,
+    'min_length': 30,
+    # Texts are run through the model together once this many are waiting...
+    'max_batch_size': int(os.environ.get('DMS_SUMMARY_BATCH_SIZE', 8)),
+    # ...or once the oldest waiting text has waited this long (seconds)
+    'batch_window': float(os.environ.get('DMS_SUMMARY_BATCH_WINDOW', 0.05)),
+    # Long texts are split into chunks of this many tokens (distilbart accepts 1024)
+    'chunk_tokens': 900,
+    'chunk_overlap': 50,
+    # Upper bound on model calls spent on one document
+    'max_chunks': int(os.environ.get('DMS_SUMMARY_MAX_CHUNKS', 32)),
+    'max_reduce_rounds': 3,
+    'map_reduce_workers': int(os.environ.get('DMS_SUMMARY_MAP_REDUCE_WORKERS', 4)),
+    # int8 dynamic quantization of the Linear layers: smaller and faster on CPU
+    'quantize': os.environ.get('DMS_SUMMARY_QUANTIZE') == '1',
+}
+
+EXTRACTION_CONFIG = {
+    # PDFs with fewer pages are extracted in the calling process
+    'parallel_min_pages': int(os.environ.get('DMS_PDF_PARALLEL_MIN_PAGES', 40)),
+    # Pages handed to a worker at a time; bounds the memory a worker holds
+    'pages_per_task': int(os.environ.get('DMS_PDF_PAGES_PER_TASK', 20)),
+    # Page pool size for extraction in the web process; job workers (jobs.init_job_worker) use none
+    'workers': int(os.environ.get('DMS_PDF_WORKERS', os.cpu_count() or 2)),
+    # Pages without a text layer but with images are OCRed (see ocr_utils.ocr_pdf_pages)
+    'ocr_fallback': os.environ.get('DMS_PDF_OCR_FALLBACK', '1') == '1',
+}
+
+# Part of the extraction cache key: bump whenever output for the same file may change
+ENGINE_VERSION = (
+    f"pdfplumber-{pdfplumber.__version__}/{SUMMARIZER_CONFIG['model']}"
+    f"/chunks-{SUMMARIZER_CONFIG['chunk_tokens']}x{SUMMARIZER_CONFIG['max_chunks']}"
+    f"{'/int8' if SUMMARIZER_CONFIG['quantize'] else ''}"
+)
+
+@lru_cache(maxsize=None)
+def engine_version():
+    """
+    The extraction cache key part for PDFs. With the OCR fallback on, scanned
+    pages depend on the tesseract version and the rasterizing resolution too,
+    which are looked up on first use rather than when the module is imported.
+    """
+    if not EXTRACTION_CONFIG['ocr_fallback']:
+        return ENGINE_VERSION
+    from ocr_utils import OCR_CONFIG, engine_version as ocr_engine_version
+    return f"{ENGINE_VERSION}/ocr-fallback/{ocr_engine_version()}/pdf-{OCR_CONFIG['pdf_resolution']}dpi"
+
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+class StubSummarizer:
+    """
+    Stand-in for the summarization pipeline in benchmarks and tests. Tokens are
+    whitespace-separated words, a summary is the first max_length of them, and
+    every batch sleeps stub_batch_seconds to stand in for the model's cost.
+    """
+
+    class Tokenizer:
+        def encode(self, text, add_special_tokens=False):
+            return text.split()
+
+        def decode(self, token_ids, skip_special_tokens=True):
+            return ' '.join(token_ids)
+
+    def __init__(self, batch_seconds):
+        self.batch_seconds = batch_seconds
+        self.tokenizer = self.Tokenizer()
+
+    def __call__(self, texts, max_length, **kwargs):
+        time.sleep(self.batch_seconds)
+        return [{'summary_text': ' '.join(text.split()[:max_length])} for text in texts]
+
+def build_summarizer(quantize=False):
+    if SUMMARIZER_CONFIG['model'] == 'stub':
+        return StubSummarizer(SUMMARIZER_CONFIG['stub_batch_seconds'])
+    from transformers import pipeline
+    summarizer = pipeline("summarization", model=SUMMARIZER_CONFIG['model'])
+    if quantize:
+        import torch
+        summarizer.model = torch.quantization.quantize_dynamic(
+            summarizer.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return summarizer
+
+def get_summarizer():
+    """
+    Loads the summarization model on first use. transformers itself is imported
+    here too, so importing this module (and forking workers) stays cheap.
+    """
+    global _summarizer
+    if _summarizer is None:
+        with _summarizer_lock:
+            if _summarizer is None:
+                with timed_stage('model_load'):
+                    _summarizer = build_summarizer(SUMMARIZER_CONFIG['quantize'])
+    return _summarizer
+
+def is_model_loaded():
+    return _summarizer is not None
+
+def preload_for_fork():
+    """
+    Loads the model in the parent of a pre-forking server so every worker shares
+    its memory pages copy-on-write instead of loading its own copy.
+    """
+    import gc
+    get_summarizer()
+    # Move everything allocated so far out of the GC's reach; collections would
+    # otherwise write to these objects in each worker and un-share their pages
+    gc.freeze()
+
+def warmup(background=True):
+    """Loads the model ahead of the first request, by default without blocking the caller."""
+    if not background:
+        get_summarizer()
+        return None
+    thread = threading.Thread(target=get_summarizer, name="summarizer-warmup", daemon=True)
+    thread.start()
+    return thread
+
+class BatchSummarizer:
+    """
+    Collects texts from concurrent callers and runs them through the
+    summarization pipeline in batches, dispatching each summary back to its caller.
+    """
+
+    # How many batches worth of pending texts are sorted together by length
+    SORT_POOL_BATCHES = 4
+
+    def __init__(self, load_pipeline, max_batch_size, batch_window, max_length, min_length):
+        self.load_pipeline = load_pipeline
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.max_length = max_length
+        self.min_length = min_length
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, text):
+        """Queues a text for summarization and returns a Future of the summary."""
+        future = Future()
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="batch-summarizer", daemon=True)
+                self._thread.start()
+            self._pending.append((time.monotonic(), text, future))
+            self._condition.notify()
+        return future
+
+    def summarize(self, text):
+        return self.submit(text).result()
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+
+            # Wait for the batch to fill up, but never past the oldest text's window
+            deadline = self._pending[0][0] + self.batch_window
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            take = self.max_batch_size * self.SORT_POOL_BATCHES
+            batch, self._pending = self._pending[:take], self._pending[take:]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            # Similar lengths end up in the same model batch, which keeps padding low
+            batch.sort(key=lambda item: len(item[1]))
+            texts = [text for _, text, _ in batch]
+            try:
+                summarizer = self.load_pipeline()
+                with timed_stage('summarize_batch'):
+                    outputs = summarizer(
+                        texts,
+                        batch_size=self.max_batch_size,
+                        max_length=self.max_length,
+                        min_length=self.min_length,
+                        do_sample=False,
+                        truncation=True
+                    )
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, _, future), output in zip(batch, outputs):
+                future.set_result(output['summary_text'])
+
+batch_summarizer = BatchSummarizer(
+    get_summarizer,
+    max_batch_size=SUMMARIZER_CONFIG['max_batch_size'],
+    batch_window=SUMMARIZER_CONFIG['batch_window'],
+    max_length=SUMMARIZER_CONFIG['max_length'],
+    min_length=SUMMARIZER_CONFIG['min_length']
+)
+
+_page_executor = None
+_page_executor_lock = threading.Lock()
+
+def get_page_executor():
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None:
+            _page_executor = ProcessPoolExecutor(max_workers=EXTRACTION_CONFIG['workers'])
+        return _page_executor
+
+@contextmanager
+def local_pdf_path(file_storage):
+    """
+    Yields a path on disk for the PDF. Uploads are spooled to a temp file in
+    chunks so workers can map the same file instead of receiving its bytes.
+    """
+    if isinstance(file_storage, (str, os.PathLike)):
+        yield os.fspath(file_storage)
+        return
+
+    stream = getattr(file_storage, 'stream', file_storage)
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as spool:
+        shutil.copyfileobj(stream, spool, 1024 * 1024)
+    try:
+        yield spool.name
+    finally:
+        os.remove(spool.name)
+
+@contextmanager
+def open_mapped_pdf(path, pages=None):
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with pdfplumber.open(mapped, pages=pages) as pdf:
+            yield pdf
+
+def extract_page_range(path, first_page, last_page):
+    """
+    Extracts pages first_page..last_page (1-based, inclusive). Runs in a worker
+    process; page caches are dropped as soon as a page is read.
+    The text is None for a scanned page: no text layer but at least one image.
+    """
+    texts = []
+    with open_mapped_pdf(path, pages=list(range(first_page, last_page + 1))) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text() or ""
+            if not text.strip() and page.images and EXTRACTION_CONFIG['ocr_fallback']:
+                text = None
+            texts.append((page.page_number, text))
+            page.flush_cache()
+    return texts
+
+def iter_pdf_pages(file_storage):
+    """
+    Yields (page_number, text) for every page of the PDF as soon as it is extracted.
+    Large PDFs are split into page ranges extracted in parallel, so pages may
+    arrive out of order. Scanned pages yield None as their text.
+    """
+    with local_pdf_path(file_storage) as path:
+        with open_mapped_pdf(path) as pdf:
+            page_count = len(pdf.pages)
+
+        config = EXTRACTION_CONFIG
+        if page_count < config['parallel_min_pages'] or config['workers'] <= 1:
+            for first_page in range(1, page_count + 1, config['pages_per_task']):
+                last_page = min(first_page + config['pages_per_task'] - 1, page_count)
+                yield from extract_page_range(path, first_page, last_page)
+            return
+
+        executor = get_page_executor()
+        futures = [
+            executor.submit(extract_page_range, path, first_page,
+                            min(first_page + config['pages_per_task'] - 1, page_count))
+            for first_page in range(1, page_count + 1, config['pages_per_task'])
+        ]
+        try:
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            # The consumer stopped early (or a range failed): drop the remaining work
+            for future in futures:
+                future.cancel()
+
+def extract_text_from_pdf(file_storage):
+    """
+    Extracts all text from the PDF. Accepts an uploaded file (via Flask) or a path to a stored file.
+    Scanned pages are rasterized and OCRed; pages with a text layer never are.
+    """
+    with local_pdf_path(file_storage) as path:
+        with timed_stage('pdf_text'):
+            pages = dict(iter_pdf_pages(path))
+
+        scanned = [page_number for page_number, text in pages.items() if text is None]
+        if scanned:
+            from ocr_utils import ocr_pdf_pages
+            for page in ocr_pdf_pages(path, scanned):
+                pages[page['page']] = page['text']
+
+    return "\n".join(pages[page_number] for page_number in sorted(pages))
+
+# Map-reduce summaries wait on the batcher, so they run on their own threads
+map_reduce_executor = ThreadPoolExecutor(
+    max_workers=SUMMARIZER_CONFIG['map_reduce_workers'], thread_name_prefix="map-reduce-summary"
+)
+
+def split_into_chunks(text, chunk_tokens, overlap):
+    """
+    Splits the text into pieces of at most chunk_tokens model tokens, overlapping
+    by `overlap` tokens so sentences on a boundary are not lost.
+    """
+    tokenizer = get_summarizer().tokenizer
+    token_ids = tokenizer.encode(text, add_special_tokens=False)
+    if len(token_ids) <= chunk_tokens:
+        return [text]
+
+    step = chunk_tokens - overlap
+    return [
+        tokenizer.decode(token_ids[start:start + chunk_tokens], skip_special_tokens=True)
+        for start in range(0, len(token_ids), step)
+    ]
+
+def limit_chunks(chunks, max_chunks):
+    """Keeps at most max_chunks chunks, spread evenly over the document."""
+    if len(chunks) <= max_chunks:
+        return chunks
+    step = len(chunks) / max_chunks
+    return [chunks[int(i * step)] for i in range(max_chunks)]
+
+def map_reduce_summarize(text):
+    """
+    Summarizes every chunk of a long text (map), then summarizes the joined
+    chunk summaries (reduce), repeating the reduce until the text fits the model.
+    """
+    config = SUMMARIZER_CONFIG
+    chunks = limit_chunks(
+        split_into_chunks(text, config['chunk_tokens'], config['chunk_overlap']),
+        config['max_chunks']
+    )
+
+    for _ in range(config['max_reduce_rounds']):
+        if len(chunks) == 1:
+            break
+        # All chunks are queued at once so the batcher runs them through the model together
+        futures = [batch_summarizer.submit(chunk) for chunk in chunks]
+        text = "\n".join(future.result() for future in futures)
+        chunks = limit_chunks(
+            split_into_chunks(text, config['chunk_tokens'], config['chunk_overlap']),
+            config['max_chunks']
+        )
+
+    # Anything still too long after the last round is truncated by the pipeline
+    return batch_summarizer.summarize(chunks[0] if len(chunks) == 1 else "\n".join(chunks))
+
+def summarize_text(text):
+    """
+    Returns a Future of the summary of the text, batched with other pending texts.
+    Texts longer than the model context are summarized with map_reduce_summarize.
+    """
+    # Cheap upper bound: a token is never shorter than one character
+    if len(text) <= SUMMARIZER_CONFIG['chunk_tokens']:
+        return batch_summarizer.submit(text)
+    return map_reduce_executor.submit(map_reduce_summarize, text)
 
 def extract_data_from_pdf(file_storage):
     """
     Extracts all text from the PDF and summarizes it using a pre-trained transformer model.
+    Accepts an uploaded file (via Flask) or a path to a stored file.
+    Results are cached by file content, so re-uploads skip the model entirely.
     """
     try:
-        with pdfplumber.open(file_storage.stream) as pdf:
-            full_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+        cache_key = extraction_cache.key(file_digest(file_storage), engine_version())
+        cached = extraction_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        full_text = extract_text_from_pdf(file_storage)
 
         if not full_text.strip():
             return {
@@ -20,16 +403,15 @@ def extract_data_from_pdf(file_storage):
                 "raw_text": ""
             }
 
-        # Truncate if too long for summarizer (max length for distilbart is 1024 tokens)
-        if len(full_text) > 3000:
-            full_text = full_text[:3000]
+        with timed_stage('summarize'):
+            summary_text = summarize_text(full_text).result()
 
-        summary_text = summarizer(full_text, max_length=150, min_length=30, do_sample=False)[0]['summary_text']
-
-        return {
+        result = {
             "summary": summary_text,
             "raw_text": full_text
         }
+        extraction_cache.put(cache_key, result)
+        return result
     except Exception as e:
         return {
             "summary": f"Failed to parse PDF: {str(e)}",
@@ -0,0 +1,77 @@
+# backend/quantization_check.py
+#
+# Compares summaries of the int8 quantized summarizer against the fp32 model
+# before enabling DMS_SUMMARY_QUANTIZE:
+#
+#     python quantization_check.py contract.txt report.txt ...
+#
+# Exits with status 1 when the average ROUGE-L F1 falls below --min-score.
+
+import argparse
+import sys
+import time
+
+from pdf_parser import SUMMARIZER_CONFIG, build_summarizer
+
+SAMPLE_TEXT = (
+    "The supplier shall deliver the ordered equipment to the customer's main warehouse within thirty days "
+    "of the purchase order. Payment is due within sixty days of the invoice date. Late payments accrue "
+    "interest at one percent per month. The supplier warrants the equipment against defects for two years "
+    "and will repair or replace faulty units at no cost. Either party may terminate the agreement with "
+    "ninety days written notice, and disputes are settled by arbitration in the customer's home country."
+)
+
+def lcs_length(a, b):
+    previous = [0] * (len(b) + 1)
+    for token_a in a:
+        current = [0]
+        for j, token_b in enumerate(b):
+            current.append(previous[j] + 1 if token_a == token_b else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+def rouge_l(reference, candidate):
+    reference, candidate = reference.lower().split(), candidate.lower().split()
+    if not reference or not candidate:
+        return 0.0
+    lcs = lcs_length(reference, candidate)
+    if not lcs:
+        return 0.0
+    precision, recall = lcs / len(candidate), lcs / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+def summarize_all(summarizer, texts):
+    start = time.perf_counter()
+    summaries = [
+        summarizer(text, max_length=SUMMARIZER_CONFIG['max_length'], min_length=SUMMARIZER_CONFIG['min_length'],
+                   do_sample=False, truncation=True)[0]['summary_text']
+        for text in texts
+    ]
+    return summaries, (time.perf_counter() - start) / len(texts)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare int8 and fp32 summarizer output')
+    parser.add_argument('files', nargs='*', help='text files to summarize (a built-in sample if none)')
+    parser.add_argument('--min-score', type=float, default=0.6)
+    args = parser.parse_args()
+
+    texts = []
+    for path in args.files:
+        with open(path, encoding='utf-8') as f:
+            texts.append(f.read())
+    texts = texts or [SAMPLE_TEXT]
+
+    reference, fp32_latency = summarize_all(build_summarizer(quantize=False), texts)
+    candidate, int8_latency = summarize_all(build_summarizer(quantize=True), texts)
+
+    scores = [rouge_l(ref, cand) for ref, cand in zip(reference, candidate)]
+    for name, score in zip(args.files or ['<sample>'], scores):
+        print(f"{name}: ROUGE-L F1 {score:.3f}")
+    average = sum(scores) / len(scores)
+    print(f"average ROUGE-L F1 {average:.3f}")
+    print(f"latency per document: fp32 {fp32_latency:.2f}s, int8 {int8_latency:.2f}s")
+
+    return 0 if average >= args.min_score else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# backend/search_index.py
+
+import html
+import os
+import re
+import sqlite3
+import threading
+
+SEARCH_CONFIG = {
+    'path': os.environ.get(
+        'DMS_SEARCH_INDEX',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'search', 'documents.sqlite3')
+    ),
+    # BM25 column weights: filename matches count more than body matches
+    'filename_weight': 2.0,
+    'content_weight': 1.0,
+    'snippet_tokens': 16,
+}
+
+# Private-use markers placed by FTS5 around matches; swapped for <mark> after escaping
+_MATCH_START = '\u0002'
+_MATCH_END = '\u0003'
+
+_TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+def build_match_query(company_id, query):
+    """
+    Turns free text into an FTS5 query: every word must match, the last one as a
+    prefix. The company is an indexed column, so scoping uses the index too.
+    """
+    terms = _TERM_PATTERN.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return f'company : "c{int(company_id)}" AND ({" ".join(quoted)})'
+
+class SearchIndex:
+    """Embedded inverted index (SQLite FTS5) over the text extracted from documents."""
+
+    def __init__(self, path, filename_weight, content_weight, snippet_tokens):
+        self.path = path
+        self.filename_weight = filename_weight
+        self.content_weight = content_weight
+        self.snippet_tokens = snippet_tokens
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._initialized = False
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            # WAL lets searches run while another thread or worker is indexing
+            connection.execute("PRAGMA journal_mode=WAL")
+            if not self._initialized:
+                connection.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS document_text USING fts5(
+                        company, filename, content,
+                        tokenize = 'unicode61 remove_diacritics 2'
+                    )
+                """)
+                connection.commit()
+                self._initialized = True
+            self._local.connection = connection
+        return connection
+
+    def index_document(self, document_id, company_id, filename, text):
+        """Adds or replaces a document; the FTS rowid is the document id."""
+        with self._write_lock:
+            connection = self.connection
+            connection.execute("DELETE FROM document_text WHERE rowid = ?", (document_id,))
+            connection.execute(
+                "INSERT INTO document_text (rowid, company, filename, content) VALUES (?, ?, ?, ?)",
+                (document_id, f"c{int(company_id)}", filename, text or "")
+            )
+            connection.commit()
+
+    def index_documents(self, documents):
+        """Adds or replaces many (document_id, company_id, filename, text) rows in one transaction."""
+        rows = [(document_id, f"c{int(company_id)}", filename, text or "")
+                for document_id, company_id, filename, text in documents]
+        with self._write_lock:
+            connection = self.connection
+            try:
+                connection.executemany("DELETE FROM document_text WHERE rowid = ?", [(row[0],) for row in rows])
+                connection.executemany(
+                    "INSERT INTO document_text (rowid, company, filename, content) VALUES (?, ?, ?, ?)", rows
+                )
+                connection.commit()
+            except sqlite3.Error:
+                # Never leave half a batch pending for the next commit on this thread
+                connection.rollback()
+                raise
+
+    def remove_document(self, document_id):
+        with self._write_lock:
+            connection = self.connection
+            connection.execute("DELETE FROM document_text WHERE rowid = ?", (document_id,))
+            connection.commit()
+
+    def reconcile(self, results, filenames):
+        """
+        Brings search hits in line with MySQL, given {document_id: filename} of
+        the hits that still exist there. Documents can disappear without a call
+        to remove_document (a user or company delete cascades to them) or be
+        renamed: their hits are dropped or take the current filename, and the
+        index is corrected so the next search does not find them again.
+        """
+        stale = [(result['document_id'],) for result in results if result['document_id'] not in filenames]
+        renamed = [(filenames[result['document_id']], result['document_id']) for result in results
+                   if result['document_id'] in filenames and filenames[result['document_id']] != result['filename']]
+        if stale or renamed:
+            with self._write_lock:
+                connection = self.connection
+                connection.executemany("DELETE FROM document_text WHERE rowid = ?", stale)
+                connection.executemany("UPDATE document_text SET filename = ? WHERE rowid = ?", renamed)
+                connection.commit()
+        return [dict(result, filename=filenames[result['document_id']])
+                for result in results if result['document_id'] in filenames]
+
+    def document_texts(self, document_ids):
+        """Indexed text of the given documents as {document_id: text}."""
+        if not document_ids:
+            return {}
+        placeholders = ', '.join('?' * len(document_ids))
+        rows = self.connection.execute(
+            f"SELECT rowid, content FROM document_text WHERE rowid IN ({placeholders})", list(document_ids)
+        ).fetchall()
+        return {rowid: content for rowid, content in rows}
+
+    def search(self, company_id, query, limit=20, offset=0):
+        """Returns the best matches by BM25 with a highlighted snippet of the content."""
+        match = build_match_query(company_id, query)
+        if not match:
+            return []
+
+        rows = self.connection.execute(f"""
+            SELECT rowid AS document_id, filename,
+                   bm25(document_text, 0.0, ?, ?) AS score,
+                   snippet(document_text, 2, ?, ?, '...', {int(self.snippet_tokens)}) AS snippet
+            FROM document_text
+            WHERE document_text MATCH ?
+            ORDER BY score
+            LIMIT ? OFFSET ?
+        """, (self.filename_weight, self.content_weight, _MATCH_START, _MATCH_END,
+              match, limit, offset)).fetchall()
+
+        return [
+            {
+                "document_id": row['document_id'],
+                "filename": row['filename'],
+                # bm25() is lower-is-better; flip it so clients can sort descending
+                "score": -row['score'],
+                "snippet": html.escape(row['snippet'])
+                    .replace(_MATCH_START, '<mark>')
+                    .replace(_MATCH_END, '</mark>')
+            }
+            for row in rows
+        ]
+
+search_index = SearchIndex(**SEARCH_CONFIG)
@@ -0,0 +1,90 @@
+# backend/storage.py
+
+import hashlib
+import os
+import tempfile
+
+STORAGE_CONFIG = {
+    'root': os.environ.get(
+        'DMS_STORAGE_ROOT',
+        # Earlier deployments kept uploads under DMS_UPLOAD_FOLDER
+        os.environ.get('DMS_UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
+    ),
+    'chunk_size': int(os.environ.get('DMS_STORAGE_CHUNK_SIZE', 1024 * 1024)),
+}
+
+class FileStore:
+    """
+    Content-addressed file storage: a file lives at <root>/ab/cd/<sha256>, so
+    identical uploads are stored once. Documents keep the relative path.
+    """
+
+    def __init__(self, root, chunk_size):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def relative_path(self, digest):
+        return os.path.join(digest[:2], digest[2:4], digest)
+
+    def path(self, relative_path):
+        return os.path.join(self.root, relative_path)
+
+    def save_stream(self, stream):
+        """Stores the stream under its digest. Returns (digest, size, relative_path)."""
+        digest, size, relative_path, tmp_path = self.stage_stream(stream)
+        self.publish(tmp_path, relative_path)
+        return digest, size, relative_path
+
+    def stage_stream(self, stream):
+        """
+        Copies the stream to a temporary file chunk by chunk while hashing it, so
+        memory use does not depend on the file size. Returns (digest, size,
+        relative_path, tmp_path); publish() or discard() the temporary file.
+        """
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+
+            digest = digest.hexdigest()
+            return digest, size, self.relative_path(digest), tmp_path
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+
+    def publish(self, tmp_path, relative_path):
+        """
+        Moves a staged file to its content address. Uploads call this once their
+        document row is committed: a delete that found no other document using
+        the file has unlinked it by then, and the file is written again.
+        """
+        final_path = self.path(relative_path)
+        if os.path.exists(final_path):
+            # Same content is already stored
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+
+    def discard(self, tmp_path):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    def delete(self, relative_path):
+        try:
+            os.remove(self.path(relative_path))
+        except FileNotFoundError:
+            pass
+
+file_store = FileStore(**STORAGE_CONFIG)
@@ -0,0 +1,78 @@
+# backend/tests/conftest.py
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Before any backend module is imported: their configuration is read at import time
+WORK_DIR = tempfile.mkdtemp(prefix='dms-tests-')
+atexit.register(shutil.rmtree, WORK_DIR, ignore_errors=True)
+os.environ.update({
+    'DMS_SUMMARY_MODEL': 'stub',
+    'DMS_SUMMARY_STUB_BATCH_SECONDS': '0',
+    'DMS_STORAGE_ROOT': os.path.join(WORK_DIR, 'uploads'),
+    'DMS_SEARCH_INDEX': os.path.join(WORK_DIR, 'search', 'documents.sqlite3'),
+    'DMS_EXTRACTION_CACHE_DIR': os.path.join(WORK_DIR, 'cache', 'extraction'),
+    'DMS_HISTORY_SPILL_DIR': os.path.join(WORK_DIR, 'cache', 'history'),
+    'DMS_CLASSIFIER_MODEL': os.path.join(WORK_DIR, 'models', 'document_type.npz'),
+})
+sys.path.insert(0, BACKEND_DIR)
+
+@pytest.fixture
+def extraction_cache(tmp_path, monkeypatch):
+    """An empty extraction cache in place of the shared one."""
+    import jobs
+    import pdf_parser
+    from extraction_cache import ExtractionCache
+
+    cache = ExtractionCache(str(tmp_path / 'extraction'), max_bytes=1024 * 1024)
+    monkeypatch.setattr(pdf_parser, 'extraction_cache', cache)
+    monkeypatch.setattr(jobs, 'extraction_cache', cache)
+    return cache
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers():
+    """Authorization headers for a token with the given claims."""
+    from flask_jwt_extended import create_access_token
+    from app import app
+
+    def headers(user_id=2, role='user', username='alice'):
+        with app.app_context():
+            token = create_access_token(identity=username, additional_claims={
+                "id": user_id, "role": role, "username": username
+            })
+        return {'Authorization': f"Bearer {token}"}
+    return headers
+
+@pytest.fixture
+def search_index(tmp_path, monkeypatch):
+    """An empty search index in place of the shared one."""
+    import app
+    import bulk_import
+    from search_index import SEARCH_CONFIG, SearchIndex
+
+    index = SearchIndex(**dict(SEARCH_CONFIG, path=str(tmp_path / 'search' / 'documents.sqlite3')))
+    monkeypatch.setattr(app, 'search_index', index)
+    monkeypatch.setattr(bulk_import, 'search_index', index)
+    return index
+
+@pytest.fixture
+def file_store(tmp_path, monkeypatch):
+    """An empty file store in place of the shared one."""
+    import app
+    from storage import STORAGE_CONFIG, FileStore
+
+    store = FileStore(**dict(STORAGE_CONFIG, root=str(tmp_path / 'uploads')))
+    monkeypatch.setattr(app, 'file_store', store)
+    return store
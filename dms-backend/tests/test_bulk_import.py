@@ -0,0 +1,94 @@
+# backend/tests/test_bulk_import.py
+
+import sqlite3
+from contextlib import contextmanager
+
+from bulk_import import DocumentImporter, validate_record
+from db import DatabaseManager
+
+class FakeCursor:
+    """Answers the id lookup of bulk_create_documents with non-consecutive ids."""
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.executed = []
+
+    def executemany(self, query, rows):
+        self.executed.append((' '.join(query.split()), rows))
+
+    def execute(self, query, params):
+        self.executed.append((' '.join(query.split()), params))
+
+    def fetchall(self):
+        return [{'id': document_id} for document_id in self.ids]
+
+class FakeDatabase:
+    def __init__(self, folders):
+        self.folders = folders
+        self.folder_lookups = []
+        self.created = []
+
+    def get_folder_company_id(self, folder_id):
+        self.folder_lookups.append(folder_id)
+        return self.folders.get(folder_id)
+
+    def bulk_create_documents(self, owner_id, company_id, documents):
+        first_id = 100 + len(self.created)
+        self.created.extend(documents)
+        return list(range(first_id, first_id + len(documents)))
+
+def test_bulk_create_documents_uses_the_ids_of_its_batch(monkeypatch):
+    manager = DatabaseManager.__new__(DatabaseManager)
+    cursor = FakeCursor([10, 12, 15])
+
+    @contextmanager
+    def transaction():
+        yield cursor
+
+    monkeypatch.setattr(manager, 'transaction', transaction, raising=False)
+    monkeypatch.setattr(manager, 'bump_versions', lambda *scopes: None, raising=False)
+    documents = [{'filename': f"{i}.pdf", 'document_type': 'invoice'} for i in range(3)]
+
+    assert manager.bulk_create_documents(1, 3, documents) == [10, 12, 15]
+    batch = cursor.executed[0][1][0][-1]
+    assert cursor.executed[1][1] == (batch,)
+    assert [row[0] for row in cursor.executed[2][1]] == [10, 12, 15]
+
+def test_validate_record_rejects_folders_of_other_companies():
+    record = {'filename': 'a.pdf', 'document_type': 'invoice', 'folder_id': '7'}
+
+    assert validate_record(record, lambda folder_id: folder_id != 7) == (None, "Folder not found in this company")
+    document, error = validate_record(record, lambda folder_id: True)
+    assert error is None and document['folder_id'] == 7
+
+def test_importer_looks_each_folder_up_once_and_skips_foreign_ones(search_index):
+    db = FakeDatabase({1: 3, 2: 4})
+    importer = DocumentImporter(db, owner_id=1, company_id=3, batch_size=10)
+    records = [(line, {'filename': f"{line}.pdf", 'document_type': 'invoice', 'folder_id': folder_id})
+               for line, folder_id in enumerate([1, 2, 1, None, 2, 9], start=1)]
+
+    result = importer.run(iter(records))
+
+    assert result['imported'] == 3
+    assert [error['line'] for error in result['errors']] == [2, 5, 6]
+    assert db.folder_lookups == [1, 2, 9]
+    assert sorted(hit['document_id'] for hit in search_index.search(3, 'pdf')) == [100, 101, 102]
+
+def test_index_errors_keep_the_committed_rows_imported(search_index, monkeypatch):
+    db = FakeDatabase({})
+    importer = DocumentImporter(db, owner_id=1, company_id=3, batch_size=2)
+    records = [(line, {'filename': f"{line}.pdf", 'document_type': 'invoice'}) for line in range(1, 6)]
+    index_documents = search_index.index_documents
+
+    def fail_second_batch(documents):
+        documents = list(documents)
+        if documents[0][0] == 102:
+            raise sqlite3.OperationalError("database is locked")
+        index_documents(documents)
+    monkeypatch.setattr(search_index, 'index_documents', fail_second_batch)
+
+    result = importer.run(iter(records))
+
+    assert result['imported'] == 5 and result['failed'] == 0
+    assert result['index_errors'] == [{"lines": [3, 4], "document_ids": [102, 103], "msg": "database is locked"}]
+    assert sorted(hit['document_id'] for hit in search_index.search(3, 'pdf')) == [100, 101, 104]
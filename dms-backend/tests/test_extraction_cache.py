@@ -0,0 +1,79 @@
+# backend/tests/test_extraction_cache.py
+
+import threading
+
+import pytest
+
+import jobs
+import pdf_parser
+from benchmarks.generators import text_to_pdf
+from extraction_cache import file_digest
+
+CACHED = {"summary": "Cached summary.", "raw_text": "Cached text.", "invoice_fields": None}
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / 'report.pdf'
+    path.write_bytes(text_to_pdf("Quarterly review\n\nBudget schedule delivery contract review team."))
+    return str(path)
+
+@pytest.fixture
+def model_calls(monkeypatch):
+    """Records every call that would load or run the summarization model, or extract text."""
+    calls = []
+
+    def recorder(name, function):
+        def wrapper(*args, **kwargs):
+            calls.append(name)
+            return function(*args, **kwargs)
+        return wrapper
+
+    for name in ('get_summarizer', 'summarize_text', 'extract_text_from_pdf'):
+        monkeypatch.setattr(pdf_parser, name, recorder(name, getattr(pdf_parser, name)))
+    return calls
+
+def test_extract_data_from_pdf_cache_hit_never_calls_the_model(extraction_cache, pdf_path, model_calls):
+    extraction_cache.put(extraction_cache.key(file_digest(pdf_path), pdf_parser.engine_version()), CACHED)
+
+    assert pdf_parser.extract_data_from_pdf(pdf_path) == CACHED
+    assert model_calls == []
+    assert extraction_cache.stats()['hits'] == 1
+
+def test_extract_data_from_pdf_cache_miss_calls_the_model_and_stores_the_result(extraction_cache, pdf_path,
+                                                                               model_calls):
+    result = pdf_parser.extract_data_from_pdf(pdf_path)
+
+    assert 'summarize_text' in model_calls
+    assert result['raw_text'].startswith('Quarterly review')
+    assert extraction_cache.get(extraction_cache.key(file_digest(pdf_path), pdf_parser.engine_version())) == result
+
+def test_job_queue_cache_hit_never_reaches_a_worker_or_the_model(extraction_cache, pdf_path, model_calls):
+    extraction_cache.put(extraction_cache.key(file_digest(pdf_path), jobs.engine_version('pdf')), CACHED)
+    finished = []
+    queue = jobs.JobQueue(workers=1, max_queue_depth=4, max_finished_jobs=10,
+                          on_complete=lambda job, result: finished.append(
+                              (job['status'], result, threading.current_thread().name)))
+
+    job_id = queue.submit(7, pdf_path, 'pdf', job_id='cached-job', company_id=3)
+    # Results are stored on the completion threads
+    queue.shutdown()
+
+    assert job_id == 'cached-job'
+    assert finished == [('done', CACHED, 'job-complete_0')]
+    assert queue.status(job_id)['status'] == 'done'
+    assert queue.stats()['pending'] == 0
+    assert queue._executor is None
+    assert model_calls == []
+
+def test_pdf_engine_version_covers_the_ocr_fallback_settings(monkeypatch):
+    import ocr_utils
+    monkeypatch.setattr(ocr_utils, 'tesseract_version', lambda: 'tesseract-5.3.0')
+    versions = set()
+    for resolution in (200, 300):
+        monkeypatch.setitem(ocr_utils.OCR_CONFIG, 'pdf_resolution', resolution)
+        pdf_parser.engine_version.cache_clear()
+        versions.add(pdf_parser.engine_version())
+    pdf_parser.engine_version.cache_clear()
+
+    assert len(versions) == 2
+    assert all('tesseract-5.3.0' in version for version in versions)
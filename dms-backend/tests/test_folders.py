@@ -0,0 +1,32 @@
+# backend/tests/test_folders.py
+
+import pytest
+
+import app
+
+@pytest.fixture
+def foreign_folders(monkeypatch):
+    """Folder 7 under folder 5, both in company 9, which user 2 does not belong to."""
+    folders = [
+        {'id': 5, 'name': 'Contracts', 'parent_id': None, 'company_id': 9, 'depth': 0, 'document_count': 1},
+        {'id': 7, 'name': 'Layoffs', 'parent_id': 5, 'company_id': 9, 'depth': 1, 'document_count': 2},
+    ]
+    monkeypatch.setattr(app.db, 'user_has_company', lambda user_id, company_id: int(company_id) != 9)
+    monkeypatch.setattr(app.db, 'get_folder_ancestors',
+                        lambda folder_id: [dict(f) for f in folders if f['id'] <= folder_id])
+    monkeypatch.setattr(app.db, 'get_folder_subtree',
+                        lambda folder_id: [dict(f) for f in folders if f['id'] >= folder_id])
+    return folders
+
+def test_the_path_of_a_foreign_folder_is_denied(client, auth_headers, foreign_folders):
+    response = client.get('/folders/7/path', headers=auth_headers())
+
+    assert response.status_code == 403
+    assert 'Layoffs' not in response.get_data(as_text=True)
+    assert client.get('/folders/7/path', headers=auth_headers(user_id=1, role='admin')).status_code == 200
+
+def test_the_subtree_of_a_foreign_folder_is_denied(client, auth_headers, foreign_folders):
+    response = client.get('/folders/tree?folder_id=5', headers=auth_headers())
+
+    assert response.status_code == 403
+    assert 'Layoffs' not in response.get_data(as_text=True)
@@ -0,0 +1,168 @@
+# backend/tests/test_history_writer.py
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import pytest
+from mysql.connector import DataError, InterfaceError, ProgrammingError
+
+import history_writer
+from history_writer import HistoryWriter
+
+@pytest.fixture
+def make_writer(tmp_path):
+    """HistoryWriters on one spill directory whose INSERTs go to `inserted`, or raise what `fail` returns."""
+    inserted = []
+
+    def make(fail=lambda events: None, **config):
+        def insert(events):
+            error = fail(events)
+            if error:
+                raise error
+            inserted.extend(events)
+
+        settings = dict(enabled=True, max_batch=1000, flush_interval=3600, spill_directory=str(tmp_path),
+                        fsync=False, max_attempts=3, max_sealed=100, insert=insert)
+        return HistoryWriter(**dict(settings, **config))
+    return make, inserted
+
+def spill_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.log'))
+
+def test_orphans_of_an_earlier_process_with_the_same_pid_are_recovered(make_writer, tmp_path):
+    make, inserted = make_writer
+    crashed = make()
+    crashed.add(1, 2, 'Document viewed')
+    # The process died without flushing; a new one comes up with the same pid
+    crashed._pid = None
+
+    writer = make()
+    writer.add(1, 2, 'Document moved')
+    # A second start never reuses a name, so the new file did not append to the old one
+    assert len(spill_files(tmp_path)) == 2
+
+    assert writer.flush() == 2
+    assert [event['action'] for event in inserted] == ['Document viewed', 'Document moved']
+    assert writer.stats()['recovered'] == 1
+
+def test_spill_files_from_before_start_ids_are_recovered(make_writer, tmp_path):
+    make, inserted = make_writer
+    event = {'document_id': 1, 'user_id': 2, 'action': 'Document viewed', 'timestamp': '2026-10-01 12:00:00'}
+    (tmp_path / f"{os.getpid()}-1.log").write_text(json.dumps(event) + '\n')
+
+    writer = make()
+    writer.add(1, 2, 'Document moved')
+    writer.flush()
+
+    assert [event['action'] for event in inserted] == ['Document viewed', 'Document moved']
+    assert all(isinstance(event['timestamp'], int) for event in inserted)
+
+def test_timestamps_are_unix_times(make_writer):
+    make, inserted = make_writer
+    writer = make()
+
+    before = int(time.time())
+    writer.add(1, 2, 'Document viewed')
+    writer.flush()
+
+    assert before <= inserted[0]['timestamp'] <= time.time()
+
+def test_a_failing_segment_is_dead_lettered_without_holding_back_the_others(make_writer, tmp_path):
+    make, inserted = make_writer
+    writer = make(fail=lambda events: DataError("Data too long") if any(e['action'] == 'bad' for e in events)
+                  else None)
+    writer.add(1, 2, 'bad')
+    assert writer.flush() == 0
+
+    writer.add(1, 2, 'Document viewed')
+    assert writer.flush() == 1
+    assert writer.flush() == 0
+
+    assert [event['action'] for event in inserted] == ['Document viewed']
+    dead = spill_files(tmp_path / 'dead-letter')
+    assert len(dead) == 1 and 'bad' in (tmp_path / 'dead-letter' / dead[0]).read_text()
+    assert writer.stats()['dead_lettered'] == 1 and writer.stats()['buffered'] == 0
+
+    # Fixed: the replay writes it
+    writer.insert = lambda events: inserted.extend(events)
+    assert writer.replay_dead_letter() == 1
+    assert spill_files(tmp_path / 'dead-letter') == []
+
+def test_an_unreachable_database_costs_no_attempts_until_the_cap(make_writer, tmp_path):
+    make, inserted = make_writer
+    writer = make(fail=lambda events: InterfaceError("Can't connect to MySQL server"), max_sealed=2)
+    for i in range(5):
+        writer.add(1, 2, f"event {i}")
+        writer.flush()
+        assert all(segment['attempts'] == 0 for segment in writer._sealed)
+
+    # Only the newest max_sealed files are still waiting; the older ones were set aside
+    assert writer.stats()['buffered'] == 2
+    assert len(spill_files(tmp_path / 'dead-letter')) == 3
+
+    writer.insert = lambda events: inserted.extend(events)
+    assert writer.flush() == 2
+    assert [event['action'] for event in inserted] == ['event 3', 'event 4']
+
+def test_other_errors_count_as_attempts(make_writer, tmp_path):
+    make, _ = make_writer
+    writer = make(fail=lambda events: ProgrammingError("Unknown column"))
+    writer.add(1, 2, 'Document viewed')
+    for _ in range(3):
+        writer.flush()
+
+    assert writer.stats()['buffered'] == 0
+    assert len(spill_files(tmp_path / 'dead-letter')) == 1
+
+@pytest.fixture
+def history_db(monkeypatch):
+    """documents and document_history in sqlite behind the transaction() and execute_query() of db."""
+    import db as db_module
+
+    connection = sqlite3.connect(':memory:')
+    connection.create_function('FROM_UNIXTIME', 1, lambda unix_time: unix_time)
+    connection.executescript("""
+        CREATE TABLE documents (id INTEGER PRIMARY KEY);
+        CREATE TABLE document_history (document_id INTEGER, user_id INTEGER, action TEXT, timestamp INTEGER);
+    """)
+
+    class Cursor:
+        def __init__(self):
+            self._cursor = connection.cursor()
+
+        def execute(self, query, params=()):
+            self._cursor.execute(query.replace('%s', '?'), params)
+
+        @property
+        def rowcount(self):
+            return self._cursor.rowcount
+
+    @contextmanager
+    def transaction():
+        yield Cursor()
+        connection.commit()
+
+    def execute_query(query, params=None, fetch=False):
+        Cursor().execute(query, params or ())
+        connection.commit()
+
+    monkeypatch.setattr(db_module.db, 'transaction', transaction)
+    monkeypatch.setattr(db_module.db, 'execute_query', execute_query)
+    return connection
+
+def test_events_of_a_deleted_document_are_skipped(make_writer, history_db):
+    make, _ = make_writer
+    history_db.executemany("INSERT INTO documents (id) VALUES (?)", [(1,), (2,)])
+    writer = make(insert=history_writer.insert_history_rows)
+    writer.add(1, 2, 'Document viewed')
+    writer.add(2, 2, 'Document viewed')
+
+    # Document 2 is deleted while its event is still buffered
+    history_db.execute("DELETE FROM documents WHERE id = 2")
+    writer.flush()
+
+    assert history_db.execute("SELECT document_id FROM document_history").fetchall() == [(1,)]
+    assert writer.stats()['buffered'] == 0 and writer.stats()['dead_lettered'] == 0
@@ -0,0 +1,68 @@
+# backend/tests/test_http_cache.py
+
+import pytest
+from mysql.connector import errorcode
+from mysql.connector.errors import ProgrammingError
+
+from db import db
+
+VERSIONS_QUERY = 'SELECT scope, version FROM cache_versions'
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Every SQL statement run, answered from a version table and one company membership."""
+    statements = []
+    versions = {'documents:3': 5, 'folders:3': 2, 'users': 9}
+
+    def execute_query(query, params=None, fetch=False):
+        statements.append(' '.join(query.split()))
+        if 'FROM cache_versions' in query:
+            return [{'scope': scope, 'version': versions[scope]} for scope in params if scope in versions]
+        if 'user_companies' in query:
+            return [{'id': 3, 'name': 'Acme'}]
+        return []
+
+    monkeypatch.setattr(db, 'execute_query', execute_query)
+    db.user_companies_cache.invalidate(2, publish=False)
+    return statements, versions
+
+def test_repeated_list_polls_answer_304_after_only_the_version_lookup(client, auth_headers, queries):
+    statements, versions = queries
+    headers = auth_headers(user_id=2)
+    url = '/documents?company_id=3&limit=50'
+
+    first = client.get(url, headers=headers)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    statements.clear()
+    for _ in range(5):
+        response = client.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['ETag'] == etag
+    assert len(statements) == 5
+    assert all(statement.startswith(VERSIONS_QUERY) for statement in statements)
+
+    # A write moves the stamp on, and the next poll gets the new list
+    versions['documents:3'] += 1
+    response = client.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_bump_versions_is_a_no_op_before_cache_versions_exists(monkeypatch):
+    def execute_query(query, params=None, fetch=False):
+        raise ProgrammingError(msg="Table 'dms_db.cache_versions' doesn't exist", errno=errorcode.ER_NO_SUCH_TABLE)
+
+    monkeypatch.setattr(db, 'execute_query', execute_query)
+
+    db.bump_versions('users')
+
+def test_bump_versions_raises_other_errors(monkeypatch):
+    def execute_query(query, params=None, fetch=False):
+        raise ProgrammingError(msg="Access denied", errno=errorcode.ER_TABLEACCESS_DENIED_ERROR)
+
+    monkeypatch.setattr(db, 'execute_query', execute_query)
+
+    with pytest.raises(ProgrammingError):
+        db.bump_versions('users')
@@ -0,0 +1,20 @@
+# backend/tests/test_invoice_extractor.py
+
+from invoice_extractor import extract_invoice_fields
+
+def invoice(*lines):
+    return extract_invoice_fields('\n'.join(('ACME GmbH', 'Invoice No: INV-2025-001', 'Date: 14.03.2025') + lines))
+
+def test_a_total_including_vat_is_the_total():
+    fields = invoice('Net amount: 100,00', 'VAT 19%: 19,00', 'Total incl. VAT: 119,00')
+
+    assert (fields['net_amount'], fields['vat_amount'], fields['total_amount']) == ('100.00', '19.00', '119.00')
+
+def test_a_tax_id_is_not_a_vat_amount():
+    fields = invoice('Tax ID: 12-3456789', 'VAT Reg. No: 123456789', 'Net amount: 100,00', 'Gross amount: 119,00')
+
+    assert (fields['net_amount'], fields['vat_amount'], fields['total_amount']) == ('100.00', None, '119.00')
+
+def test_the_due_date_is_not_the_invoice_date():
+    for lines in (['Due date: 13.04.2025', 'Date: 14.03.2025'], ['Delivery date: 01.03.2025', 'Invoice date: 14.03.2025']):
+        assert extract_invoice_fields('\n'.join(['ACME GmbH'] + lines + ['Total: 119,00']))['invoice_date'] == '2025-03-14'
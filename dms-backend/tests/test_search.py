@@ -0,0 +1,57 @@
+# backend/tests/test_search.py
+
+import app
+
+def test_reconcile_drops_deleted_documents_and_takes_current_filenames(search_index):
+    search_index.index_documents([
+        (1, 3, 'kept.pdf', 'quarterly budget review'),
+        (2, 3, 'deleted.pdf', 'quarterly budget review'),
+        (3, 3, 'old-name.pdf', 'quarterly budget review'),
+    ])
+    results = search_index.search(3, 'budget')
+
+    results = search_index.reconcile(results, {1: 'kept.pdf', 3: 'new-name.pdf'})
+
+    assert sorted((result['document_id'], result['filename']) for result in results) == [
+        (1, 'kept.pdf'), (3, 'new-name.pdf')
+    ]
+    # The index was corrected too
+    assert sorted(result['document_id'] for result in search_index.search(3, 'budget')) == [1, 3]
+    assert [result['document_id'] for result in search_index.search(3, 'new')] == [3]
+
+def test_search_drops_hits_whose_documents_no_longer_exist(client, auth_headers, search_index, monkeypatch):
+    search_index.index_documents([(1, 3, 'a.pdf', 'supplier contract'), (2, 3, 'b.pdf', 'supplier contract')])
+    monkeypatch.setattr(app.db, 'user_has_company', lambda user_id, company_id: True)
+    # Document 2 went with a cascade delete that never touched the index
+    monkeypatch.setattr(app.db, 'get_document_filenames',
+                        lambda company_id, document_ids: {1: 'a.pdf'} if 1 in document_ids else {})
+
+    response = client.get('/documents/search?company_id=3&q=supplier', headers=auth_headers())
+
+    assert response.status_code == 200
+    assert [result['document_id'] for result in response.get_json()['results']] == [1]
+
+def test_created_documents_are_searchable_by_filename(client, auth_headers, search_index, monkeypatch):
+    monkeypatch.setattr(app.db, 'user_has_company', lambda user_id, company_id: True)
+    monkeypatch.setattr(app.db, 'create_document', lambda **kwargs: 42)
+    monkeypatch.setattr(app.db, 'add_document_history', lambda *args: None)
+
+    response = client.post('/documents', headers=auth_headers(), json={
+        'company_id': 3, 'filename': 'warehouse-lease.pdf', 'document_type': 'non_invoice'
+    })
+
+    assert response.status_code == 201
+    assert [result['document_id'] for result in search_index.search(3, 'warehouse')] == [42]
+
+def test_delete_document_checks_company_access(client, auth_headers, monkeypatch):
+    deleted = []
+    monkeypatch.setattr(app.db, 'get_document_by_id', lambda document_id: {
+        'id': document_id, 'company_id': 9, 'file_path': None
+    })
+    monkeypatch.setattr(app.db, 'user_has_company', lambda user_id, company_id: company_id != 9)
+    monkeypatch.setattr(app.db, 'delete_document', lambda document_id, **kwargs: deleted.append(document_id) or True)
+
+    response = client.delete('/documents/5', headers=auth_headers())
+
+    assert response.status_code == 403
+    assert deleted == []
@@ -0,0 +1,214 @@
+# backend/tests/test_streaming.py
+
+import asyncio
+import hashlib
+import io
+import os
+import tracemalloc
+
+import pytest
+
+import app
+
+# 2 GiB by default; DMS_TEST_STREAM_BYTES makes a quick run possible
+BODY_SIZE = int(os.environ.get('DMS_TEST_STREAM_BYTES', 2 * 1024 ** 3))
+# Every chunk crosses between the event loop and a thread, which is slow; a
+# buffering adapter would still show up as a peak of twice this size
+ASGI_BODY_SIZE = min(BODY_SIZE, 256 * 1024 ** 2)
+# Peak Python allocations allowed while a body of any size goes through
+MAX_PEAK_BYTES = 32 * 1024 * 1024
+
+class GeneratedBody(io.RawIOBase):
+    """
+    `size` bytes produced as they are read, so the test itself never holds the
+    body. Seekable, because the test client measures its input by seeking.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+    PATTERN = bytes(range(256)) * (CHUNK_SIZE // 256 + 1)
+
+    def __init__(self, size):
+        self.size = size
+        self.position = 0
+        self.digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.position = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence] + offset
+        return self.position
+
+    def readinto(self, buffer):
+        start = self.position % 256
+        size = min(len(buffer), self.CHUNK_SIZE, self.size - self.position)
+        chunk = memoryview(self.PATTERN)[start:start + size]
+        buffer[:size] = chunk
+        self.position += size
+        self.digest.update(chunk)
+        return size
+
+class FakeJobQueue:
+    def __init__(self):
+        self.submitted = []
+
+    def is_full(self):
+        return False
+
+    def submit(self, document_id, file_path, kind, **kwargs):
+        self.submitted.append((document_id, file_path, kind))
+        return kwargs.get('job_id')
+
+def traced_peak(function):
+    tracemalloc.start()
+    try:
+        result = function()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+@pytest.fixture
+def stored_document(file_store, monkeypatch):
+    """Fakes the job queue and the document rows; returns the fields of the one document created."""
+    created = {}
+
+    def create_document(**kwargs):
+        created.update(kwargs, id=11)
+        return 11
+
+    monkeypatch.setattr(app, 'job_queue', FakeJobQueue())
+    monkeypatch.setattr(app.db, 'user_has_company', lambda user_id, company_id: True)
+    monkeypatch.setattr(app.db, 'create_document', create_document)
+    monkeypatch.setattr(app.db, 'add_document_history', lambda *args: None)
+    monkeypatch.setattr(app.db, 'get_document_by_id', lambda document_id: dict(created))
+    return created
+
+def test_upload_and_download_of_a_large_file_use_constant_memory(client, auth_headers, file_store, stored_document):
+    headers = auth_headers()
+
+    body = GeneratedBody(BODY_SIZE)
+    response, upload_peak = traced_peak(lambda: client.post(
+        '/documents/upload?company_id=3&filename=large.pdf&document_type=non_invoice',
+        input_stream=body, content_length=BODY_SIZE, content_type='application/pdf', headers=headers
+    ))
+
+    assert response.status_code == 202, response.get_json()
+    assert stored_document['file_size'] == BODY_SIZE
+    assert stored_document['file_path'] == file_store.relative_path(body.digest.hexdigest())
+    assert upload_peak < MAX_PEAK_BYTES
+
+    def download():
+        response = client.get('/documents/11/download', headers=headers, buffered=False)
+        digest, size = hashlib.sha256(), 0
+        for chunk in response.response:
+            digest.update(chunk)
+            size += len(chunk)
+        response.close()
+        return response.status_code, size, digest.hexdigest()
+
+    (status, size, digest), download_peak = traced_peak(download)
+
+    assert (status, size, digest) == (200, BODY_SIZE, body.digest.hexdigest())
+    assert download_peak < MAX_PEAK_BYTES
+
+def asgi_request(asgi_app, method, path, headers, body=None, size=0):
+    """
+    Calls an ASGI app the way a server would, feeding `body` in 1 MiB chunks.
+    Returns the status and the size and digest of the streamed response body.
+    """
+    result = {'status': None, 'size': 0, 'digest': hashlib.sha256()}
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path.partition('?')[0], 'raw_path': path.partition('?')[0].encode('ascii'), 'root_path': '',
+        'query_string': path.partition('?')[2].encode('ascii'),
+        'headers': [(b'host', b'testserver'), (b'content-length', str(size).encode('ascii'))]
+                   + [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+
+    async def receive():
+        chunk = bytearray(GeneratedBody.CHUNK_SIZE)
+        read = body.readinto(chunk) if body else 0
+        return {'type': 'http.request', 'body': bytes(chunk[:read]),
+                'more_body': bool(body) and body.position < size}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            result['size'] += len(message.get('body', b''))
+            result['digest'].update(message.get('body', b''))
+
+    asyncio.run(asgi_app(scope, receive, send))
+    return result['status'], result['size'], result['digest'].hexdigest()
+
+def test_the_asgi_app_streams_bodies_through_flask(auth_headers, file_store, stored_document):
+    from asgi_app import app as asgi_app
+
+    headers = auth_headers()
+    body = GeneratedBody(ASGI_BODY_SIZE)
+    (status, _, _), upload_peak = traced_peak(lambda: asgi_request(
+        asgi_app, 'POST', '/documents/upload?company_id=3&filename=large.pdf&document_type=non_invoice',
+        dict(headers, **{'Content-Type': 'application/pdf'}), body, ASGI_BODY_SIZE
+    ))
+
+    assert status == 202
+    assert stored_document['file_size'] == ASGI_BODY_SIZE
+    assert upload_peak < MAX_PEAK_BYTES
+
+    (status, size, digest), download_peak = traced_peak(
+        lambda: asgi_request(asgi_app, 'GET', '/documents/11/download', headers)
+    )
+
+    assert (status, size, digest) == (200, ASGI_BODY_SIZE, body.digest.hexdigest())
+    assert download_peak < MAX_PEAK_BYTES
+
+def test_an_upload_committed_after_the_last_delete_stores_its_file_again(file_store):
+    # The upload has staged its copy when the only other document with that content is deleted
+    _, _, relative_path, tmp_path = file_store.stage_stream(io.BytesIO(b'same content'))
+    file_store.save_stream(io.BytesIO(b'same content'))
+    file_store.delete(relative_path)
+
+    # Its INSERT went through after the delete committed
+    file_store.publish(tmp_path, relative_path)
+
+    with open(file_store.path(relative_path), 'rb') as f:
+        assert f.read() == b'same content'
+    assert os.listdir(os.path.join(file_store.root, 'tmp')) == []
+
+def test_delete_document_releases_the_file_only_when_unreferenced(monkeypatch):
+    from contextlib import contextmanager
+    from db import DatabaseManager
+
+    class Cursor:
+        def __init__(self, remaining):
+            self.results = [{'file_path': 'ab/cd/abcd'}, {'count': remaining}]
+            self.executed = []
+
+        def execute(self, query, params):
+            self.executed.append(' '.join(query.split()))
+
+        def fetchone(self):
+            return self.results.pop(0)
+
+    released = []
+    for remaining in (1, 0):
+        manager = DatabaseManager.__new__(DatabaseManager)
+        cursor = Cursor(remaining)
+
+        @contextmanager
+        def transaction():
+            yield cursor
+
+        monkeypatch.setattr(manager, 'transaction', transaction, raising=False)
+        monkeypatch.setattr(manager, '_company_of', lambda table, row_id: None, raising=False)
+        assert manager.delete_document(5, on_unreferenced_file=released.append)
+        assert cursor.executed[-1].endswith('FOR UPDATE')
+
+    assert released == ['ab/cd/abcd']
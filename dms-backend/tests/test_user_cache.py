@@ -0,0 +1,57 @@
+# backend/tests/test_user_cache.py
+
+import bcrypt
+import pytest
+
+import app
+from db import DatabaseManager
+
+def password_hash(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+
+@pytest.fixture
+def users(monkeypatch):
+    """A users table behind a fresh DatabaseManager, counting the queries against it."""
+    manager = DatabaseManager()
+    rows = {'alice': {'id': 2, 'username': 'alice', 'role': 'user', 'is_active': True, 'user_limit': 0,
+                      'password_hash': password_hash('old-password')}}
+    queries = []
+
+    def execute_query(query, params=None, fetch=False):
+        queries.append(query)
+        if 'FROM users WHERE username' in query:
+            return [dict(rows[params[0]])] if params[0] in rows else []
+        if 'FROM users WHERE id' in query:
+            return [dict(row) for row in rows.values() if row['id'] == params[0]]
+        raise AssertionError(f"Unexpected query {query}")
+
+    monkeypatch.setattr(manager, 'execute_query', execute_query)
+    # The cheap test hashes would otherwise be upgraded to the configured cost on login
+    monkeypatch.setattr(manager, 'password_needs_rehash', lambda hashed_password: False)
+    monkeypatch.setattr(app, 'db', manager)
+    return rows, queries
+
+def test_cached_users_carry_no_auth_fields(users):
+    manager = app.db
+
+    user = manager.get_user_by_username('alice')
+
+    assert 'password_hash' not in user and 'is_active' not in user
+    assert manager.get_user_by_id(2) == user
+    assert manager.user_cache.get(2) == user
+
+def test_login_sees_password_changes_and_deactivation_despite_the_cache(users, client):
+    rows, queries = users
+    credentials = {'username': 'alice', 'password': 'old-password'}
+    assert client.post('/login', json=credentials).status_code == 200
+    assert app.db.get_user_by_username('alice') is not None
+
+    # Another worker changed the password: this worker's cache was not invalidated
+    rows['alice']['password_hash'] = password_hash('new-password')
+    assert client.post('/login', json=credentials).status_code == 401
+    assert client.post('/login', json={'username': 'alice', 'password': 'new-password'}).status_code == 200
+
+    rows['alice']['is_active'] = False
+    response = client.post('/login', json={'username': 'alice', 'password': 'new-password'})
+    assert response.status_code == 401
+    assert response.get_json()['msg'] == 'Account is deactivated'